@@ -0,0 +1,121 @@
+from   datetime import datetime, timedelta
+import tracemalloc
+import pytest
+import sqlalchemy as S
+
+#: Mapping from type names to pairs of a callable returning a column type and
+#: a function for generating the value of a column of that type for row ``i``
+COLUMN_TYPES = {
+    "int": (S.Integer, lambda i: i * 7919),
+    "str": (
+        lambda: S.Unicode(255),
+        # Every third value needs `\N`-escaping
+        lambda i: ['Lorem ipsum dolor sit amet {}'.format(i), '\\N', '\\\\N'][
+            i % 3
+        ],
+    ),
+    "bytes": (S.LargeBinary, lambda i: bytes(range(i % 64, i % 64 + 48))),
+    "datetime": (
+        S.DateTime,
+        lambda i: datetime(2020, 1, 1) + timedelta(seconds=i, microseconds=i),
+    ),
+    "json": (
+        S.JSON,
+        lambda i: {"id": i, "tags": ["foo", "bar"], "extra": {"x": None}},
+    ),
+    "pickle": (S.PickleType, lambda i: {"id": i, "set": {1, 2, 3}}),
+    "array": (
+        lambda: S.ARRAY(S.Integer),
+        lambda i: [i, i + 1, None, [i * 2]],
+    ),
+}
+
+#: Types that SQLite can't store
+UNSTORABLE = {"array"}
+
+SHAPES = [*COLUMN_TYPES, "wide"]
+
+def pytest_addoption(parser):
+    parser.addoption(
+        '--bench-rows', type=int, default=10000,
+        help='Number of rows in each synthetic table',
+    )
+    parser.addoption(
+        '--bench-width', type=int, default=1,
+        help='Number of columns of each type in each synthetic table',
+    )
+
+def make_table(shape, width):
+    """
+    Create a table with an integer primary key and ``width`` columns of the
+    type named ``shape`` (or of every type that SQLite can store, if
+    ``shape`` is ``"wide"``)
+    """
+    if shape == "wide":
+        kinds = [k for k in COLUMN_TYPES if k not in UNSTORABLE]
+    else:
+        kinds = [shape]
+    columns = [S.Column('id', S.Integer, primary_key=True, nullable=False)]
+    for kind in kinds:
+        coltype = COLUMN_TYPES[kind][0]
+        for j in range(width):
+            columns.append(
+                S.Column('{}_{}'.format(kind, j), coltype(), nullable=True)
+            )
+    return S.Table('bench_' + shape, S.MetaData(), *columns)
+
+def make_rows(table, nrows):
+    """ Generate ``nrows`` rows for ``table`` as `dict`\\s """
+    makers = [
+        (c.key, COLUMN_TYPES[c.key.rpartition('_')[0]][1])
+        for c in table.columns if c.key != 'id'
+    ]
+    return [
+        dict({"id": i}, **{key: make(i) for key, make in makers})
+        for i in range(nrows)
+    ]
+
+@pytest.fixture(params=SHAPES)
+def shape(request):
+    return request.param
+
+@pytest.fixture
+def table(request, shape):
+    return make_table(shape, request.config.getoption('--bench-width'))
+
+@pytest.fixture
+def rows(request, table):
+    return make_rows(table, request.config.getoption('--bench-rows'))
+
+@pytest.fixture(params=['memory', 'file'])
+def engine(request, shape, table, tmp_path):
+    if shape in UNSTORABLE:
+        pytest.skip('SQLite does not support {} columns'.format(shape))
+    if request.param == 'memory':
+        engine = S.create_engine('sqlite://')
+    else:
+        engine = S.create_engine('sqlite:///' + str(tmp_path / 'bench.db'))
+    table.create(engine)
+    yield engine
+    engine.dispose()
+
+def report(benchmark, nrows, nbytes, func):
+    """
+    Record the throughput of a benchmarked function that processed ``nrows``
+    rows & ``nbytes`` bytes of CSV per call in the benchmark's
+    ``extra_info``, along with the peak memory allocated by a single
+    additional call of ``func``.  Nothing is recorded when benchmarking is
+    disabled (e.g., with ``--benchmark-disable``).
+    """
+    if benchmark.disabled:
+        return
+    mean = benchmark.stats.stats.mean
+    benchmark.extra_info["rows_per_s"] = nrows / mean
+    benchmark.extra_info["mb_per_s"] = nbytes / mean / 1e6
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    benchmark.extra_info["peak_mem_mb"] = peak / 1e6
@@ -0,0 +1,56 @@
+"""
+Benchmarks of the ``\\N``-escaping of strings against the previous
+regex-based implementation
+
+Run with ``pytest --no-cov benchmarks/test_escaping.py
+--benchmark-group-by=param``; each ``fast`` benchmark should be compared with
+the ``regex`` one for the same data.
+"""
+
+import re
+import pytest
+from   dbcsv.marshalling import marshal_str, unmarshal_str
+
+def regex_marshal_str(s):
+    m = re.fullmatch(r'(\x5C+)N', s)
+    if m:
+        return m.group(1) * 2 + 'N'
+    else:
+        return s
+
+def regex_unmarshal_str(s):
+    m = re.fullmatch(r'(\x5C+)N', s)
+    if m:
+        return '\\' * (len(m.group(1)) // 2) + 'N'
+    else:
+        return s
+
+#: Mapping from data names to functions for generating value ``i``
+DATA = {
+    "text": lambda i: 'Lorem ipsum dolor sit amet {}'.format(i),
+    "short": lambda i: 'ABCDEFGHIJKLMN'[i % 14],
+    "escaped": lambda i: '\\' * (i % 4 + 1) + 'N',
+}
+
+IMPLEMENTATIONS = {
+    "fast": (marshal_str, unmarshal_str),
+    "regex": (regex_marshal_str, regex_unmarshal_str),
+}
+
+@pytest.fixture(params=sorted(DATA))
+def strings(request):
+    nrows = request.config.getoption('--bench-rows')
+    return [DATA[request.param](i) for i in range(nrows)]
+
+@pytest.mark.parametrize('impl', sorted(IMPLEMENTATIONS))
+def test_marshal_str(benchmark, strings, impl):
+    marshal = IMPLEMENTATIONS[impl][0]
+    result = benchmark(lambda: list(map(marshal, strings)))
+    assert result == list(map(regex_marshal_str, strings))
+
+@pytest.mark.parametrize('impl', sorted(IMPLEMENTATIONS))
+def test_unmarshal_str(benchmark, strings, impl):
+    unmarshal = IMPLEMENTATIONS[impl][1]
+    marshalled = list(map(regex_marshal_str, strings))
+    result = benchmark(lambda: list(map(unmarshal, marshalled)))
+    assert result == strings
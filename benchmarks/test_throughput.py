@@ -0,0 +1,88 @@
+"""
+Throughput benchmarks for marshalling, unmarshalling, dumping, and loading
+
+Run with ``tox -e bench`` or ``pytest --no-cov benchmarks``; the size of the
+synthetic tables can be adjusted with the ``--bench-rows`` and
+``--bench-width`` options.  Each benchmark records its rows per second, CSV
+megabytes per second, and peak memory usage in its ``extra_info``.
+"""
+
+import csv
+from   io                import StringIO
+from   conftest          import report
+import pytest
+from   dbcsv             import dump_table, load_table
+from   dbcsv.marshalling import get_codec_plan, marshal_object, \
+                                unmarshal_object
+
+def csv_text(table, rows):
+    plan = get_codec_plan(table)
+    out = StringIO()
+    writer = csv.writer(out)
+    writer.writerow(plan.columns)
+    for r in rows:
+        writer.writerow(plan.marshal_row([r[c] for c in plan.columns]))
+    return out.getvalue()
+
+def nbytes(text):
+    return len(text.encode('utf-8'))
+
+def test_marshal_object(benchmark, table, rows):
+    def run():
+        return [marshal_object(table, r) for r in rows]
+    benchmark(run)
+    report(benchmark, len(rows), nbytes(csv_text(table, rows)), run)
+
+def test_unmarshal_object(benchmark, table, rows):
+    strrows = [marshal_object(table, r) for r in rows]
+
+    def run():
+        return [unmarshal_object(table, r) for r in strrows]
+
+    benchmark(run)
+    report(benchmark, len(rows), nbytes(csv_text(table, rows)), run)
+
+def test_unmarshal_columns(benchmark, table, rows):
+    plan = get_codec_plan(table)
+    strrows = [
+        plan.marshal_row([r[c] for c in plan.columns]) for r in rows
+    ]
+
+    def run():
+        return plan.unmarshal_columns(plan.columns, strrows)
+
+    benchmark(run)
+    report(benchmark, len(rows), nbytes(csv_text(table, rows)), run)
+
+@pytest.mark.parametrize('pipeline', [False, True])
+def test_dump_table(benchmark, table, rows, engine, pipeline):
+    with engine.begin() as conn:
+        conn.execute(table.insert(), rows)
+
+    def run():
+        out = StringIO()
+        with engine.connect() as conn:
+            dump_table(conn, table, out, pipeline=pipeline)
+        return out
+
+    benchmark(run)
+    report(benchmark, len(rows), nbytes(csv_text(table, rows)), run)
+
+@pytest.mark.parametrize('pipeline', [False, True])
+def test_load_table(benchmark, table, rows, engine, pipeline):
+    text = csv_text(table, rows)
+
+    def setup():
+        with engine.begin() as conn:
+            conn.execute(table.delete())
+
+    def run():
+        with engine.begin() as conn:
+            load_table(conn, table, StringIO(text), pipeline=pipeline)
+
+    def setup_and_run():
+        setup()
+        run()
+
+    benchmark.pedantic(run, setup=setup, rounds=5)
+    report(benchmark, len(rows), nbytes(text), setup_and_run)
@@ -0,0 +1,63 @@
+"""
+Benchmarks of writing marshalled rows to a CSV file: row-at-a-time
+``writerow()`` calls into a default-buffered file (the old dump path) versus
+chunked ``writerows()`` calls into a default-buffered file, a file with a
+large buffer, and a `BlockWriter`
+
+On Linux, each benchmark also records the number of ``write``-type system
+calls made per run (from ``/proc/self/io``) in its ``extra_info``.
+"""
+
+import csv
+from   pathlib           import Path
+from   conftest          import report
+import pytest
+from   dbcsv.compression import open_csv
+from   dbcsv.marshalling import get_codec_plan
+
+PROC_IO = Path('/proc/self/io')
+
+CHUNK_SIZE = 1000
+
+MODES = {
+    "writerow": {},
+    "writerows": {},
+    "writerows-8MiB": {"buffer_size": 8 << 20},
+    "direct": {"direct_write": True},
+}
+
+def write_syscalls():
+    for line in PROC_IO.read_text().splitlines():
+        key, _, value = line.partition(':')
+        if key == 'syscw':
+            return int(value)
+    return None
+
+@pytest.mark.parametrize('mode', list(MODES))
+def test_write_csv(benchmark, table, rows, tmp_path, mode):
+    plan = get_codec_plan(table)
+    chunks = [
+        plan.marshal_columns([
+            [r[c] for c in plan.columns] for r in rows[i:i+CHUNK_SIZE]
+        ])
+        for i in range(0, len(rows), CHUNK_SIZE)
+    ]
+    path = tmp_path / 'out.csv'
+
+    def run():
+        with open_csv(path, 'w', **MODES[mode]) as fp:
+            writer = csv.writer(fp)
+            writer.writerow(plan.columns)
+            for chunk in chunks:
+                if mode == "writerow":
+                    for row in chunk:
+                        writer.writerow(row)
+                else:
+                    writer.writerows(chunk)
+
+    benchmark(run)
+    if PROC_IO.exists() and not benchmark.disabled:
+        before = write_syscalls()
+        run()
+        benchmark.extra_info["write_syscalls"] = write_syscalls() - before
+    report(benchmark, len(rows), path.stat().st_size, run)
@@ -14,14 +14,26 @@ __author_email__ = 'dbcsv@varonathe.org'
 __license__      = 'MIT'
 __url__          = 'https://github.com/jwodder/dbcsv'
 
+from .bulk        import register_bulk_dumper, register_bulk_loader
 from .load_dump   import dump_table, dumpdb, load_table, loaddb
-from .marshalling import register_column_type, register_python_type
+from .marshalling import register_column_type, register_python_type, \
+                          set_array_format
+from .observe     import LoggingObserver, Observer, StatsObserver
+from .parallel    import parallel_dumpdb, parallel_loaddb
 
 __all__ = [
+    'LoggingObserver',
+    'Observer',
+    'StatsObserver',
     'dump_table',
     'dumpdb',
     'load_table',
     'loaddb',
+    'parallel_dumpdb',
+    'parallel_loaddb',
+    'register_bulk_dumper',
+    'register_bulk_loader',
     'register_column_type',
     'register_python_type',
+    'set_array_format',
 ]
@@ -0,0 +1,306 @@
+"""
+asyncio variants of `dump_table()`, `load_table()`, `dumpdb()`, and `loaddb()`
+
+The versions of SQLAlchemy supported by dbcsv have no asyncio support, so the
+database work for each table runs in a dedicated thread with its own
+connection from an `~sqlalchemy.engine.Engine`, while the marshalling & file
+I/O runs in the event loop's default executor, one batch at a time.  The two
+are connected by a bounded `asyncio.Queue`, so fetching or inserting one batch
+overlaps with converting the next, and the event loop itself is never blocked
+for more than a queue operation.
+"""
+
+import asyncio
+from   concurrent.futures import CancelledError
+import csv
+from   itertools          import islice
+from   pathlib            import Path
+import threading
+from   time               import perf_counter
+import sqlalchemy as S
+from   .columnar          import columnar_format_for_path
+from   .compression       import csv_suffix, open_csv
+from   .load_dump         import DEFAULT_BATCH_SIZE, delta_files, \
+                                 discard_deltas, discard_table_files, \
+                                 fetch_chunks, insert_batches, table_files
+from   .marshalling       import get_codec_plan
+from   .parallel          import table_dependencies
+
+DEFAULT_CONCURRENCY = 4
+
+#: Default maximum number of batches queued between the database thread and
+#: the converting coroutine
+DEFAULT_QUEUE_SIZE = 4
+
+#: Sentinel marking the end of the batches sent through a `Channel`
+END = object()
+
+class ChannelClosed(Exception):
+    """ Raised in a worker thread when the coroutine side has given up """
+    pass
+
+class Channel:
+    """
+    A bounded `asyncio.Queue` connecting a coroutine with a worker thread whose
+    asyncio future is ``worker``.  The thread uses `put()` & `get()`, which
+    block, and the coroutine uses `aput()` & `aget()`, which raise the worker's
+    exception if the worker exits while the coroutine is waiting on it.
+    """
+
+    def __init__(self, maxsize):
+        if maxsize < 1:
+            raise ValueError('queue_size must be positive')
+        self.loop = asyncio.get_event_loop()
+        self.queue = asyncio.Queue(maxsize)
+        self.closed = False
+        self.pending = None
+        self.worker = None
+
+    def put(self, item):
+        self.call(self.queue.put(item))
+
+    def get(self):
+        return self.call(self.queue.get())
+
+    def call(self, coro):
+        if self.closed:
+            coro.close()
+            raise ChannelClosed()
+        self.pending = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        # Check again in case `abort()` ran before `pending` was set
+        if self.closed:
+            self.pending.cancel()
+        try:
+            return self.pending.result()
+        except CancelledError:
+            raise ChannelClosed()
+
+    async def aput(self, item):
+        if not self.queue.full():
+            self.queue.put_nowait(item)
+        else:
+            await self.wait_for(self.queue.put(item))
+
+    async def aget(self):
+        if not self.queue.empty():
+            return self.queue.get_nowait()
+        return await self.wait_for(self.queue.get())
+
+    async def wait_for(self, coro):
+        task = asyncio.ensure_future(coro)
+        await asyncio.wait([task, self.worker],
+                           return_when=asyncio.FIRST_COMPLETED)
+        if task.done():
+            return task.result()
+        task.cancel()
+        self.worker.result()
+        raise RuntimeError('Worker thread exited without finishing')
+
+    async def abort(self):
+        """
+        Make the worker thread stop at its current or next `put()` or `get()`
+        and wait for it to exit
+        """
+        self.closed = True
+        if self.pending is not None:
+            self.pending.cancel()
+        try:
+            await self.worker
+        except Exception:
+            pass
+
+def run_in_thread(func):
+    """
+    Call ``func()`` in a new thread, returning an asyncio future for its result
+    """
+    loop = asyncio.get_event_loop()
+    future = loop.create_future()
+
+    def settle(method, value):
+        if not future.done():
+            method(value)
+
+    def run():
+        try:
+            result = func()
+        except Exception as e:
+            loop.call_soon_threadsafe(settle, future.set_exception, e)
+        else:
+            loop.call_soon_threadsafe(settle, future.set_result, result)
+
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+async def dump_table(engine, table, outfile, stream=False,
+                     chunk_size=DEFAULT_BATCH_SIZE, whereclause=None,
+                     queue_size=DEFAULT_QUEUE_SIZE):
+    if chunk_size < 1:
+        raise ValueError('chunk_size must be positive')
+    loop = asyncio.get_event_loop()
+    plan = get_codec_plan(table)
+    writer = csv.writer(outfile)
+    channel = Channel(queue_size)
+
+    def fetch():
+        with engine.connect() as conn:
+            if stream:
+                conn = conn.execution_options(stream_results=True)
+            result = conn.execute(S.select([table], whereclause))
+            try:
+                for entries in fetch_chunks(result, chunk_size):
+                    channel.put(entries)
+            finally:
+                result.close()
+        channel.put(END)
+
+    def write(entries):
+        writer.writerows(plan.marshal_columns(entries))
+
+    await loop.run_in_executor(None, writer.writerow, plan.columns)
+    channel.worker = run_in_thread(fetch)
+    try:
+        while True:
+            entries = await channel.aget()
+            if entries is END:
+                break
+            await loop.run_in_executor(None, write, entries)
+    except BaseException:
+        await channel.abort()
+        raise
+    await channel.worker
+
+async def load_table(engine, table, infile, batch_size=DEFAULT_BATCH_SIZE,
+                     bulk=False, merge=False, queue_size=DEFAULT_QUEUE_SIZE):
+    if batch_size < 1:
+        raise ValueError('batch_size must be positive')
+    loop = asyncio.get_event_loop()
+    plan = get_codec_plan(table)
+    reader = csv.reader(infile)
+    channel = Channel(queue_size)
+    columns = await loop.run_in_executor(None, next, reader, None)
+    if columns is None:
+        return
+
+    def read():
+        rows = list(islice(reader, batch_size))
+        return plan.unmarshal_columns(columns, rows) if rows else END
+
+    def insert():
+        with engine.begin() as conn:
+            insert_batches(conn, table, columns, iter(channel.get, END),
+                           bulk=bulk, merge=merge)
+
+    channel.worker = run_in_thread(insert)
+    try:
+        while True:
+            batch = await loop.run_in_executor(None, read)
+            await channel.aput(batch)
+            if batch is END:
+                break
+    except BaseException:
+        await channel.abort()
+        raise
+    await channel.worker
+
+async def dumpdb(engine, metadata, dirpath, concurrency=DEFAULT_CONCURRENCY,
+                 stream=False, chunk_size=DEFAULT_BATCH_SIZE,
+                 compression=None, queue_size=DEFAULT_QUEUE_SIZE):
+    """
+    Like `dumpdb()`, but dump up to ``concurrency`` tables at once, each on its
+    own connection from ``engine``.  Returns a `dict` mapping table names to
+    the number of seconds it took to dump them.
+    """
+    loop = asyncio.get_event_loop()
+    dirpath = Path(dirpath)
+    dirpath.mkdir(parents=True, exist_ok=True)
+    discard_deltas(dirpath, metadata.sorted_tables)
+    for tbl in metadata.sorted_tables:
+        discard_table_files(dirpath, tbl)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def dump(tbl):
+        async with semaphore:
+            start = perf_counter()
+            path = dirpath / (tbl.name + csv_suffix(compression))
+            fp = await loop.run_in_executor(None, open_csv, path, 'w')
+            try:
+                await dump_table(engine, tbl, fp, stream=stream,
+                                 chunk_size=chunk_size, queue_size=queue_size)
+            finally:
+                await loop.run_in_executor(None, fp.close)
+            return perf_counter() - start
+
+    tables = metadata.sorted_tables
+    timings = await gather_or_cancel([dump(tbl) for tbl in tables])
+    return {tbl.name: t for tbl, t in zip(tables, timings)}
+
+async def loaddb(engine, metadata, dirpath, concurrency=DEFAULT_CONCURRENCY,
+                 batch_size=DEFAULT_BATCH_SIZE, bulk=False,
+                 queue_size=DEFAULT_QUEUE_SIZE):
+    """
+    Like `loaddb()`, but load up to ``concurrency`` tables at once, each on its
+    own connection from ``engine``.  A table is not started until all of the
+    tables it has foreign keys to have finished loading.  Returns a `dict`
+    mapping the names of the tables that were loaded to the number of seconds
+    it took to load them.
+    """
+    loop = asyncio.get_event_loop()
+    dirpath = Path(dirpath)
+    semaphore = asyncio.Semaphore(concurrency)
+    deps = table_dependencies(metadata)
+    tables = metadata.sorted_tables
+    tasks = {}
+
+    async def load(tbl):
+        # Only wait on tables earlier in `sorted_tables` so that a dependency
+        # cycle can't deadlock
+        for dep in tables[:tables.index(tbl)]:
+            if dep in deps[tbl]:
+                await tasks[dep]
+        paths = [(p, False) for p in table_files(dirpath, tbl)]
+        paths.extend((p, True) for p in delta_files(dirpath, tbl))
+        if not paths:
+            return None
+        if any(columnar_format_for_path(p) is not None for p, _ in paths):
+            raise ValueError(
+                'Parquet & Arrow files cannot be loaded with dbcsv.aio'
+            )
+        async with semaphore:
+            start = perf_counter()
+            for path, merge in paths:
+                fp = await loop.run_in_executor(None, open_csv, path, 'r')
+                try:
+                    await load_table(engine, tbl, fp, batch_size=batch_size,
+                                     bulk=bulk, merge=merge,
+                                     queue_size=queue_size)
+                finally:
+                    await loop.run_in_executor(None, fp.close)
+            return perf_counter() - start
+
+    for tbl in tables:
+        tasks[tbl] = asyncio.ensure_future(load(tbl))
+    timings = await gather_or_cancel([tasks[tbl] for tbl in tables])
+    return {
+        tbl.name: t for tbl, t in zip(tables, timings) if t is not None
+    }
+
+async def gather_or_cancel(aws):
+    """
+    Like `asyncio.gather()`, but if any awaitable fails, cancel the rest and
+    wait for them to finish before raising
+    """
+    futures = [asyncio.ensure_future(aw) for aw in aws]
+    if not futures:
+        return []
+    try:
+        done, _ = await asyncio.wait(futures,
+                                     return_when=asyncio.FIRST_EXCEPTION)
+        for fut in done:
+            if not fut.cancelled() and fut.exception() is not None:
+                raise fut.exception()
+    except BaseException:
+        for fut in futures:
+            fut.cancel()
+        await asyncio.wait(futures)
+        raise
+    return [fut.result() for fut in futures]
@@ -0,0 +1,383 @@
+"""
+Vendor-specific fast paths for loading rows into & dumping rows from a table
+
+A bulk loader is a function ``loader(conn, table, columns, batches)`` that
+inserts the rows in ``batches`` (an iterable of lists of sequences of Python
+values, each sequence giving the values for the columns with keys
+``columns``, in that order) into ``table`` and returns `True`, or returns
+`False` without inserting anything if it cannot handle the table, in which
+case the generic ``INSERT`` path is used instead.
+
+A bulk dumper is a function ``dumper(conn, table, writer, whereclause)`` that
+writes the marshalled rows of ``table`` (restricted to those matching
+``whereclause``, if not `None`), each as a list of strings in the order of
+``table.columns``, to the `csv.writer` ``writer`` and returns `True`, or
+returns `False` without writing anything if it cannot handle the table, in
+which case the generic ``SELECT`` path is used instead.
+
+Bulk loaders & dumpers are selected by the name of the connection's dialect.
+"""
+
+from   base64       import b64encode
+from   datetime     import date, datetime, time, timedelta
+from   decimal      import Decimal
+import io
+import json
+import re
+import sqlalchemy as S
+from   .marshalling import NULL_TOKEN, coltype_marshallers, marshal_bytes, \
+                           marshal_enum, marshal_json, marshal_str, \
+                           pytype_marshallers
+
+bulk_loaders = {}
+bulk_dumpers = {}
+
+def register_bulk_loader(dialect_name, loader):
+    bulk_loaders[dialect_name] = loader
+
+def get_bulk_loader(dialect_name):
+    return bulk_loaders.get(dialect_name)
+
+def register_bulk_dumper(dialect_name, dumper):
+    bulk_dumpers[dialect_name] = dumper
+
+def get_bulk_dumper(dialect_name):
+    return bulk_dumpers.get(dialect_name)
+
+def prepared_insert(conn, table, columns):
+    """
+    Compile an ``INSERT`` of ``columns`` into ``table`` for ``conn``'s dialect
+    for use with a positional paramstyle.  Returns a triple of the SQL
+    string, the indices into ``columns`` of the parameters in the order that
+    they appear in the SQL, and the bind processors for those parameters (or
+    `None` for parameters without one).  Returns `None` if the statement
+    cannot be executed with plain positional parameters (e.g., because some
+    column has a Python-side default that SQLAlchemy would have to compute).
+    """
+    dialect = conn.dialect
+    if not dialect.positional:
+        return None
+    compiled = table.insert().compile(dialect=dialect, column_keys=columns)
+    if compiled.insert_prefetch or compiled.positiontup is None:
+        return None
+    try:
+        order = [columns.index(name) for name in compiled.positiontup]
+    except ValueError:
+        return None
+    processors = [
+        table.columns[columns[i]].type.dialect_impl(dialect)
+                                      .bind_processor(dialect)
+        for i in order
+    ]
+    return (str(compiled), order, processors)
+
+def process_row(row, order, processors):
+    return tuple(
+        row[i] if proc is None else proc(row[i])
+        for i, proc in zip(order, processors)
+    )
+
+def sqlite_load(conn, table, columns, batches):
+    """
+    Load rows into a SQLite table inside a single transaction using a
+    prepared ``executemany`` per batch, with the page cache enlarged and (if
+    the connection is not already in a transaction, as SQLite does not allow
+    changing it inside one) ``PRAGMA synchronous`` turned off for the
+    duration of the load
+    """
+    prepared = prepared_insert(conn, table, columns)
+    if prepared is None:
+        return False
+    sql, order, processors = prepared
+    pragmas = {'cache_size': '-65536'}
+    if not conn.in_transaction() and not conn.connection.in_transaction:
+        pragmas['synchronous'] = 'OFF'
+    saved = {
+        name: conn.execute('PRAGMA {}'.format(name)).scalar()
+        for name in pragmas
+    }
+    try:
+        for name, value in pragmas.items():
+            conn.execute('PRAGMA {} = {}'.format(name, value))
+        with conn.begin():
+            for batch in batches:
+                conn.execute(
+                    sql,
+                    [process_row(row, order, processors) for row in batch],
+                )
+    finally:
+        for name, value in saved.items():
+            conn.execute('PRAGMA {} = {}'.format(name, value))
+    return True
+
+def postgresql_load(conn, table, columns, batches):
+    """
+    Load rows into a PostgreSQL table by streaming them through a ``COPY ...
+    FROM STDIN`` in PostgreSQL's text format.  Requires a DBAPI driver whose
+    cursors have a psycopg2-style ``copy_expert()`` method.
+    """
+    dialect = conn.dialect
+    preparer = dialect.identifier_preparer
+    cols = [table.columns[c] for c in columns]
+    processors = [c.type.dialect_impl(dialect).bind_processor(dialect)
+                  for c in cols]
+    sql = 'COPY {} ({}) FROM STDIN'.format(
+        preparer.format_table(table),
+        ', '.join(preparer.format_column(c) for c in cols),
+    )
+
+    def lines():
+        for batch in batches:
+            for row in batch:
+                yield '\t'.join(
+                    copy_text(v if proc is None or v is None else proc(v))
+                    for v, proc in zip(row, processors)
+                ) + '\n'
+
+    with conn.begin():
+        cursor = conn.connection.cursor()
+        if not hasattr(cursor, 'copy_expert'):
+            cursor.close()
+            return False
+        try:
+            cursor.copy_expert(sql, LineReader(lines()))
+        finally:
+            cursor.close()
+    return True
+
+def copy_text(value):
+    """
+    Format a DBAPI-level value as a field of PostgreSQL's ``COPY`` text format
+    """
+    if value is None:
+        return r'\N'
+    return copy_escape(copy_literal(value))
+
+def copy_literal(value):
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        return '\\x' + bytes(value).hex()
+    elif isinstance(value, timedelta):
+        return '{} days {} seconds {} microseconds'.format(
+            value.days, value.seconds, value.microseconds,
+        )
+    elif isinstance(value, (list, tuple)):
+        return '{' + ','.join(map(array_item_literal, value)) + '}'
+    else:
+        return str(value)
+
+def array_item_literal(value):
+    if value is None:
+        return 'NULL'
+    elif isinstance(value, (list, tuple)):
+        return copy_literal(value)
+    else:
+        s = copy_literal(value)
+        return '"' + s.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+def copy_escape(s):
+    return s.replace('\\', '\\\\')\
+            .replace('\n', '\\n')\
+            .replace('\r', '\\r')\
+            .replace('\t', '\\t')
+
+class LineReader(io.TextIOBase):
+    """ A read-only text stream that reads from an iterator of strings """
+
+    def __init__(self, lines):
+        self.lines = iter(lines)
+        self.buf = ''
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            data = self.buf + ''.join(self.lines)
+            self.buf = ''
+            return data
+        parts = [self.buf]
+        length = len(self.buf)
+        while length < size:
+            try:
+                line = next(self.lines)
+            except StopIteration:
+                break
+            parts.append(line)
+            length += len(line)
+        data = ''.join(parts)
+        self.buf = data[size:]
+        return data[:size]
+
+    def readline(self, size=-1):
+        if not self.buf:
+            self.buf = next(self.lines, '')
+        line, self.buf = self.buf, ''
+        if size is not None and 0 <= size < len(line):
+            line, self.buf = line[:size], line[size:]
+        return line
+
+def postgresql_dump(conn, table, writer, whereclause):
+    """
+    Dump a PostgreSQL table by having the server produce the rows with ``COPY
+    (SELECT ...) TO STDOUT``, only reformatting the fields of the columns for
+    which PostgreSQL's text output differs from dbcsv's.  Only tables whose
+    columns all have a `copy_fixup()` are supported.  Requires a DBAPI driver
+    whose cursors have a psycopg2-style ``copy_expert()`` method.
+    """
+    fixups = []
+    for c in table.columns:
+        fixup = copy_fixup(c.type)
+        if fixup is None:
+            return False
+        fixups.append(fixup)
+    try:
+        query = S.select([table], whereclause).compile(
+            dialect=conn.dialect,
+            compile_kwargs={"literal_binds": True},
+        )
+    except Exception:
+        # Bound parameters that can't be rendered as literals
+        return False
+    sql = 'COPY ({}) TO STDOUT'.format(query)
+    with conn.begin():
+        cursor = conn.connection.cursor()
+        if not hasattr(cursor, 'copy_expert'):
+            cursor.close()
+            return False
+        try:
+            cursor.copy_expert(sql, CopyRowWriter(writer, fixups))
+        finally:
+            cursor.close()
+    return True
+
+def copy_fixup(coltype):
+    """
+    Return a function for converting a (non-``NULL``, unescaped) field of
+    column type ``coltype`` in PostgreSQL's text output format to the string
+    that dbcsv would marshal the same value as, or `None` if there is no such
+    function
+    """
+    if type(coltype) in coltype_marshallers:
+        marshaller = coltype_marshallers[type(coltype)]
+        if marshaller == marshal_enum:
+            return marshal_str
+        elif marshaller == marshal_json:
+            return pg_json
+        else:
+            return None
+    try:
+        pytype = coltype.python_type
+    except Exception:
+        return None
+    if isinstance(coltype, S.Float) and pytype is Decimal:
+        # Decimals converted from floats depend on the result processor's
+        # `decimal_return_scale`
+        return None
+    for ptype, default_marshaller, fixup in COPY_FIXUPS:
+        if pytype is ptype:
+            if pytype_marshallers.get(pytype) == default_marshaller:
+                return fixup
+            break
+    return None
+
+def pg_timestamp(s):
+    return datetime.fromisoformat(pg_iso(s.replace(' ', 'T', 1))).isoformat()
+
+def pg_time(s):
+    return time.fromisoformat(pg_iso(s)).isoformat()
+
+def pg_iso(s):
+    # PostgreSQL trims trailing zeros from fractional seconds, but
+    # `fromisoformat()` before Python 3.11 only accepts 3 or 6 digits
+    s = re.sub(r'(:\d\d\.)(\d{1,5})(?!\d)',
+               lambda m: m.group(1) + m.group(2).ljust(6, '0'), s)
+    # PostgreSQL omits the minutes from whole-hour UTC offsets
+    return re.sub(r'([-+]\d\d)$', r'\1:00', s)
+
+def pg_bytea(s):
+    # Assumes `bytea_output = 'hex'` (the default since PostgreSQL 9.0)
+    return b64encode(bytes.fromhex(s[2:])).decode('us-ascii')
+
+def pg_json(s):
+    value = json.loads(s)
+    # The generic path can't tell JSON `null` from SQL `NULL` either
+    return NULL_TOKEN if value is None else json.dumps(value)
+
+def identity(s):
+    return s
+
+def float_text(s):
+    return str(float(s))
+
+#: Python types for which PostgreSQL's text output can be converted to dbcsv's
+#: format, along with the default marshaller for the type and the conversion
+#: function
+COPY_FIXUPS = [
+    (int, str, identity),
+    (str, marshal_str, marshal_str),
+    (bool, 'ft'.__getitem__, identity),
+    (Decimal, str, identity),
+    (float, str, float_text),
+    (date, date.isoformat, identity),
+    (datetime, datetime.isoformat, pg_timestamp),
+    (time, time.isoformat, pg_time),
+    (bytes, marshal_bytes, pg_bytea),
+]
+
+COPY_UNESCAPES = {
+    'b': '\b',
+    'f': '\f',
+    'n': '\n',
+    'r': '\r',
+    't': '\t',
+    'v': '\v',
+}
+
+def copy_unescape(s):
+    """ Unescape a (non-``NULL``) field in PostgreSQL's ``COPY`` text format """
+    if '\\' not in s:
+        return s
+    def unescape(m):
+        c = m.group(1)
+        if c in COPY_UNESCAPES:
+            return COPY_UNESCAPES[c]
+        elif c[0] == 'x':
+            return chr(int(c[1:], 16))
+        elif c[0].isdigit():
+            return chr(int(c, 8))
+        else:
+            return c
+    return re.sub(r'\\(x[0-9A-Fa-f]{1,2}|[0-7]{1,3}|.)', unescape, s)
+
+class CopyRowWriter(io.TextIOBase):
+    """
+    A writable text stream that receives PostgreSQL ``COPY`` text-format
+    output and writes each row, converted with ``fixups``, to ``writer``
+    """
+
+    def __init__(self, writer, fixups):
+        self.writer = writer
+        self.fixups = fixups
+        self.buf = ''
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        lines = (self.buf + data).split('\n')
+        self.buf = lines.pop()
+        fixups = self.fixups
+        self.writer.writerows(
+            [
+                NULL_TOKEN if f == r'\N' else fx(copy_unescape(f))
+                for fx, f in zip(fixups, line.split('\t'))
+            ]
+            for line in lines
+        )
+        return len(data)
+
+register_bulk_loader('sqlite', sqlite_load)
+register_bulk_loader('postgresql', postgresql_load)
+register_bulk_dumper('postgresql', postgresql_dump)
@@ -0,0 +1,209 @@
+"""
+Reading & writing tables as Parquet or Arrow IPC files
+
+Columns whose SQLAlchemy types have a natural Arrow counterpart (integers,
+floats, fixed-precision decimals, strings, binary, booleans, dates, and naive
+times & timestamps) are stored as typed Arrow columns; all other columns
+(e.g., ``JSON``, ``PickleType``, ``ARRAY``, ``Enum``, and timezone-aware
+timestamps) are stored as strings marshalled the same way as in a CSV dump,
+with ``NULL``\\s stored as Arrow nulls.  Requires the ``pyarrow`` package.
+"""
+
+from   datetime     import date, datetime, time, timedelta
+from   decimal      import Decimal
+import sqlalchemy as S
+from   .marshalling import coltype_marshallers, column_marshaller, \
+                           field_unmarshaller
+
+#: Default maximum number of rows in each Parquet row group or Arrow record
+#: batch written by `write_columnar()`
+DEFAULT_ROW_GROUP_SIZE = 1 << 17
+
+#: Mapping from supported columnar format names to filename extensions
+COLUMNAR_SUFFIXES = {
+    'parquet': '.parquet',
+    'arrow': '.arrow',
+}
+
+def import_pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise RuntimeError('Columnar formats require the pyarrow package to be'
+                           ' installed')
+    return pyarrow
+
+def columnar_suffix(format):
+    """ Return the filename suffix for a file in the given columnar format """
+    try:
+        return COLUMNAR_SUFFIXES[format]
+    except KeyError:
+        raise ValueError('Unsupported format: {!r}'.format(format))
+
+def columnar_format_for_path(path):
+    """
+    Return the name of the columnar format of the file at ``path`` based on
+    its extension, or `None` if it is not a columnar file
+    """
+    for name, suffix in COLUMNAR_SUFFIXES.items():
+        if str(path).endswith(suffix):
+            return name
+    return None
+
+def arrow_type(coltype):
+    """
+    Return the Arrow type in which to natively store values of the SQLAlchemy
+    column type ``coltype``, or `None` if values of the type should be stored
+    as marshalled strings
+    """
+    pa = import_pyarrow()
+    if type(coltype) in coltype_marshallers:
+        return None
+    if isinstance(coltype, S.types.TypeDecorator) \
+            and not isinstance(coltype, S.Interval):
+        # The values of a `TypeDecorator` need not be of its `python_type`
+        return None
+    try:
+        pytype = coltype.python_type
+    except Exception:
+        return None
+    if pytype is bool:
+        return pa.bool_()
+    elif pytype is int:
+        return pa.int64()
+    elif pytype is float:
+        return pa.float64()
+    elif pytype is Decimal:
+        if isinstance(coltype, S.Float) or coltype.precision is None \
+                or coltype.scale is None or not 0 < coltype.precision <= 38:
+            return None
+        return pa.decimal128(coltype.precision, coltype.scale)
+    elif pytype is str:
+        return pa.string()
+    elif pytype is bytes:
+        return pa.binary()
+    elif pytype is date:
+        return pa.date32()
+    elif pytype is datetime:
+        return None if coltype.timezone else pa.timestamp('us')
+    elif pytype is time:
+        return None if coltype.timezone else pa.time64('us')
+    elif pytype is timedelta:
+        return pa.duration('us')
+    else:
+        return None
+
+def arrow_schema(table):
+    """
+    Return the Arrow schema for storing ``table`` along with a list of the
+    marshallers for the table's string-encoded columns (or `None` for natively
+    stored columns)
+    """
+    pa = import_pyarrow()
+    fields = []
+    marshallers = []
+    for c in table.columns:
+        atype = arrow_type(c.type)
+        if atype is None:
+            fields.append(pa.field(c.key, pa.string()))
+            marshallers.append(column_marshaller(c))
+        else:
+            fields.append(pa.field(c.key, atype))
+            marshallers.append(None)
+    return pa.schema(fields), marshallers
+
+def write_columnar(outfile, table, chunks, format='parquet',
+                   compression=None, row_group_size=DEFAULT_ROW_GROUP_SIZE):
+    """
+    Write ``chunks`` (an iterable of lists of rows of Python values in the
+    order of ``table.columns``) to the binary file-like object or path
+    ``outfile`` in the given columnar format.  Chunks are collected into
+    Parquet row groups (or Arrow record batches) of ``row_group_size`` rows
+    each (except for the last), independently of the size of the chunks.
+    """
+    if row_group_size < 1:
+        raise ValueError('row_group_size must be positive')
+    pa = import_pyarrow()
+    columnar_suffix(format)
+    schema, marshallers = arrow_schema(table)
+    if format == 'parquet':
+        import pyarrow.parquet as pq
+        kwargs = {} if compression is None else {"compression": compression}
+        writer = pq.ParquetWriter(outfile, schema, **kwargs)
+
+        def write(group):
+            writer.write_table(group, row_group_size=row_group_size)
+    else:
+        options = pa.ipc.IpcWriteOptions(compression=compression)
+        writer = pa.ipc.new_file(outfile, schema, options=options)
+
+        def write(group):
+            writer.write_table(group, max_chunksize=row_group_size)
+    try:
+        pending = []
+        npending = 0
+        for rows in chunks:
+            columns = list(zip(*rows))
+            arrays = []
+            for field, m, values in zip(schema, marshallers, columns):
+                if m is not None:
+                    values = [None if v is None else m(v) for v in values]
+                arrays.append(pa.array(values, type=field.type))
+            pending.append(pa.RecordBatch.from_arrays(arrays, schema=schema))
+            npending += len(rows)
+            if npending >= row_group_size:
+                # Combine the chunks so that each group is written as one
+                # contiguous row group or batch
+                group = pa.Table.from_batches(pending, schema=schema)\
+                                .combine_chunks()
+                while group.num_rows >= row_group_size:
+                    write(group.slice(0, row_group_size))
+                    group = group.slice(row_group_size)
+                pending = group.to_batches()
+                npending = group.num_rows
+        if npending:
+            write(pa.Table.from_batches(pending, schema=schema)
+                          .combine_chunks())
+    finally:
+        writer.close()
+
+def read_columnar(infile, table, batch_size, format='parquet'):
+    """
+    Read the columnar file ``infile`` (a binary file-like object or path)
+    containing rows of ``table``.  Returns a pair of the list of the column
+    names in the file and a generator of lists of up to ``batch_size`` rows,
+    each a tuple of Python values for the columns in that order.
+    """
+    pa = import_pyarrow()
+    columnar_suffix(format)
+    if format == 'parquet':
+        import pyarrow.parquet as pq
+        pf = pq.ParquetFile(infile)
+        schema = pf.schema_arrow
+        batches = pf.iter_batches(batch_size)
+    else:
+        reader = pa.ipc.open_file(infile)
+        schema = reader.schema
+        batches = (
+            b.slice(offset, batch_size)
+            for b in map(reader.get_batch, range(reader.num_record_batches))
+            for offset in range(0, b.num_rows, batch_size)
+        )
+    columns = schema.names
+    unmarshallers = [
+        None if arrow_type(table.columns[c].type) is not None
+             else field_unmarshaller(table.columns[c].type)
+        for c in columns
+    ]
+
+    def rows():
+        for batch in batches:
+            values = []
+            for col, u in zip(batch.columns, unmarshallers):
+                col = col.to_pylist()
+                if u is not None:
+                    col = [None if s is None else u(s) for s in col]
+                values.append(col)
+            yield list(zip(*values))
+
+    return columns, rows()
@@ -0,0 +1,275 @@
+"""
+Reading & writing compressed CSV files
+
+Compressed files are written through a background thread, so that compressing
+one block of output overlaps with fetching & marshalling the next.  gzip
+support is always available; zstd and lz4 support require the ``zstandard``
+and ``lz4`` packages, respectively.
+"""
+
+import gzip
+import io
+import locale
+import os
+from   queue     import Queue
+from   threading import Thread
+
+#: Mapping from supported compression names to the filename extensions added
+#: after ``.csv``
+COMPRESSION_SUFFIXES = {
+    'gzip': '.gz',
+    'zstd': '.zst',
+    'lz4': '.lz4',
+}
+
+#: Size of the blocks handed to the compression thread
+BLOCK_SIZE = 1 << 16
+
+#: Maximum number of blocks waiting to be compressed
+QUEUE_SIZE = 16
+
+#: Default number of characters that a `BlockWriter` collects before encoding
+#: & writing them
+DIRECT_BLOCK_SIZE = 1 << 22
+
+def csv_suffix(compression=None):
+    """ Return the filename suffix for a CSV file with the given compression """
+    if compression is None:
+        return '.csv'
+    try:
+        return '.csv' + COMPRESSION_SUFFIXES[compression]
+    except KeyError:
+        raise ValueError('Unsupported compression: {!r}'.format(compression))
+
+def compression_for_path(path):
+    """
+    Return the name of the compression used by the file at ``path`` based on
+    its extension, or `None` if it is not compressed
+    """
+    for name, suffix in COMPRESSION_SUFFIXES.items():
+        if str(path).endswith(suffix):
+            return name
+    return None
+
+def open_csv(path, mode, buffer_size=None, direct_write=False, digest=None):
+    """
+    Open the possibly-compressed (as determined by the extension) CSV file at
+    ``path`` as a text stream, in mode ``'r'`` or ``'w'``.  ``buffer_size``
+    sets the size in bytes of the file's write buffer (default: the `io`
+    default for uncompressed files, `BLOCK_SIZE` for compressed files).  If
+    ``direct_write`` is true (only supported for writing uncompressed files),
+    a `BlockWriter` is returned instead.  If ``digest`` (a `hashlib` hash
+    object) is given when writing, it is updated with the bytes written to
+    the file (after compression) as they are written.
+    """
+    compression = compression_for_path(path)
+    if direct_write:
+        if mode != 'w' or compression is not None:
+            raise ValueError('direct_write is only supported when writing'
+                             ' uncompressed files')
+        return BlockWriter.open(path, buffer_size or DIRECT_BLOCK_SIZE,
+                                digest=digest)
+    if mode == 'w' and digest is not None:
+        raw = HashingWriter(open(str(path), 'wb', buffering=0), digest)
+    else:
+        raw = None
+    if compression is None:
+        if raw is None:
+            return open(str(path), mode, buffering=buffer_size or -1)
+        return io.TextIOWrapper(io.BufferedWriter(
+            raw, buffer_size=buffer_size or io.DEFAULT_BUFFER_SIZE,
+        ))
+    elif mode == 'r':
+        return io.TextIOWrapper(open_codec(compression, path, 'rb'))
+    elif mode == 'w':
+        compressed = open_codec(compression, path, 'wb', fileobj=raw)
+        return io.TextIOWrapper(io.BufferedWriter(
+            ThreadedWriter(compressed, raw=raw),
+            buffer_size=buffer_size or BLOCK_SIZE,
+        ))
+    else:
+        raise ValueError('Unsupported mode: {!r}'.format(mode))
+
+def open_codec(compression, path, mode, fileobj=None):
+    """
+    Open the file at ``path`` (or the binary stream ``fileobj``, if given)
+    for compression or decompression with the given codec
+    """
+    target = str(path) if fileobj is None else fileobj
+    if compression == 'gzip':
+        return gzip.open(target, mode)
+    elif compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise RuntimeError('zstd compression requires the zstandard'
+                               ' package to be installed')
+        return zstandard.open(target, mode)
+    elif compression == 'lz4':
+        try:
+            import lz4.frame
+        except ImportError:
+            raise RuntimeError('lz4 compression requires the lz4 package to'
+                               ' be installed')
+        return lz4.frame.open(target, mode)
+    else:
+        raise ValueError('Unsupported compression: {!r}'.format(compression))
+
+class ThreadedWriter(io.RawIOBase):
+    """
+    A writable binary stream that passes everything written to it to the
+    binary stream ``fp`` in a background thread.  ``fp`` is closed when the
+    `ThreadedWriter` is closed; any error raised while writing to it is
+    re-raised by the next `write()` or by `close()`.  If ``fp`` writes to a
+    binary stream ``raw`` that it does not close itself, pass it as ``raw``
+    to have it closed after ``fp``.
+    """
+
+    def __init__(self, fp, maxsize=QUEUE_SIZE, raw=None):
+        super().__init__()
+        self.fp = fp
+        self.raw = raw
+        self.queue = Queue(maxsize)
+        self.error = None
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            chunk = self.queue.get()
+            if chunk is None:
+                break
+            if self.error is None:
+                try:
+                    self.fp.write(chunk)
+                except Exception as e:
+                    # Keep draining the queue so that the writer doesn't
+                    # block forever
+                    self.error = e
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        if self.error is not None:
+            raise self.error
+        self.queue.put(bytes(b))
+        return len(b)
+
+    def close(self):
+        if not self.closed:
+            self.queue.put(None)
+            self.thread.join()
+            try:
+                try:
+                    self.fp.close()
+                finally:
+                    if self.raw is not None:
+                        self.raw.close()
+            finally:
+                super().close()
+            if self.error is not None:
+                raise self.error
+
+class HashingWriter(io.RawIOBase):
+    """
+    A writable binary stream that writes to the binary stream ``fp`` and
+    updates the `hashlib` hash object ``digest`` with the bytes written, so
+    that a file's checksum is computed as it is written instead of by reading
+    it back.  ``fp`` is closed when the `HashingWriter` is closed.
+    """
+
+    def __init__(self, fp, digest):
+        super().__init__()
+        self.fp = fp
+        self.digest = digest
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        n = self.fp.write(b)
+        if n is None:
+            n = len(b)
+        self.digest.update(memoryview(b)[:n])
+        self.position += n
+        return n
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        self.fp.flush()
+
+    def close(self):
+        if not self.closed:
+            try:
+                super().close()
+            finally:
+                self.fp.close()
+
+class BlockWriter:
+    """
+    A minimal writable text stream that collects the strings written to it
+    and, once they total at least ``block_size`` characters, encodes them in
+    one go and writes the result to the file descriptor ``fd`` with
+    `os.write()`, so that each block costs one encoding call and (usually) one
+    system call.  ``fd`` is closed when the `BlockWriter` is closed.
+    ``encoding`` defaults to the locale's preferred encoding, as used by
+    `open()`.  If ``digest`` (a `hashlib` hash object) is given, it is updated
+    with each block written.
+    """
+
+    def __init__(self, fd, block_size=DIRECT_BLOCK_SIZE, encoding=None,
+                 digest=None):
+        self.fd = fd
+        self.block_size = block_size
+        self.digest = digest
+        if encoding is None:
+            encoding = locale.getpreferredencoding(False)
+        self.encoding = encoding
+        self.parts = []
+        self.size = 0
+        self.closed = False
+
+    @classmethod
+    def open(cls, path, block_size=DIRECT_BLOCK_SIZE, encoding=None,
+             digest=None):
+        fd = os.open(
+            str(path),
+            os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0),
+            0o666,
+        )
+        return cls(fd, block_size, encoding, digest)
+
+    def write(self, s):
+        self.parts.append(s)
+        self.size += len(s)
+        if self.size >= self.block_size:
+            self.flush()
+        return len(s)
+
+    def flush(self):
+        if self.parts:
+            data = memoryview(''.join(self.parts).encode(self.encoding))
+            if self.digest is not None:
+                self.digest.update(data)
+            self.parts = []
+            self.size = 0
+            while data:
+                data = data[os.write(self.fd, data):]
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            try:
+                self.flush()
+            finally:
+                os.close(self.fd)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_exc):
+        self.close()
@@ -0,0 +1,121 @@
+"""
+Dropping a table's secondary indexes & foreign key constraints before a load
+and recreating them afterwards
+
+Only the indexes & constraints defined on the `~sqlalchemy.schema.Table`
+objects are affected.  Indexes are matched against those in the database by
+name.  Foreign key constraints are matched by their constrained columns &
+referred table, so that constraints left unnamed in the metadata are found
+under the names that the database gave them; they are only deferred if the
+dialect supports ``ALTER TABLE`` (so not on SQLite).
+"""
+
+import sqlalchemy as S
+from   sqlalchemy.schema import AddConstraint, DropConstraint
+
+def deferrable_fks(conn, table):
+    """
+    Return the foreign key constraints of ``table`` that can be dropped &
+    recreated on ``conn``
+    """
+    if not conn.dialect.supports_alter:
+        return []
+    return sorted(table.foreign_key_constraints, key=fk_key)
+
+def fk_key(fk):
+    """
+    Return a pair of the names of the constrained columns and the name of the
+    referred table of the foreign key constraint ``fk``, for matching it
+    against the constraints in the database
+    """
+    return (tuple(c.name for c in fk.columns), fk.referred_table.name)
+
+def existing_fks(conn, table):
+    """
+    Return a `dict` mapping the `fk_key()` of each foreign key constraint on
+    ``table`` in the database to the constraint's name
+    """
+    return {
+        (tuple(fk["constrained_columns"]), fk["referred_table"]): fk["name"]
+        for fk in S.inspect(conn).get_foreign_keys(
+            table.name, schema=table.schema,
+        )
+    }
+
+def named_fk(fk, name):
+    """
+    Return a copy of the foreign key constraint ``fk`` named ``name``, on a
+    stand-in for its table, so that it can be dropped or added under the name
+    that it has in the database without modifying the metadata
+    """
+    table = fk.table
+    return S.ForeignKeyConstraint(
+        [c.name for c in fk.columns],
+        [elem.column for elem in fk.elements],
+        name=name,
+        onupdate=fk.onupdate,
+        ondelete=fk.ondelete,
+        deferrable=fk.deferrable,
+        initially=fk.initially,
+        match=fk.match,
+        table=S.Table(
+            table.name, S.MetaData(),
+            *[S.Column(c.name, c.type) for c in fk.columns],
+            schema=table.schema
+        ),
+    )
+
+def existing_index_names(conn, table):
+    return {
+        ix["name"]
+        for ix in S.inspect(conn).get_indexes(table.name, schema=table.schema)
+    }
+
+def drop_indexes(conn, table):
+    """
+    Drop the deferrable foreign key constraints and the indexes of ``table``
+    (other than the primary key's) that currently exist in the database.
+    Returns a `dict` mapping the `fk_key()` of each foreign key constraint
+    dropped to its name in the database, for passing to `create_fks()`.
+    """
+    dropped = {}
+    fks = deferrable_fks(conn, table)
+    if fks:
+        existing = existing_fks(conn, table)
+        for fk in fks:
+            name = existing.get(fk_key(fk))
+            if name is not None:
+                conn.execute(DropConstraint(named_fk(fk, name)))
+                dropped[fk_key(fk)] = name
+    existing = existing_index_names(conn, table)
+    for ix in sorted(table.indexes, key=lambda ix: ix.name):
+        if ix.name in existing:
+            ix.drop(conn)
+    return dropped
+
+def create_indexes(conn, table):
+    """ Create the indexes of ``table`` that do not exist in the database """
+    existing = existing_index_names(conn, table)
+    for ix in sorted(table.indexes, key=lambda ix: ix.name):
+        if ix.name not in existing:
+            ix.create(conn)
+
+def create_fks(conn, table, names=None):
+    """
+    Create the deferrable foreign key constraints of ``table`` that do not
+    exist in the database.  Each constraint is given the name it had when
+    dropped, as recorded in ``names`` (a return value of `drop_indexes()`), if
+    any, else its name in the metadata, else the name that the database picks
+    by default.
+    """
+    if names is None:
+        names = {}
+    fks = deferrable_fks(conn, table)
+    if fks:
+        existing = existing_fks(conn, table)
+        for fk in fks:
+            key = fk_key(fk)
+            if key not in existing:
+                conn.execute(AddConstraint(
+                    named_fk(fk, names.get(key, fk.name)),
+                ))
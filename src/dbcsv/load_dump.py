@@ -1,31 +1,790 @@
+from   contextlib   import closing
 import csv
+import hashlib
+import io
+from   itertools    import islice
+import json
+import locale
 from   pathlib      import Path
+import re
+from   time         import perf_counter
 import sqlalchemy as S
-from   .marshalling import marshal_object, unmarshal_object
+from   .bulk        import get_bulk_dumper, get_bulk_loader, prepared_insert, \
+                           process_row
+from   .columnar    import COLUMNAR_SUFFIXES, DEFAULT_ROW_GROUP_SIZE, \
+                           columnar_format_for_path, columnar_suffix, \
+                           read_columnar, write_columnar
+from   .compression import COMPRESSION_SUFFIXES, HashingWriter, \
+                           compression_for_path, csv_suffix, open_csv
+from   .indexes     import create_fks, create_indexes, drop_indexes
+from   .manifest    import LOADED_FILE, MANIFEST_FILE, check_files, \
+                           check_table, file_entry, files_digest, \
+                           load_target, table_entry
+from   .marshalling import field_marshaller, field_unmarshaller, get_codec_plan
+from   .merge       import merge_rows
+from   .multiproc   import marshal_rows, parse_range, pool_map, \
+                           unmarshal_rows, worker_pool
+from   .observe     import CountingWriter, NULL_OBSERVER, RowCountingWriter, \
+                           TableStats, TotalRowsObserver, counting_lines, \
+                           observe_batches, timed_iter
+from   .pipeline    import pipelined_read, pipelined_write
+from   .splitting   import split_records
 
-def dumpdb(conn, metadata, dirpath):
+DEFAULT_BATCH_SIZE = 1000
+
+#: Name of the file in which `loaddb()` records its progress when
+#: checkpointing
+CHECKPOINT_FILE = 'dbcsv-checkpoint.json'
+
+#: Name of the file in which `dumpdb()` records the watermarks of tables
+#: dumped incrementally
+WATERMARK_FILE = 'dbcsv-watermarks.json'
+
+def dumpdb(conn, metadata, dirpath, stream=False,
+           chunk_size=DEFAULT_BATCH_SIZE, processes=None, bulk=False,
+           compression=None, watermarks=None, format='csv', observer=None,
+           pipeline=False, buffer_size=None, direct_write=False,
+           manifest=False, row_group_size=DEFAULT_ROW_GROUP_SIZE):
     dirpath = Path(dirpath)
     dirpath.mkdir(parents=True, exist_ok=True)
+    if manifest:
+        entries = read_json(dirpath / MANIFEST_FILE, "tables")
+    if format != 'csv':
+        if watermarks:
+            raise ValueError('Incremental dumps are only supported for CSV')
+        suffix = columnar_suffix(format)
+    else:
+        suffix = csv_suffix(compression)
+    # Tables dumped in full start over without their earlier deltas so that
+    # the deltas are not merged over the new files
+    discard_deltas(dirpath, [
+        tbl for tbl in metadata.sorted_tables
+            if not (watermarks and tbl.name in watermarks)
+    ])
+    if format != 'csv':
+        for tbl in metadata.sorted_tables:
+            discard_table_files(dirpath, tbl)
+            path = dirpath / (tbl.name + suffix)
+            fp = path.open('wb', buffering=0 if manifest else -1)
+            if manifest:
+                digest = hashlib.sha256()
+                fp = io.BufferedWriter(HashingWriter(fp, digest))
+            with fp:
+                stats = dump_table(conn, tbl, fp, stream=stream,
+                                   chunk_size=chunk_size, format=format,
+                                   compression=compression, observer=observer,
+                                   row_group_size=row_group_size)
+            if manifest:
+                entries[tbl.name] = table_entry(tbl, {
+                    path.name: file_entry(path, stats.rows,
+                                          digest.hexdigest()),
+                })
+                write_json(dirpath / MANIFEST_FILE, "tables", entries)
+        return
+    if watermarks:
+        state = read_json(dirpath / WATERMARK_FILE, "tables")
     for tbl in metadata.sorted_tables:
-        with (dirpath / (tbl.name + '.csv')).open('w') as fp:
-            dump_table(conn, tbl, fp)
+        # The checksum of each file is computed as it is written
+        digest = hashlib.sha256() if manifest else None
+        if watermarks and tbl.name in watermarks:
+            written = dump_table_incremental(
+                conn, tbl, dirpath, watermarks[tbl.name], state,
+                compression=compression, stream=stream, chunk_size=chunk_size,
+                processes=processes, bulk=bulk, observer=observer,
+                pipeline=pipeline, buffer_size=buffer_size,
+                direct_write=direct_write, digest=digest,
+            )
+            write_json(dirpath / WATERMARK_FILE, "tables", state)
+            if not manifest:
+                continue
+            if written is not None and state[tbl.name]["deltas"] == 0:
+                path, stats = written
+                entries[tbl.name] = table_entry(tbl, {
+                    path.name: file_entry(path, stats.rows,
+                                          digest.hexdigest()),
+                })
+            else:
+                new = None if written is None else written[0].name
+                if tbl.name not in entries:
+                    # The manifest was not written by earlier dumps, so their
+                    # files have to be read back to checksum them, and their
+                    # row counts are unknown
+                    entries[tbl.name] = table_entry(tbl, {
+                        p.name: file_entry(p, None)
+                        for p in table_files(dirpath, tbl)
+                                 + delta_files(dirpath, tbl)
+                        if p.name != new
+                    })
+                if written is not None:
+                    path, stats = written
+                    entries[tbl.name]["files"][path.name] \
+                        = file_entry(path, stats.rows, digest.hexdigest())
+        else:
+            discard_table_files(dirpath, tbl)
+            path = dirpath / (tbl.name + suffix)
+            with open_csv(path, 'w', buffer_size=buffer_size,
+                          direct_write=direct_write, digest=digest) as fp:
+                stats = dump_table(conn, tbl, fp, stream=stream,
+                                   chunk_size=chunk_size, processes=processes,
+                                   bulk=bulk, observer=observer,
+                                   pipeline=pipeline)
+            if not manifest:
+                continue
+            entries[tbl.name] = table_entry(tbl, {
+                path.name: file_entry(path, stats.rows, digest.hexdigest()),
+            })
+        write_json(dirpath / MANIFEST_FILE, "tables", entries)
+
+def dump_table_incremental(conn, table, dirpath, column, state,
+                           compression=None, buffer_size=None,
+                           direct_write=False, digest=None, **kwargs):
+    """
+    Dump the rows of ``table`` whose values for ``column`` are greater than
+    the watermark recorded for the table in ``state`` to the next delta file
+    in ``dirpath`` and update ``state`` with the new watermark.  If ``state``
+    has no entry for the table, the table is dumped in full to its regular
+    file instead.  Returns a pair of the path written and the dump's
+    `TableStats`, or `None` if nothing was written because no rows are past
+    the watermark.  ``buffer_size``, ``direct_write``, and ``digest`` are
+    passed to `open_csv()`.
+    """
+    if isinstance(column, str):
+        column = table.columns[column]
+    entry = state.get(table.name)
+    if entry is not None and entry["column"] != column.name:
+        raise ValueError(
+            'Table {} was dumped with watermark column {}, not {}'
+            .format(table.name, entry["column"], column.name)
+        )
+    # Fix the upper bound before selecting any rows so that rows written
+    # during the dump are left for the next delta instead of being missed
+    hi = conn.execute(S.select([S.func.max(column)])).scalar()
+    if entry is None:
+        if hi is None:
+            clause = None
+        else:
+            clause = S.or_(column <= hi, column.is_(None))
+        path = dirpath / (table.name + csv_suffix(compression))
+        deltas = 0
+        # Files left over from before the watermark was forgotten
+        discard_table_files(dirpath, table)
+        for p in delta_files(dirpath, table):
+            p.unlink()
+    else:
+        lo = field_unmarshaller(column.type)(entry["watermark"])
+        if hi is None or (lo is not None and hi <= lo):
+            return
+        if lo is None:
+            clause = column <= hi
+        else:
+            clause = S.and_(column > lo, column <= hi)
+        deltas = entry["deltas"] + 1
+        path = delta_path(dirpath, table, deltas, compression)
+    with open_csv(path, 'w', buffer_size=buffer_size,
+                  direct_write=direct_write, digest=digest) as fp:
+        stats = dump_table(conn, table, fp, whereclause=clause, **kwargs)
+    state[table.name] = {
+        "column": column.name,
+        "watermark": field_marshaller(column.type)(hi),
+        "deltas": deltas,
+    }
+    return (path, stats)
+
+def dump_table(conn, table, outfile, stream=False,
+               chunk_size=DEFAULT_BATCH_SIZE, whereclause=None,
+               processes=None, bulk=False, format='csv', compression=None,
+               observer=None, pipeline=False, order_by=None,
+               row_group_size=DEFAULT_ROW_GROUP_SIZE):
+    if chunk_size < 1:
+        raise ValueError('chunk_size must be positive')
+    if observer is None:
+        observer = NULL_OBSERVER
+    stats = TableStats(table.name, 'dump')
+    observer.table_started(stats)
+    if format != 'csv':
+        dump_table_columnar(conn, table, outfile, stats, observer,
+                            stream=stream, chunk_size=chunk_size,
+                            whereclause=whereclause, format=format,
+                            compression=compression, order_by=order_by,
+                            row_group_size=row_group_size)
+    else:
+        dump_table_csv(conn, table, outfile, stats, observer, stream=stream,
+                       chunk_size=chunk_size, whereclause=whereclause,
+                       processes=processes, bulk=bulk, pipeline=pipeline,
+                       order_by=order_by)
+    stats.end = perf_counter()
+    observer.table_finished(stats)
+    return stats
+
+def dump_table_csv(conn, table, outfile, stats, observer, stream=False,
+                   chunk_size=DEFAULT_BATCH_SIZE, whereclause=None,
+                   processes=None, bulk=False, pipeline=False, order_by=None):
+    plan = get_codec_plan(table)
+    if observer is not NULL_OBSERVER:
+        outfile = CountingWriter(outfile, stats)
+    writer = csv.writer(outfile)
+    writer.writerow(plan.columns)
+    # Bulk dumpers take no ordering
+    if bulk and order_by is None:
+        dumper = get_bulk_dumper(conn.dialect.name)
+        if dumper is not None:
+            counter = RowCountingWriter(writer, stats, observer)
+            start = perf_counter()
+            if dumper(conn, table, counter, whereclause):
+                stats.db_time += perf_counter() - start
+                return
+    if stream:
+        # Ask the driver for a server-side cursor (where supported) so that
+        # rows are only transferred as they are fetched
+        conn = conn.execution_options(stream_results=True)
+    result = conn.execute(select_rows(table, whereclause, order_by))
+    try:
+        # `S.select([table])` returns the columns in the same order as the
+        # plan
+        chunks = timed_iter(fetch_chunks(result, chunk_size), stats, 'db_time')
+        timings = stats.column_times if observer.time_columns else None
+        if pipeline and not processes:
+            # Marshalling & writing happen in their own threads, so the time
+            # that this thread spends blocked on them counts as conversion
+            queued = pipelined_write(
+                writer,
+                lambda entries: plan.marshal_columns(entries, timings),
+                chunks,
+            )
+            with closing(queued):
+                for _ in observe_batches(queued, stats, observer, 'db_time',
+                                         'io_time'):
+                    pass
+            return
+        if processes:
+            batches = pool_map(
+                table,
+                marshal_rows,
+                (list(map(tuple, entries)) for entries in chunks),
+                processes,
+            )
+        else:
+            batches = (
+                plan.marshal_columns(entries, timings) for entries in chunks
+            )
+        for rows in observe_batches(batches, stats, observer, 'db_time',
+                                    'io_time'):
+            writer.writerows(rows)
+    finally:
+        result.close()
+
+def dump_table_columnar(conn, table, outfile, stats, observer, stream=False,
+                        chunk_size=DEFAULT_BATCH_SIZE, whereclause=None,
+                        format='parquet', compression=None, order_by=None,
+                        row_group_size=DEFAULT_ROW_GROUP_SIZE):
+    if stream:
+        conn = conn.execution_options(stream_results=True)
+    result = conn.execute(select_rows(table, whereclause, order_by))
+    try:
+        # The conversion to Arrow happens in `write_columnar()` and so is
+        # counted as I/O
+        chunks = observe_batches(
+            timed_iter(fetch_chunks(result, chunk_size), stats, 'db_time'),
+            stats, observer, 'db_time', 'io_time',
+        )
+        write_columnar(outfile, table, chunks, format=format,
+                       compression=compression, row_group_size=row_group_size)
+    finally:
+        result.close()
+
+def select_rows(table, whereclause=None, order_by=None):
+    """
+    Return a query for the rows of ``table`` matching ``whereclause`` (if
+    any), sorted by the list of columns or ordering clauses ``order_by`` (if
+    any)
+    """
+    query = S.select([table], whereclause)
+    if order_by is not None:
+        query = query.order_by(*order_by)
+    return query
 
-def dump_table(conn, table, outfile):
-    writer = csv.DictWriter(outfile, table.columns.keys())
-    writer.writeheader()
-    for entry in conn.execute(S.select([table])):
-        writer.writerow(marshal_object(table, entry))
+def fetch_chunks(result, chunk_size):
+    """ Yield lists of up to ``chunk_size`` rows from ``result`` """
+    while True:
+        entries = result.fetchmany(chunk_size)
+        if not entries:
+            return
+        yield entries
 
-def loaddb(conn, metadata, dirpath):
+def loaddb(conn, metadata, dirpath, batch_size=DEFAULT_BATCH_SIZE,
+           processes=None, bulk=False, checkpoint=None, merge=False,
+           defer_indexes=False, observer=None, pipeline=False, verify=False,
+           skip_unchanged=False, split=False):
     dirpath = Path(dirpath)
+    if checkpoint is not None:
+        if checkpoint < 1:
+            raise ValueError('checkpoint must be positive')
+        if conn.in_transaction():
+            raise ValueError('Checkpointed loads cannot be performed inside'
+                             ' a transaction')
+        progress = read_json(dirpath / CHECKPOINT_FILE, "files")
+    # Check everything listed in the manifest before loading anything
+    manifest = read_json(dirpath / MANIFEST_FILE, "tables")
     for tbl in metadata.sorted_tables:
+        entry = manifest.get(tbl.name)
+        if entry is not None:
+            check_table(entry, tbl)
+            check_files(entry, tbl, dirpath, verify=verify)
+    if skip_unchanged:
+        # What was loaded is recorded separately for each database so that
+        # loading the same dump into another database loads everything
+        target = load_target(conn)
+        targets = read_json(dirpath / LOADED_FILE, "targets")
+        loaded = targets.get(target, {})
+    if observer is not None and manifest:
+        observer = TotalRowsObserver(observer)
+    # The names of the foreign key constraints dropped from each table, so
+    # that they can be recreated under the same names
+    fk_names = {}
+    for tbl in metadata.sorted_tables:
+        entry = manifest.get(tbl.name)
+        if entry is None:
+            paths = [(p, merge) for p in table_files(dirpath, tbl)]
+            paths.extend((p, True) for p in delta_files(dirpath, tbl))
+        elif skip_unchanged and tbl.name in loaded:
+            # The table was loaded before, so merge the files into it.  If
+            # only new files (i.e., deltas) have been added since then, load
+            # just those.
+            before = loaded[tbl.name]
+            files = files_digest(entry)
+            paths = manifest_files(dirpath, tbl, entry, True)
+            if all(files.get(n) == c for n, c in before.items()):
+                paths = [(p, m) for p, m in paths if p.name not in before]
+            if not paths:
+                continue
+        else:
+            # Other files for the table are left over from some other dump
+            paths = manifest_files(dirpath, tbl, entry, merge)
+        if defer_indexes and paths:
+            fk_names[tbl.name] = drop_indexes(conn, tbl)
+        for path, merging in paths:
+            if isinstance(observer, TotalRowsObserver):
+                observer.total_rows \
+                    = entry and entry["files"][path.name]["rows"]
+            try:
+                if checkpoint is not None:
+                    load_file_resumable(
+                        conn, tbl, path, dirpath, progress, checkpoint,
+                        batch_size=batch_size, processes=processes, bulk=bulk,
+                        merge=merging, observer=observer,
+                    )
+                else:
+                    load_file(conn, tbl, path, batch_size=batch_size,
+                              processes=processes, bulk=bulk, merge=merging,
+                              observer=observer, pipeline=pipeline,
+                              split=split)
+            except FileNotFoundError:
+                pass
+    if defer_indexes:
+        # Recreate every missing index & constraint (not just those dropped
+        # above) so that a resumed checkpointed load restores those dropped
+        # by the failed attempt
+        for tbl in metadata.sorted_tables:
+            create_indexes(conn, tbl)
+        for tbl in metadata.sorted_tables:
+            create_fks(conn, tbl, fk_names.get(tbl.name))
+    if checkpoint is not None:
+        try:
+            (dirpath / CHECKPOINT_FILE).unlink()
+        except FileNotFoundError:
+            pass
+    if skip_unchanged and manifest:
+        for tbl in metadata.sorted_tables:
+            if tbl.name in manifest:
+                loaded[tbl.name] = files_digest(manifest[tbl.name])
+        targets[target] = loaded
+        write_json(dirpath / LOADED_FILE, "targets", targets)
+
+def read_json(path, key):
+    """
+    Return the ``key`` field of the JSON state file at ``path``, or an empty
+    `dict` if there is no such file
+    """
+    try:
+        with path.open() as fp:
+            return json.load(fp)[key]
+    except FileNotFoundError:
+        return {}
+
+def write_json(path, key, data):
+    # Write to a temporary file and then rename it so that a crash mid-write
+    # doesn't leave a corrupted state file behind
+    tmppath = path.with_name(path.name + '.tmp')
+    with tmppath.open('w') as fp:
+        json.dump({key: data}, fp, indent=4, sort_keys=True)
+    tmppath.replace(path)
+
+def load_file(conn, table, path, split=False, **kwargs):
+    """
+    Load the CSV or columnar file at ``path`` into ``table``, with the format
+    & compression determined by the file extension.  If ``split`` is true and
+    ``processes`` is given, an uncompressed CSV file is loaded with
+    `load_csv_split()`.
+    """
+    format = columnar_format_for_path(path)
+    if format is not None:
+        with path.open('rb') as fp:
+            load_table(conn, table, fp, format=format, **kwargs)
+    elif split and kwargs.get("processes") \
+            and compression_for_path(path) is None:
+        # The workers already overlap parsing with inserting
+        kwargs.pop("pipeline", None)
+        load_csv_split(conn, table, path, **kwargs)
+    else:
+        with open_csv(path, 'r') as fp:
+            load_table(conn, table, fp, **kwargs)
+
+def load_csv_split(conn, table, path, batch_size=DEFAULT_BATCH_SIZE,
+                   processes=None, bulk=False, merge=False, observer=None):
+    """
+    Load the uncompressed CSV file at ``path`` into ``table`` by splitting it
+    into ranges of records with `split_records()` and parsing & unmarshalling
+    the ranges in a pool of ``processes`` worker processes, so that parsing
+    is not limited to one core
+    """
+    if batch_size < 1:
+        raise ValueError('batch_size must be positive')
+    if observer is None:
+        observer = NULL_OBSERVER
+    stats = TableStats(table.name, 'load')
+    observer.table_started(stats)
+    header, ranges = split_records(path)
+    if header is not None:
+        # Decode the file the same way that `open()` does for the serial path
+        encoding = locale.getpreferredencoding(False)
+        fp = io.StringIO(header.decode(encoding), newline=None)
+        columns = next(csv.reader(fp))
+        # Like the serial path, count characters rather than bytes, as each
+        # range is parsed
+        stats.nbytes = len(fp.getvalue())
+        results = pool_map(
+            table,
+            parse_range,
+            (
+                (path, start, end, columns, batch_size, encoding)
+                for start, end in ranges
+            ),
+            processes,
+        )
+
+        def range_batches():
+            for nchars, result in results:
+                stats.nbytes += nchars
+                yield from result
+
+        batches = range_batches()
+        insert_batches(
+            conn, table, columns,
+            observe_batches(batches, stats, observer, 'io_time', 'db_time'),
+            bulk=bulk, merge=merge,
+        )
+    stats.end = perf_counter()
+    observer.table_finished(stats)
+
+def load_file_resumable(conn, table, path, dirpath, progress, checkpoint,
+                        batch_size=DEFAULT_BATCH_SIZE, processes=None,
+                        bulk=False, merge=False, observer=None):
+    """
+    Load the CSV file at ``path`` into ``table``, committing after every
+    ``checkpoint`` rows and recording in ``progress`` (which is then saved to
+    ``dirpath``'s checkpoint file) how far into the file the load has gotten.
+    If ``progress`` shows that part of the file has already been loaded, the
+    load resumes from there.  Columnar files are instead loaded in a single
+    transaction each.
+    """
+    entry = progress.setdefault(path.name, {
+        "table": table.name,
+        "offset": None,
+        "rows": 0,
+        "done": False,
+    })
+    if entry["done"]:
+        return
+    if columnar_format_for_path(path) is not None:
+        with conn.begin():
+            load_file(conn, table, path, batch_size=batch_size,
+                      processes=processes, bulk=bulk, merge=merge,
+                      observer=observer)
+        entry["done"] = True
+        write_json(dirpath / CHECKPOINT_FILE, "files", progress)
+        return
+    if observer is None:
+        observer = NULL_OBSERVER
+    stats = TableStats(table.name, 'load')
+    observer.table_started(stats)
+    with open_csv(path, 'r') as fp:
+        # Read lines with `readline()` instead of iterating over `fp` so that
+        # `fp.tell()` can be used
+        reader = csv.reader(counting_lines(iter(fp.readline, ''), stats))
+        columns = next(reader, None)
+        if columns is not None:
+            seekable = fp.seekable()
+            if entry["offset"] is not None:
+                fp.seek(entry["offset"])
+            elif entry["rows"]:
+                # The file couldn't be seeked in when last loaded, so skip
+                # over the rows that were loaded
+                for _ in islice(reader, entry["rows"]):
+                    pass
+            # Start the worker processes once per file rather than once per
+            # checkpoint
+            pool = worker_pool(table, processes) if processes else None
+            try:
+                while True:
+                    rows = list(islice(reader, checkpoint))
+                    if not rows:
+                        break
+                    with conn.begin():
+                        load_records(
+                            conn, table, columns, rows,
+                            batch_size=batch_size, processes=processes,
+                            bulk=bulk, merge=merge, observer=observer,
+                            stats=stats, pool=pool,
+                        )
+                    entry["offset"] = fp.tell() if seekable else None
+                    entry["rows"] += len(rows)
+                    write_json(dirpath / CHECKPOINT_FILE, "files", progress)
+            finally:
+                if pool is not None:
+                    pool.terminate()
+                    pool.join()
+    entry["done"] = True
+    write_json(dirpath / CHECKPOINT_FILE, "files", progress)
+    stats.end = perf_counter()
+    observer.table_finished(stats)
+
+def table_files(dirpath, table):
+    """
+    Return a list of the paths in ``dirpath`` from which to load ``table``:
+    ``{table.name}.csv`` if it exists, otherwise the shards
+    ``{table.name}.part-NNNN.csv`` in order.  Compressed files (e.g.,
+    ``{table.name}.csv.gz``) are looked for after each uncompressed name, and
+    columnar files (e.g., ``{table.name}.parquet``) after all CSV names.
+    """
+    suffixes = [csv_suffix(c) for c in [None, *COMPRESSION_SUFFIXES]]
+    for suffix in suffixes + list(COLUMNAR_SUFFIXES.values()):
+        path = dirpath / (table.name + suffix)
+        if path.exists():
+            return [path]
+    for suffix in suffixes:
+        shards = sorted(dirpath.glob(glob_escape(table.name + '.part-') + '*'
+                                     + glob_escape(suffix)))
+        if shards:
+            return shards
+    return []
+
+def discard_table_files(dirpath, table):
+    """
+    Delete the regular files (in any format & compression) and shards of
+    ``table`` in ``dirpath`` — i.e., every file that `table_files()` could
+    return — in preparation for dumping the table anew, so that files from an
+    earlier dump are not loaded in place of or alongside the new ones
+    """
+    suffixes = [csv_suffix(c) for c in [None, *COMPRESSION_SUFFIXES]]
+    for suffix in suffixes + list(COLUMNAR_SUFFIXES.values()):
         try:
-            with (dirpath / (tbl.name + '.csv')).open('r') as fp:
-                load_table(conn, tbl, fp)
+            (dirpath / (table.name + suffix)).unlink()
         except FileNotFoundError:
             pass
+    for suffix in suffixes:
+        for p in dirpath.glob(glob_escape(table.name + '.part-') + '*'
+                              + glob_escape(suffix)):
+            p.unlink()
+
+def manifest_files(dirpath, table, entry, merge=False):
+    """
+    Return a list of ``(path, merging)`` pairs for the files in ``dirpath``
+    listed for ``table`` in the manifest entry ``entry``: the regular file or
+    shards first (merged if ``merge`` is true), then the delta files in the
+    order in which they were written (always merged)
+    """
+    prefix = table.name + '.delta-'
+    names = sorted(entry["files"])
+    paths = [(dirpath / n, merge) for n in names if not n.startswith(prefix)]
+    paths.extend((dirpath / n, True) for n in names if n.startswith(prefix))
+    return paths
+
+def shard_path(dirpath, table, partno, compression=None):
+    """
+    Return the path of the (1-based) ``partno``-th shard of ``table`` in
+    ``dirpath``
+    """
+    return dirpath / '{}.part-{:04d}{}'.format(
+        table.name, partno, csv_suffix(compression),
+    )
+
+def delta_files(dirpath, table):
+    """
+    Return a list of the delta files for ``table`` in ``dirpath`` (as written
+    by `dumpdb()` with ``watermarks``), in the order in which they were
+    written
+    """
+    return sorted(
+        p for suffix in [csv_suffix(c) for c in [None, *COMPRESSION_SUFFIXES]]
+          for p in dirpath.glob(glob_escape(table.name + '.delta-') + '*'
+                                + glob_escape(suffix))
+          if re.fullmatch(r'\d+', p.name[len(table.name) + 7:-len(suffix)])
+    )
+
+def discard_deltas(dirpath, tables):
+    """
+    Delete the delta files in ``dirpath`` of each of ``tables`` and remove the
+    tables' entries from the watermark file, in preparation for dumping the
+    tables in full
+    """
+    state = read_json(dirpath / WATERMARK_FILE, "tables")
+    changed = False
+    for tbl in tables:
+        for p in delta_files(dirpath, tbl):
+            p.unlink()
+        if state.pop(tbl.name, None) is not None:
+            changed = True
+    if changed:
+        write_json(dirpath / WATERMARK_FILE, "tables", state)
+
+def delta_path(dirpath, table, deltano, compression=None):
+    """
+    Return the path of the (1-based) ``deltano``-th delta file of ``table`` in
+    ``dirpath``
+    """
+    return dirpath / '{}.delta-{:04d}{}'.format(
+        table.name, deltano, csv_suffix(compression),
+    )
+
+def glob_escape(s):
+    return re.sub(r'([*?[])', r'[\1]', s)
+
+def load_table(conn, table, infile, batch_size=DEFAULT_BATCH_SIZE,
+               processes=None, bulk=False, merge=False, format='csv',
+               observer=None, pipeline=False):
+    if batch_size < 1:
+        raise ValueError('batch_size must be positive')
+    if observer is None:
+        observer = NULL_OBSERVER
+    stats = TableStats(table.name, 'load')
+    observer.table_started(stats)
+    if format != 'csv':
+        columns, batches = read_columnar(infile, table, batch_size, format)
+        insert_batches(
+            conn, table, columns,
+            observe_batches(batches, stats, observer, 'io_time', 'db_time'),
+            bulk=bulk, merge=merge,
+        )
+    else:
+        if observer is not NULL_OBSERVER:
+            infile = counting_lines(infile, stats)
+        reader = csv.reader(infile)
+        columns = next(reader, None)
+        load_records(conn, table, columns, reader, batch_size=batch_size,
+                     processes=processes, bulk=bulk, merge=merge,
+                     observer=observer, stats=stats, pipeline=pipeline)
+    stats.end = perf_counter()
+    observer.table_finished(stats)
+
+def load_records(conn, table, columns, records, batch_size=DEFAULT_BATCH_SIZE,
+                 processes=None, bulk=False, merge=False, observer=None,
+                 stats=None, pipeline=False, pool=None):
+    """
+    Unmarshal & insert ``records`` (sequences of strings for the columns named
+    in ``columns``, in that order, such as the rows of a `csv.reader`) into
+    ``table``.  If ``merge`` is true, rows are merged into the table on its
+    primary key with `merge_rows()`, and ``bulk`` is ignored.  Progress is
+    recorded in the `TableStats` ``stats`` and reported to ``observer``.  If
+    ``pipeline`` is true (and ``processes`` is not set), ``records`` is
+    iterated over and unmarshalled in two separate threads while this thread
+    inserts.  ``pool`` is an optional already-running `worker_pool()` to use
+    when ``processes`` is set.
+    """
+    if batch_size < 1:
+        raise ValueError('batch_size must be positive')
+    if columns is None:
+        return
+    if observer is None:
+        observer = NULL_OBSERVER
+    if stats is None:
+        stats = TableStats(table.name, 'load')
+    timings = stats.column_times if observer.time_columns else None
+    if pipeline and not processes:
+        plan = get_codec_plan(table)
+        # Reading & unmarshalling happen in their own threads, so the time
+        # that this thread spends waiting on them counts as conversion
+        batches = pipelined_read(
+            lambda rows: plan.unmarshal_columns(columns, rows, timings),
+            chunked(records, batch_size),
+        )
+        with closing(batches):
+            insert_batches(
+                conn, table, columns,
+                observe_batches(batches, stats, observer, 'io_time',
+                                'db_time'),
+                bulk=bulk, merge=merge,
+            )
+        return
+    chunks = timed_iter(chunked(records, batch_size), stats, 'io_time')
+    if processes:
+        batches = pool_map(
+            table,
+            unmarshal_rows,
+            ((columns, rows) for rows in chunks),
+            processes,
+            pool=pool,
+        )
+    else:
+        plan = get_codec_plan(table)
+        batches = (
+            plan.unmarshal_columns(columns, rows, timings) for rows in chunks
+        )
+    insert_batches(
+        conn, table, columns,
+        observe_batches(batches, stats, observer, 'io_time', 'db_time'),
+        bulk=bulk, merge=merge,
+    )
+
+def insert_batches(conn, table, columns, batches, bulk=False, merge=False):
+    """
+    Insert (or, if ``merge`` is true, merge) ``batches`` (an iterable of lists
+    of sequences of unmarshalled values for the columns named in ``columns``,
+    in that order) into ``table``
+    """
+    if merge:
+        merge_rows(conn, table, columns, batches)
+        return
+    if bulk:
+        loader = get_bulk_loader(conn.dialect.name)
+        if loader is not None and loader(conn, table, columns, batches):
+            return
+    # Compile the INSERT once and send each batch of rows as a single
+    # `executemany`; only a bounded number of batches are held in memory at
+    # a time.  Where the dialect takes positional parameters, the row tuples
+    # are passed to the driver as-is (or with only the bind processors
+    # applied) rather than being turned into `dict`\s for SQLAlchemy.
+    prepared = prepared_insert(conn, table, columns)
+    if prepared is not None:
+        sql, order, processors = prepared
+        if order == list(range(len(columns))) and not any(processors):
+            for batch in batches:
+                conn.execute(sql, batch)
+        else:
+            for batch in batches:
+                conn.execute(
+                    sql,
+                    [process_row(row, order, processors) for row in batch],
+                )
+    else:
+        insert = table.insert()
+        for batch in batches:
+            conn.execute(insert, [dict(zip(columns, row)) for row in batch])
 
-def load_table(conn, table, infile):
-    for row in csv.DictReader(infile):
-        ### TODO: Should this use `executemany` instead?
-        conn.execute(table.insert(values=unmarshal_object(table, row)))
+def chunked(iterable, size):
+    """ Yield successive lists of at most ``size`` items from ``iterable`` """
+    it = iter(iterable)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
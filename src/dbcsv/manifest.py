@@ -0,0 +1,139 @@
+"""
+Dump manifests
+
+A manifest records, for each table in a dump, the table's columns & their
+types, a fingerprint of those, and the number of rows, size in bytes, and
+SHA-256 checksum of each file dumped from it.  `dumpdb()` writes one when
+called with ``manifest=True``, and `loaddb()` uses it (when present) to check
+for schema drift & missing or corrupted files before loading anything, to
+report progress against the expected row counts, and to skip tables that have
+not changed since they were last loaded.
+"""
+
+import hashlib
+import json
+
+#: Name of the file in which `dumpdb()` writes the manifest of a dump
+MANIFEST_FILE = 'dbcsv-manifest.json'
+
+#: Name of the file in which `loaddb()` records the checksums of the files it
+#: loaded into each database when ``skip_unchanged`` is true
+LOADED_FILE = 'dbcsv-loaded.json'
+
+CHECKSUM_BLOCK_SIZE = 1 << 20
+
+def table_schema(table):
+    """
+    Return a list of ``[key, type]`` pairs for the columns of ``table``, where
+    ``type`` is the `repr()` of the column's type (e.g.,
+    ``"Unicode(length=64)"``)
+    """
+    return [[c.key, repr(c.type)] for c in table.columns]
+
+def schema_fingerprint(schema):
+    """ Return a SHA-256 hex digest of a schema returned by `table_schema()` """
+    return hashlib.sha256(
+        json.dumps(schema, separators=(',', ':')).encode('utf-8')
+    ).hexdigest()
+
+def file_checksum(path):
+    """
+    Return the SHA-256 hex digest of the contents of the file at ``path``,
+    read in blocks of `CHECKSUM_BLOCK_SIZE` bytes
+    """
+    digest = hashlib.sha256()
+    with path.open('rb') as fp:
+        for block in iter(lambda: fp.read(CHECKSUM_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def file_entry(path, rows, checksum=None):
+    """
+    Return the manifest entry for the file at ``path`` containing ``rows``
+    rows (`None` if unknown) with the SHA-256 hex digest ``checksum``, as
+    computed while the file was written; if ``checksum`` is not given, the
+    file is read to compute it
+    """
+    if checksum is None:
+        checksum = file_checksum(path)
+    return {
+        "rows": rows,
+        "bytes": path.stat().st_size,
+        "sha256": checksum,
+    }
+
+def table_entry(table, files=None):
+    """
+    Return a new manifest entry for ``table`` with the file entries ``files``
+    (a `dict` mapping filenames to `file_entry()` values)
+    """
+    schema = table_schema(table)
+    return {
+        "columns": schema,
+        "fingerprint": schema_fingerprint(schema),
+        "files": dict(files or {}),
+    }
+
+def check_table(entry, table):
+    """
+    Raise a `ValueError` if a column listed in the manifest entry ``entry``
+    does not exist in ``table`` or has a different type there
+    """
+    if entry["fingerprint"] == schema_fingerprint(table_schema(table)):
+        return
+    types = dict(table_schema(table))
+    for key, coltype in entry["columns"]:
+        if key not in types:
+            raise ValueError(
+                'Table {}: dumped column {} does not exist in the schema'
+                .format(table.name, key)
+            )
+        elif types[key] != coltype:
+            raise ValueError(
+                'Table {}: column {} was dumped as {} but is now {}'
+                .format(table.name, key, coltype, types[key])
+            )
+
+def check_files(entry, table, dirpath, verify=False):
+    """
+    Raise a `ValueError` if the manifest entry ``entry`` lists no files or if
+    a file listed in it is missing from ``dirpath`` or has the wrong size, or
+    (if ``verify`` is true) the wrong checksum
+    """
+    if not entry["files"]:
+        raise ValueError('Table {}: manifest lists no files'
+                         .format(table.name))
+    for name, info in entry["files"].items():
+        path = dirpath / name
+        try:
+            size = path.stat().st_size
+        except FileNotFoundError:
+            raise ValueError('Table {}: file {} is missing'
+                             .format(table.name, name))
+        if size != info["bytes"]:
+            raise ValueError('Table {}: file {} is {} bytes, expected {}'
+                             .format(table.name, name, size, info["bytes"]))
+        if verify and file_checksum(path) != info["sha256"]:
+            raise ValueError('Table {}: file {} does not match its checksum'
+                             .format(table.name, name))
+
+def files_digest(entry):
+    """
+    Return a `dict` mapping each filename in the manifest entry ``entry`` to
+    its checksum, for recording & comparing what was loaded
+    """
+    return {name: info["sha256"] for name, info in entry["files"].items()}
+
+def load_target(conn):
+    """
+    Return a string identifying the database that ``conn`` is connected to
+    (its URL, with any password hidden, plus its default schema, if any), for
+    keying the record of which files were loaded into it
+    """
+    # `repr()` of a URL masks the password
+    target = repr(conn.engine.url)
+    # Not set until the engine first connects
+    schema = getattr(conn.dialect, 'default_schema_name', None)
+    if schema is not None:
+        target += ' (schema {})'.format(schema)
+    return target
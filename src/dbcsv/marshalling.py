@@ -17,7 +17,8 @@ from   datetime import date, datetime, time, timedelta
 from   decimal  import Decimal
 from   enum     import Enum
 import json
-import re
+from   time     import perf_counter
+from   weakref  import WeakKeyDictionary
 from   backports.datetime_fromisoformat import MonkeyPatch
 import sqlalchemy as S
 
@@ -25,12 +26,27 @@ MonkeyPatch.patch_fromisoformat()
 
 NULL_TOKEN = r'\N'
 
+#: The encodings for `~sqlalchemy.types.ARRAY` values
+ARRAY_FORMATS = ("json", "repr")
+
+#: Key in a `~sqlalchemy.schema.Column`'s ``info`` giving the encoding to use
+#: for the column's array values instead of `array_format`
+ARRAY_FORMAT_KEY = "dbcsv_array_format"
+
+#: The encoding used for `~sqlalchemy.types.ARRAY` values by default; set with
+#: `set_array_format()`
+array_format = "repr"
+
 coltype_marshallers = {}
 pytype_marshallers = {}
 
 coltype_unmarshallers = {}
 pytype_unmarshallers = {}
 
+#: Cache of `CodecPlan`s, keyed by `~sqlalchemy.schema.Table`; cleared
+#: whenever a marshaller or unmarshaller is registered
+codec_plans = WeakKeyDictionary()
+
 def register_column_type(coltype, marshaller, unmarshaller):
     try:
         is_coltype = issubclass(coltype, S.types.TypeEngine)
@@ -40,17 +56,135 @@ def register_column_type(coltype, marshaller, unmarshaller):
         raise TypeError('coltype must be a subclass of sqlalchemy.types.TypeEngine')
     coltype_marshallers[coltype] = marshaller
     coltype_unmarshallers[coltype] = unmarshaller
+    codec_plans.clear()
 
 def register_python_type(pytype, marshaller, unmarshaller):
     pytype_marshallers[pytype] = marshaller
     pytype_unmarshallers[pytype] = unmarshaller
+    codec_plans.clear()
+
+def set_array_format(fmt):
+    """
+    Set the encoding used for `~sqlalchemy.types.ARRAY` values by default to
+    ``fmt`` (one of `ARRAY_FORMATS`)
+    """
+    global array_format
+    check_array_format(fmt)
+    array_format = fmt
+    codec_plans.clear()
+
+def check_array_format(fmt):
+    if fmt not in ARRAY_FORMATS:
+        raise ValueError('Invalid array format: ' + repr(fmt))
+
+class CodecPlan:
+    """
+    The marshallers & unmarshallers for the columns of a
+    `~sqlalchemy.schema.Table`, resolved once so that converting a row does
+    not have to look anything up in the registries.  ``marshallers[i]`` and
+    ``unmarshallers[i]`` are single-argument callables (which also take care
+    of `None`/``\\N``) for the column named ``columns[i]``.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.columns = table.columns.keys()
+        self.marshallers = [column_marshaller(c) for c in table.columns]
+        self.unmarshallers = [
+            field_unmarshaller(c.type) for c in table.columns
+        ]
+        self.column_unmarshallers = [
+            column_unmarshaller(c.type) for c in table.columns
+        ]
+        self.marshallers_by_name = dict(zip(self.columns, self.marshallers))
+        self.unmarshallers_by_name = dict(
+            zip(self.columns, self.unmarshallers)
+        )
+        self.column_unmarshallers_by_name = dict(
+            zip(self.columns, self.column_unmarshallers)
+        )
+
+    def marshal_row(self, values):
+        """
+        Marshal a sequence of values given in the same order as `columns`
+        """
+        return [m(v) for m, v in zip(self.marshallers, values)]
+
+    def marshal_columns(self, rows, timings=None):
+        """
+        Marshal a list of sequences of values given in the same order as
+        `columns` a column at a time, returning a list of tuples of strings.
+        If ``timings`` is given, the time spent marshalling each column is
+        added to its entry in the `dict` ``timings``.
+        """
+        converted = []
+        for name, m, values in zip(self.columns, self.marshallers, zip(*rows)):
+            if timings is None:
+                converted.append(list(map(m, values)))
+            else:
+                start = perf_counter()
+                converted.append(list(map(m, values)))
+                timings[name] = timings.get(name, 0.0) + perf_counter() - start
+        return list(zip(*converted))
+
+    def unmarshal_row(self, values):
+        """
+        Unmarshal a sequence of strings given in the same order as `columns`
+        """
+        return [u(s) for u, s in zip(self.unmarshallers, values)]
+
+    def marshal_mapping(self, obj):
+        byname = self.marshallers_by_name
+        return {k: byname[k](v) for k,v in obj.items()}
+
+    def unmarshal_mapping(self, obj):
+        byname = self.unmarshallers_by_name
+        return {k: byname[k](v) for k,v in obj.items()}
+
+    def unmarshal_columns(self, columns, rows, timings=None):
+        """
+        Unmarshal a list of sequences of strings, each giving the values for
+        the columns named in ``columns`` in that order, a column at a time:
+        the rows are transposed, each column is converted as a whole by its
+        column unmarshaller, and the results are transposed back into a list
+        of tuples.  ``timings`` is as for `marshal_columns()`.
+        """
+        if not rows:
+            return []
+        lengths = set(map(len, rows))
+        if lengths != {len(columns)}:
+            raise ValueError(
+                'Expected rows of {} fields; got rows of {} fields'.format(
+                    len(columns),
+                    ', '.join(map(str, sorted(lengths - {len(columns)}))),
+                )
+            )
+        byname = self.column_unmarshallers_by_name
+        if timings is None:
+            return list(zip(*[
+                byname[c](values) for c, values in zip(columns, zip(*rows))
+            ]))
+        converted = []
+        for c, values in zip(columns, zip(*rows)):
+            start = perf_counter()
+            converted.append(byname[c](values))
+            timings[c] = timings.get(c, 0.0) + perf_counter() - start
+        return list(zip(*converted))
+
+def get_codec_plan(table):
+    """ Return the (cached) `CodecPlan` for ``table`` """
+    try:
+        return codec_plans[table]
+    except KeyError:
+        plan = codec_plans[table] = CodecPlan(table)
+        return plan
 
 def marshal_object(table, obj):
     """
     Convert a `Mapping` (such as a `~sqlalchemy.engine.RowProxy`) to a `dict`
     in which all values are `str`.
     """
-    return {k: marshal_field(v, table.columns[k].type) for k,v in obj.items()}
+    return get_codec_plan(table).marshal_mapping(obj)
 
 def unmarshal_object(table, obj):
     """
@@ -58,7 +192,105 @@ def unmarshal_object(table, obj):
     from `csv.DictReader`) to a `dict` in which the values match the types used
     for the columns of the same names in ``table``.
     """
-    return {k: unmarshal_field(v, table.columns[k].type) for k,v in obj.items()}
+    return get_codec_plan(table).unmarshal_mapping(obj)
+
+def field_marshaller(coltype):
+    """
+    Return a function that behaves like ``marshal_field(value, coltype)``
+    """
+    if type(coltype) in coltype_marshallers:
+        converter = coltype_marshallers[type(coltype)]
+        def marshal(value):
+            if value is None:
+                return NULL_TOKEN
+            return converter(value, coltype)
+    else:
+        def marshal(value):
+            if value is None:
+                return NULL_TOKEN
+            try:
+                converter = pytype_marshallers[type(value)]
+            except KeyError:
+                raise ValueError('No marshaller registered for type '
+                                 + repr(type(coltype)))
+            return converter(value)
+    return marshal
+
+def column_marshaller(column):
+    """
+    Return a function that marshals values of the
+    `~sqlalchemy.schema.Column` ``column``: ``field_marshaller(column.type)``,
+    unless the column's ``info`` selects an array encoding with
+    `ARRAY_FORMAT_KEY`
+    """
+    fmt = column.info.get(ARRAY_FORMAT_KEY)
+    if fmt is None:
+        return field_marshaller(column.type)
+    check_array_format(fmt)
+    converter = array_marshallers[fmt]
+    coltype = column.type
+    def marshal(value):
+        if value is None:
+            return NULL_TOKEN
+        return converter(value, coltype)
+    return marshal
+
+def field_unmarshaller(coltype):
+    """
+    Return a function that behaves like ``unmarshal_field(s, coltype)``
+    """
+    if type(coltype) in coltype_unmarshallers:
+        converter = coltype_unmarshallers[type(coltype)]
+        def unmarshal(s):
+            if s == NULL_TOKEN:
+                return None
+            return converter(s, coltype)
+        return unmarshal
+    try:
+        pytype = coltype.python_type
+    except Exception:
+        pytype = None
+    if pytype is not None and pytype in pytype_unmarshallers:
+        pyconverter = pytype_unmarshallers[pytype]
+        def unmarshal(s):
+            if s == NULL_TOKEN:
+                return None
+            return pyconverter(s)
+    else:
+        def unmarshal(s):
+            if s == NULL_TOKEN:
+                return None
+            raise ValueError('No unmarshaller registered for type '
+                             + repr(type(coltype)))
+    return unmarshal
+
+def column_unmarshaller(coltype):
+    """
+    Return a function that takes a list of strings and returns the result of
+    applying ``field_unmarshaller(coltype)`` to each one.  For types
+    unmarshalled based on their ``python_type``, a column without any ``\\N``
+    values is converted by mapping the type's unmarshaller (e.g., `int` or
+    `datetime.date.fromisoformat`) directly over the column instead of
+    calling a wrapper function for each value.
+    """
+    unmarshal = field_unmarshaller(coltype)
+    converter = None
+    if type(coltype) not in coltype_unmarshallers:
+        try:
+            pytype = coltype.python_type
+        except Exception:
+            pytype = None
+        if pytype is not None:
+            converter = pytype_unmarshallers.get(pytype)
+    if converter is None:
+        def unmarshal_column(values):
+            return list(map(unmarshal, values))
+    else:
+        def unmarshal_column(values):
+            if NULL_TOKEN in values:
+                return list(map(unmarshal, values))
+            return list(map(converter, values))
+    return unmarshal_column
 
 def marshal_field(value, coltype):
     if value is None:
@@ -90,16 +322,16 @@ def unmarshal_field(s, coltype):
     raise ValueError('No unmarshaller registered for type '+repr(type(coltype)))
 
 def marshal_str(s):
-    m = re.fullmatch(r'(\x5C+)N', s)
-    if m:
-        return m.group(1) * 2 + 'N'
+    # Only strings of one or more backslashes followed by `N` need escaping;
+    # reject everything else with a cheap suffix test before looking further
+    if s.endswith(NULL_TOKEN) and not s[:-1].lstrip('\\'):
+        return s[:-1] * 2 + 'N'
     else:
         return s
 
 def unmarshal_str(s):
-    m = re.fullmatch(r'(\x5C+)N', s)
-    if m:
-        return '\\' * (len(m.group(1)) // 2) + 'N'
+    if s.endswith(NULL_TOKEN) and not s[:-1].lstrip('\\'):
+        return '\\' * ((len(s) - 1) // 2) + 'N'
     else:
         return s
 
@@ -153,6 +385,9 @@ def unmarshal_pickle(s, coltype):
     return coltype.pickler.loads(base64.b64decode(s))
 
 def marshal_array(value, coltype):
+    return array_marshallers[array_format](value, coltype)
+
+def marshal_array_repr(value, coltype):
     def marshal(x):
         if isinstance(x, (list, tuple)):
             return type(x)(map(marshal, x))
@@ -160,13 +395,37 @@ def marshal_array(value, coltype):
             return marshal_field(x, coltype.item_type)
     return str(marshal(value))
 
+def marshal_array_json(value, coltype):
+    # Non-ASCII characters are left as-is so that the output is also a valid
+    # Python literal that the `repr` parser of older versions can read.
+    # Tuples become lists.
+    marshal_item = field_marshaller(coltype.item_type)
+    def marshal(x):
+        if isinstance(x, (list, tuple)):
+            return list(map(marshal, x))
+        else:
+            return marshal_item(x)
+    return json.dumps(marshal(value), ensure_ascii=False, separators=(',', ':'))
+
+array_marshallers = {
+    "json": marshal_array_json,
+    "repr": marshal_array_repr,
+}
+
 def unmarshal_array(s, coltype):
+    # A `repr`-encoded array of strings that happens to be valid JSON has the
+    # same value either way, so try the (much faster) JSON parser first
+    try:
+        value = json.loads(s)
+    except ValueError:
+        value = literal_eval(s)
+    unmarshal_item = field_unmarshaller(coltype.item_type)
     def unmarshal(x):
         if isinstance(x, (list, tuple)):
             return type(x)(map(unmarshal, x))
         else:
-            return unmarshal_field(x, coltype.item_type)
-    return unmarshal(literal_eval(s))
+            return unmarshal_item(x)
+    return unmarshal(value)
 
 register_python_type(str, marshal_str, unmarshal_str)
 register_python_type(int, str, int)
@@ -0,0 +1,200 @@
+"""
+Merging (a.k.a. "upserting") rows into tables keyed on their primary keys
+
+A merger is a function ``merger(conn, table, columns, batches)`` with the same
+arguments as a bulk loader that inserts the rows in ``batches`` into
+``table``, replacing the non-primary key values of any existing rows with the
+same primary keys, and returns `True`, or returns `False` without consuming
+``batches`` if it cannot handle the table, in which case the generic
+staging-table merge is used instead.  Mergers are selected by the name of the
+connection's dialect.
+"""
+
+import sqlalchemy as S
+from   sqlalchemy.dialects import mysql, postgresql
+from   .bulk               import prepared_insert, process_row
+
+mergers = {}
+
+#: Names of the dialects that can render an ``UPDATE`` joined to another table
+#: (``UPDATE ... FROM`` or, for MySQL, a multiple-table ``UPDATE``)
+UPDATE_FROM_DIALECTS = {'mssql', 'mysql', 'postgresql'}
+
+def register_merger(dialect_name, merger):
+    mergers[dialect_name] = merger
+
+def get_merger(dialect_name):
+    return mergers.get(dialect_name)
+
+def merge_rows(conn, table, columns, batches):
+    """
+    Merge ``batches`` (an iterable of lists of sequences of values for
+    ``columns``) into ``table`` on its primary key, using the merger for
+    ``conn``'s dialect if there is one that can handle the table
+    """
+    pk = [c.key for c in table.primary_key.columns]
+    if not pk:
+        raise ValueError(
+            'Table {} has no primary key to merge rows on'.format(table.name)
+        )
+    missing = [c for c in pk if c not in columns]
+    if missing:
+        raise ValueError(
+            'Cannot merge into {} without primary key column(s) {}'
+            .format(table.name, ', '.join(missing))
+        )
+    merger = get_merger(conn.dialect.name)
+    if merger is None or not merger(conn, table, columns, batches):
+        staging_merge(conn, table, columns, batches)
+
+def staging_merge(conn, table, columns, batches):
+    """
+    Merge rows into ``table`` by inserting each batch into a temporary staging
+    table and then updating the rows of ``table`` that have a match in the
+    staging table and inserting the rest; see `staging_statements()`.
+    """
+    stage, update, insert = staging_statements(
+        table, columns, conn.dialect.name in UPDATE_FROM_DIALECTS,
+    )
+    with conn.begin():
+        stage.create(conn)
+        try:
+            for batch in batches:
+                conn.execute(
+                    stage.insert(),
+                    [dict(zip(columns, row)) for row in batch],
+                )
+                if update is not None:
+                    conn.execute(update)
+                conn.execute(insert)
+                conn.execute(stage.delete())
+        finally:
+            stage.drop(conn)
+    return True
+
+def staging_statements(table, columns, update_from=False):
+    """
+    Return a triple of a temporary staging table for ``columns`` of ``table``,
+    an ``UPDATE`` statement (or `None` if there are no non-primary key
+    columns) that copies the staged rows' values into the matching rows of
+    ``table``, and an ``INSERT`` statement that inserts the staged rows with
+    no match in ``table``.  Both statements are driven by the (small) staging
+    table and look rows of ``table`` up by primary key.
+
+    If ``update_from`` is true, the ``UPDATE`` joins the staging table with
+    ``UPDATE ... FROM`` (or MySQL's multiple-table ``UPDATE``), which refers
+    to the staging table only once.  Otherwise, only standard SQL is used: the
+    ``UPDATE`` selects each new value with a correlated subquery on the
+    staging table, which works on any database with temporary tables but
+    leaves the query plan up to the database.
+    """
+    cols = [table.columns[c] for c in columns]
+    stage = S.Table(
+        'dbcsv_stage_' + table.name,
+        S.MetaData(),
+        *[S.Column(c.name, c.type, key=c.key) for c in cols],
+        prefixes=['TEMPORARY']
+    )
+    match = S.and_(*[stage.c[c.key] == c for c in table.primary_key.columns])
+    update_cols = [c for c in cols if not c.primary_key]
+    if not update_cols:
+        update = None
+    elif update_from:
+        update = table.update()\
+                      .where(match)\
+                      .values({c: stage.c[c.key] for c in update_cols})
+    else:
+        update = table.update()\
+                      .where(S.exists().where(match))\
+                      .values({
+                          c: S.select([stage.c[c.key]]).where(match)
+                                                       .as_scalar()
+                          for c in update_cols
+                      })
+    insert = table.insert().from_select(
+        cols,
+        S.select([stage.c[c] for c in columns])
+         .where(~S.exists().where(match)),
+    )
+    return (stage, update, insert)
+
+def sqlite_merge(conn, table, columns, batches):
+    """
+    Merge rows into a SQLite table with a prepared ``INSERT ... ON CONFLICT
+    DO UPDATE`` statement (requires SQLite 3.24.0 or higher)
+    """
+    dbapi = conn.dialect.dbapi
+    if getattr(dbapi, 'sqlite_version_info', (0,)) < (3, 24, 0):
+        return False
+    prepared = prepared_insert(conn, table, columns)
+    if prepared is None:
+        return False
+    sql, order, processors = prepared
+    preparer = conn.dialect.identifier_preparer
+    pk = [preparer.format_column(c) for c in table.primary_key.columns]
+    updates = [
+        '{0} = excluded.{0}'.format(preparer.format_column(table.columns[c]))
+        for c in columns
+        if not table.columns[c].primary_key
+    ]
+    sql += ' ON CONFLICT ({}) DO {}'.format(
+        ', '.join(pk),
+        'UPDATE SET ' + ', '.join(updates) if updates else 'NOTHING',
+    )
+    with conn.begin():
+        for batch in batches:
+            conn.execute(
+                sql,
+                [process_row(row, order, processors) for row in batch],
+            )
+    return True
+
+def postgresql_merge(conn, table, columns, batches):
+    """
+    Merge rows into a PostgreSQL table with ``INSERT ... ON CONFLICT DO
+    UPDATE`` (requires PostgreSQL 9.5 or higher)
+    """
+    stmt = postgresql_upsert(table, columns)
+    with conn.begin():
+        for batch in batches:
+            conn.execute(stmt, [dict(zip(columns, row)) for row in batch])
+    return True
+
+def postgresql_upsert(table, columns):
+    stmt = postgresql.insert(table)
+    pk = list(table.primary_key.columns)
+    updates = {
+        c: stmt.excluded[c] for c in columns if not table.columns[c].primary_key
+    }
+    if updates:
+        return stmt.on_conflict_do_update(index_elements=pk, set_=updates)
+    else:
+        return stmt.on_conflict_do_nothing(index_elements=pk)
+
+def mysql_merge(conn, table, columns, batches):
+    """
+    Merge rows into a MySQL table with ``INSERT ... ON DUPLICATE KEY UPDATE``.
+    Note that MySQL also treats a collision on any other unique index of the
+    table as a duplicate key.
+    """
+    stmt = mysql_upsert(table, columns)
+    with conn.begin():
+        for batch in batches:
+            conn.execute(stmt, [dict(zip(columns, row)) for row in batch])
+    return True
+
+def mysql_upsert(table, columns):
+    stmt = mysql.insert(table)
+    updates = {
+        c: stmt.inserted[c] for c in columns if not table.columns[c].primary_key
+    }
+    if not updates:
+        # `ON DUPLICATE KEY UPDATE` needs at least one assignment; assigning
+        # a primary key column to itself leaves the existing row unchanged
+        c = list(table.primary_key.columns)[0]
+        updates = {c.key: c}
+    return stmt.on_duplicate_key_update(updates)
+
+register_merger('sqlite', sqlite_merge)
+register_merger('postgresql', postgresql_merge)
+register_merger('mysql', mysql_merge)
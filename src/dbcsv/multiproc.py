@@ -0,0 +1,75 @@
+"""
+Marshalling & unmarshalling of row batches in a pool of worker processes
+
+The table is sent to each worker once, when the worker starts; the workers
+then use the table's `CodecPlan` on whatever batches they are given.  Note
+that, under the "spawn" and "forkserver" start methods, marshallers &
+unmarshallers registered at runtime in the parent process are not visible to
+the workers unless the module that registers them is imported by the module
+defining the table.
+"""
+
+from   collections      import deque
+import csv
+import io
+from   itertools        import islice
+from   multiprocessing  import Pool
+from   .marshalling     import get_codec_plan
+from   .splitting       import read_range
+
+plan = None
+
+def init_worker(table):
+    global plan
+    plan = get_codec_plan(table)
+
+def marshal_rows(rows):
+    return plan.marshal_columns(rows)
+
+def unmarshal_rows(batch):
+    columns, rows = batch
+    return plan.unmarshal_columns(columns, rows)
+
+def parse_range(job):
+    """
+    Parse & unmarshal the CSV records in a byte range of a file (as found by
+    `split_records()`), returning a pair of the number of characters in the
+    range (after newline translation) and a list of batches of at most
+    ``batch_size`` rows
+    """
+    path, start, end, columns, batch_size, encoding = job
+    text = read_range(path, start, end).decode(encoding)
+    # Translate newlines the same way that `open()` does for the serial path
+    fp = io.StringIO(text, newline=None)
+    reader = csv.reader(fp)
+    batches = []
+    while True:
+        rows = list(islice(reader, batch_size))
+        if not rows:
+            return (len(fp.getvalue()), batches)
+        batches.append(plan.unmarshal_columns(columns, rows))
+
+def worker_pool(table, processes):
+    """ Start a pool of ``processes`` worker processes for ``table`` """
+    return Pool(processes, initializer=init_worker, initargs=(table,))
+
+def pool_map(table, func, batches, processes, pool=None):
+    """
+    Apply ``func`` to each element of ``batches`` in a pool of ``processes``
+    worker processes, yielding the results in order.  At most ``2 *
+    processes`` batches are in flight at once, so ``batches`` is consumed
+    only as fast as the results are.  If ``pool`` (as returned by
+    `worker_pool()` for ``table``) is given, it is used (and left running)
+    instead of starting a new pool.
+    """
+    if pool is None:
+        with worker_pool(table, processes) as pool:
+            yield from pool_map(table, func, batches, processes, pool)
+        return
+    pending = deque()
+    for batch in batches:
+        pending.append(pool.apply_async(func, (batch,)))
+        if len(pending) >= 2 * processes:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
@@ -0,0 +1,260 @@
+"""
+Progress & timing instrumentation for dumps & loads
+
+`dump_table()`, `load_table()`, `dumpdb()`, and `loaddb()` accept an
+``observer`` argument, an instance of (a subclass of) `Observer`, whose
+methods are called with a `TableStats` as each table (or file) is started,
+after each batch of rows, and when the table is finished.
+"""
+
+import logging
+from   time import perf_counter
+
+class TableStats:
+    """
+    Running statistics for the dumping or loading of one table (or one file of
+    a table)
+
+    ``db_time`` is the time spent fetching rows from the database (when
+    dumping) or inserting them (when loading), ``convert_time`` is the time
+    spent marshalling or unmarshalling, and ``io_time`` is the time spent
+    writing or reading & parsing the CSV.  ``column_times`` maps column names
+    to the time spent in their marshallers or unmarshallers; it is only
+    filled in if the observer's `~Observer.time_columns` is true.
+    ``nbytes`` is the number of characters (not bytes) of CSV written or
+    read, counted after decoding & newline translation when reading, however
+    the file is read.
+    ``total_rows`` is the number of rows expected, if known (e.g., from a
+    dump manifest).
+    """
+
+    def __init__(self, table, operation):
+        #: The name of the table
+        self.table = table
+        #: ``"dump"`` or ``"load"``
+        self.operation = operation
+        self.rows = 0
+        self.nbytes = 0
+        self.db_time = 0.0
+        self.convert_time = 0.0
+        self.io_time = 0.0
+        self.column_times = {}
+        self.total_rows = None
+        self.start = perf_counter()
+        self.end = None
+
+    @property
+    def elapsed(self):
+        """ The number of seconds since the table was started """
+        return (perf_counter() if self.end is None else self.end) - self.start
+
+    @property
+    def rows_per_second(self):
+        elapsed = self.elapsed
+        return self.rows / elapsed if elapsed > 0 else 0.0
+
+class Observer:
+    """
+    Base class for observers of dumps & loads.  All methods do nothing by
+    default.
+    """
+
+    #: Whether to measure the time spent converting each column (at a small
+    #: cost to throughput)
+    time_columns = False
+
+    def table_started(self, stats):  # noqa: U100
+        pass
+
+    def rows_processed(self, stats):  # noqa: U100
+        """ Called after each batch of rows has been dumped or loaded """
+        pass
+
+    def table_finished(self, stats):  # noqa: U100
+        pass
+
+class StatsObserver(Observer):
+    """
+    An observer that saves the `TableStats` of each finished table in its
+    ``tables`` list
+    """
+
+    def __init__(self, time_columns=False):
+        self.time_columns = time_columns
+        self.tables = []
+
+    def table_finished(self, stats):
+        self.tables.append(stats)
+
+class LoggingObserver(Observer):
+    """
+    An observer that logs the start & end of each table and, at most every
+    ``interval`` seconds, the progress of the current table to ``logger``
+    (default: the ``dbcsv`` logger) at ``level``
+    """
+
+    def __init__(self, logger=None, level=logging.INFO, interval=10.0,
+                 time_columns=False):
+        self.logger = logging.getLogger('dbcsv') if logger is None else logger
+        self.level = level
+        self.interval = interval
+        self.time_columns = time_columns
+        self.last_report = {}
+
+    def table_started(self, stats):
+        self.last_report[id(stats)] = perf_counter()
+        self.logger.log(self.level, '%s: %s started', stats.table,
+                        stats.operation)
+
+    def rows_processed(self, stats):
+        now = perf_counter()
+        if now - self.last_report.get(id(stats), stats.start) >= self.interval:
+            self.last_report[id(stats)] = now
+            if stats.total_rows:
+                self.logger.log(
+                    self.level, '%s: %s %d of %d rows so far (%.0f%%; %.0f'
+                    ' rows/s)',
+                    stats.table, stats.operation, stats.rows,
+                    stats.total_rows, 100 * stats.rows / stats.total_rows,
+                    stats.rows_per_second,
+                )
+            else:
+                self.logger.log(
+                    self.level, '%s: %s %d rows so far (%.0f rows/s)',
+                    stats.table, stats.operation, stats.rows,
+                    stats.rows_per_second,
+                )
+
+    def table_finished(self, stats):
+        self.last_report.pop(id(stats), None)
+        self.logger.log(
+            self.level,
+            '%s: %s finished: %d rows, %d bytes in %.3fs (%.0f rows/s;'
+            ' db %.3fs, convert %.3fs, io %.3fs)',
+            stats.table, stats.operation, stats.rows, stats.nbytes,
+            stats.elapsed, stats.rows_per_second, stats.db_time,
+            stats.convert_time, stats.io_time,
+        )
+        if stats.column_times:
+            slowest = sorted(
+                stats.column_times.items(), key=lambda kv: kv[1], reverse=True,
+            )
+            self.logger.log(
+                self.level, '%s: %s column times: %s', stats.table,
+                stats.operation,
+                ', '.join('{}={:.3f}s'.format(k, v) for k, v in slowest),
+            )
+
+#: Observer used when none is given
+NULL_OBSERVER = Observer()
+
+class TotalRowsObserver(Observer):
+    """
+    An observer that forwards everything to ``observer`` after setting the
+    ``total_rows`` of each started `TableStats` to its own ``total_rows``
+    """
+
+    def __init__(self, observer):
+        self.observer = observer
+        self.time_columns = observer.time_columns
+        self.total_rows = None
+
+    def table_started(self, stats):
+        stats.total_rows = self.total_rows
+        self.observer.table_started(stats)
+
+    def rows_processed(self, stats):
+        self.observer.rows_processed(stats)
+
+    def table_finished(self, stats):
+        self.observer.table_finished(stats)
+
+class CountingWriter:
+    """
+    A wrapper around a text-file-like object that counts the characters
+    written to it in ``stats.nbytes``
+    """
+
+    def __init__(self, fp, stats):
+        self.fp = fp
+        self.stats = stats
+
+    def write(self, s):
+        self.stats.nbytes += len(s)
+        return self.fp.write(s)
+
+class RowCountingWriter:
+    """
+    A wrapper around a `csv.writer` that counts the rows written to it in
+    ``stats.rows``, notifying ``observer`` after each call
+    """
+
+    def __init__(self, writer, stats, observer):
+        self.writer = writer
+        self.stats = stats
+        self.observer = observer
+
+    def writerow(self, row):
+        self.writer.writerow(row)
+        self.stats.rows += 1
+        self.observer.rows_processed(self.stats)
+
+    def writerows(self, rows):
+        rows = list(rows)
+        self.writer.writerows(rows)
+        self.stats.rows += len(rows)
+        self.observer.rows_processed(self.stats)
+
+def counting_lines(fp, stats):
+    """
+    Iterate over the lines of ``fp``, counting their characters in
+    ``stats.nbytes``
+    """
+    for line in fp:
+        stats.nbytes += len(line)
+        yield line
+
+def timed_iter(iterable, stats, attr):
+    """
+    Iterate over ``iterable``, adding the time spent getting each item to the
+    attribute of ``stats`` named ``attr``
+    """
+    it = iter(iterable)
+    while True:
+        start = perf_counter()
+        try:
+            item = next(it)
+        except StopIteration:
+            setattr(stats, attr, getattr(stats, attr) + perf_counter() - start)
+            return
+        setattr(stats, attr, getattr(stats, attr) + perf_counter() - start)
+        yield item
+
+def observe_batches(batches, stats, observer, source_attr, sink_attr):
+    """
+    Iterate over ``batches`` (lists of converted rows), adding to ``stats``
+    the time spent producing each batch as ``convert_time`` (excluding any
+    time meanwhile added to ``source_attr`` by a `timed_iter()` over the
+    batches' input), the time spent by the consumer on each batch to
+    ``sink_attr``, and the number of rows, and notifying ``observer`` after
+    each batch has been consumed
+    """
+    it = iter(batches)
+    while True:
+        source_before = getattr(stats, source_attr)
+        start = perf_counter()
+        try:
+            batch = next(it)
+        except StopIteration:
+            return
+        produced = perf_counter()
+        stats.convert_time += (produced - start) \
+            - (getattr(stats, source_attr) - source_before)
+        yield batch
+        setattr(
+            stats,
+            sink_attr,
+            getattr(stats, sink_attr) + perf_counter() - produced,
+        )
+        stats.rows += len(batch)
+        observer.rows_processed(stats)
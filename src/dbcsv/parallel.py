@@ -0,0 +1,288 @@
+from   concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import csv
+from   pathlib            import Path
+from   shutil             import copyfileobj
+from   tempfile           import TemporaryFile
+from   time               import perf_counter
+import sqlalchemy as S
+from   .compression       import csv_suffix, open_csv
+from   .indexes           import create_fks, create_indexes, drop_indexes
+from   .load_dump         import DEFAULT_BATCH_SIZE, delta_files, \
+                                   discard_deltas, discard_table_files, \
+                                   dump_table, load_file, shard_path, \
+                                   table_files
+
+DEFAULT_WORKERS = 4
+
+def parallel_dumpdb(engine, metadata, dirpath, workers=DEFAULT_WORKERS,
+                    stream=False, chunk_size=DEFAULT_BATCH_SIZE,
+                    partitions=None, compression=None):
+    """
+    Like `dumpdb()`, but dump up to ``workers`` tables at once, each on its
+    own connection from ``engine``.  ``partitions`` may map table names to a
+    number of primary key ranges to split the table into; each range is then
+    dumped as a separate job to its own shard file.  Returns a `dict` mapping
+    table names to the number of seconds it took to dump them.
+    """
+    dirpath = Path(dirpath)
+    dirpath.mkdir(parents=True, exist_ok=True)
+    if partitions is None:
+        partitions = {}
+    discard_deltas(dirpath, metadata.sorted_tables)
+
+    def dump(tbl, path, whereclause):
+        start = perf_counter()
+        with engine.connect() as conn:
+            with open_csv(path, 'w') as fp:
+                dump_table(conn, tbl, fp, stream=stream,
+                           chunk_size=chunk_size, whereclause=whereclause)
+        return (start, perf_counter())
+
+    spans = {}
+    with ThreadPoolExecutor(workers) as pool:
+        futures = []
+        for tbl in metadata.sorted_tables:
+            # Shards from an earlier dump with more partitions (or a full
+            # file from one without them) would otherwise be loaded too
+            discard_table_files(dirpath, tbl)
+            if partitions.get(tbl.name, 1) > 1:
+                with engine.connect() as conn:
+                    ranges = partition_ranges(
+                        conn, tbl, partitions[tbl.name],
+                    )
+                for i, clause in enumerate(ranges, start=1):
+                    path = shard_path(dirpath, tbl, i, compression)
+                    fut = pool.submit(dump, tbl, path, clause)
+                    futures.append((tbl, fut))
+            else:
+                path = dirpath / (tbl.name + csv_suffix(compression))
+                futures.append((tbl, pool.submit(dump, tbl, path, None)))
+        for tbl, fut in futures:
+            start, end = fut.result()
+            if tbl.name in spans:
+                start = min(start, spans[tbl.name][0])
+                end = max(end, spans[tbl.name][1])
+            spans[tbl.name] = (start, end)
+    return {name: end - start for name, (start, end) in spans.items()}
+
+def partitioned_dump_table(engine, table, dest, partitions, column=None,
+                           workers=None, sharded=True, stream=False,
+                           chunk_size=DEFAULT_BATCH_SIZE, compression=None):
+    """
+    Split ``table`` into ``partitions`` ranges of ``column`` (default: the
+    table's integer primary key) and dump each range concurrently on its own
+    connection from ``engine``.  If ``sharded`` is true, ``dest`` is a
+    directory, and the ranges are written to the files
+    ``{table.name}.part-0001.csv``, ``{table.name}.part-0002.csv``, etc.
+    Otherwise, ``dest`` is a text-file-like object to which the ranges are
+    written as a single CSV in ascending order of ``column``.  ``compression``
+    only applies to shard files.
+    """
+    if workers is None:
+        workers = partitions
+    column = partition_column(table, column)
+    with engine.connect() as conn:
+        ranges = partition_ranges(conn, table, partitions, column)
+    # The concatenated file must be in key order within each range as well
+    order_by = None if sharded else [column]
+
+    def dump(clause, fp):
+        with engine.connect() as conn:
+            dump_table(conn, table, fp, stream=stream, chunk_size=chunk_size,
+                       whereclause=clause, order_by=order_by)
+
+    if sharded:
+        dirpath = Path(dest)
+        dirpath.mkdir(parents=True, exist_ok=True)
+        discard_table_files(dirpath, table)
+
+        def dump_shard(i, clause):
+            with open_csv(shard_path(dirpath, table, i, compression),
+                          'w') as fp:
+                dump(clause, fp)
+
+        with ThreadPoolExecutor(workers) as pool:
+            futures = [
+                pool.submit(dump_shard, i, clause)
+                for i, clause in enumerate(ranges, start=1)
+            ]
+            for fut in futures:
+                fut.result()
+    else:
+        tmpfiles = [TemporaryFile('w+', newline='') for _ in ranges]
+        try:
+            with ThreadPoolExecutor(workers) as pool:
+                futures = [
+                    pool.submit(dump, clause, fp)
+                    for clause, fp in zip(ranges, tmpfiles)
+                ]
+                for fut in futures:
+                    fut.result()
+            for i, fp in enumerate(tmpfiles):
+                fp.seek(0)
+                if i > 0:
+                    # Skip the header
+                    next(csv.reader(fp))
+                copyfileobj(fp, dest)
+        finally:
+            for fp in tmpfiles:
+                fp.close()
+
+def partition_ranges(conn, table, partitions, column=None):
+    """
+    Split the values of integer column ``column`` (default: the primary key
+    of ``table``) into ``partitions`` contiguous ranges and return a list of
+    `WHERE` clauses selecting each range in ascending order.  ``NULL`` values
+    are included in the first range, and the first & last ranges are
+    open-ended so that rows inserted after the bounds are computed are not
+    lost.
+    """
+    if partitions < 1:
+        raise ValueError('partitions must be positive')
+    column = partition_column(table, column)
+    lo, hi = conn.execute(
+        S.select([S.func.min(column), S.func.max(column)])
+    ).first()
+    if lo is None:
+        return [None]
+    step = -(-(hi - lo + 1) // partitions)
+    bounds = [lo + i * step for i in range(1, partitions) if lo + i*step <= hi]
+    if not bounds:
+        return [None]
+    clauses = []
+    for i in range(len(bounds) + 1):
+        conds = []
+        if i > 0:
+            conds.append(column >= bounds[i-1])
+        if i < len(bounds):
+            conds.append(column < bounds[i])
+        clause = S.and_(*conds)
+        if i == 0:
+            clause = S.or_(clause, column.is_(None))
+        clauses.append(clause)
+    return clauses
+
+def partition_column(table, column=None):
+    """
+    Return the `Column` of ``table`` named by ``column`` (default: the table's
+    primary key), checking that it is a single integer column
+    """
+    if column is None:
+        pk = list(table.primary_key.columns)
+        if len(pk) != 1:
+            raise ValueError(
+                'Table {} does not have a single-column primary key; a'
+                ' partition column must be specified'.format(table.name)
+            )
+        column = pk[0]
+    elif isinstance(column, str):
+        column = table.columns[column]
+    try:
+        is_int = issubclass(column.type.python_type, int)
+    except NotImplementedError:
+        is_int = False
+    if not is_int:
+        raise ValueError(
+            'Partition column {}.{} is not an integer column'
+            .format(table.name, column.name)
+        )
+    return column
+
+def parallel_loaddb(engine, metadata, dirpath, workers=DEFAULT_WORKERS,
+                    batch_size=DEFAULT_BATCH_SIZE, defer_indexes=False):
+    """
+    Like `loaddb()`, but load up to ``workers`` tables at once, each in its
+    own transaction on its own connection from ``engine``.  A table is not
+    started until all of the tables it has foreign keys to have finished
+    loading.  If ``defer_indexes`` is true, the indexes of the tables are
+    rebuilt concurrently after loading.  Returns a `dict` mapping the names
+    of the tables that were loaded to the number of seconds it took to load
+    them.
+    """
+    dirpath = Path(dirpath)
+    fk_names = {}
+
+    def load(tbl):
+        start = perf_counter()
+        paths = [(p, False) for p in table_files(dirpath, tbl)]
+        paths.extend((p, True) for p in delta_files(dirpath, tbl))
+        if not paths:
+            return None
+        with engine.begin() as conn:
+            if defer_indexes:
+                fk_names[tbl.name] = drop_indexes(conn, tbl)
+            for path, merge in paths:
+                load_file(conn, tbl, path, batch_size=batch_size, merge=merge)
+        return perf_counter() - start
+
+    timings = {}
+    for tbl, elapsed in run_in_dependency_order(metadata, load, workers):
+        if elapsed is not None:
+            timings[tbl.name] = elapsed
+    if defer_indexes:
+        rebuild_indexes(engine, metadata, workers, fk_names)
+    return timings
+
+def rebuild_indexes(engine, metadata, workers=DEFAULT_WORKERS, fk_names=None):
+    """
+    Create the missing indexes of the tables in ``metadata``, up to
+    ``workers`` tables at a time, and then create their missing foreign key
+    constraints.  ``fk_names`` may map table names to the return values of
+    `drop_indexes()` for the tables so that the constraints are recreated
+    under the names they were dropped with.
+    """
+    if fk_names is None:
+        fk_names = {}
+
+    def create(tbl):
+        with engine.begin() as conn:
+            create_indexes(conn, tbl)
+
+    with ThreadPoolExecutor(workers) as pool:
+        for fut in [pool.submit(create, t) for t in metadata.sorted_tables]:
+            fut.result()
+    with engine.begin() as conn:
+        for tbl in metadata.sorted_tables:
+            create_fks(conn, tbl, fk_names.get(tbl.name))
+
+def table_dependencies(metadata):
+    """
+    Return a `dict` mapping each table in ``metadata`` to the `set` of other
+    tables in ``metadata`` that it has foreign keys to
+    """
+    tables = set(metadata.sorted_tables)
+    deps = {}
+    for tbl in metadata.sorted_tables:
+        deps[tbl] = {
+            fk.column.table for fk in tbl.foreign_keys
+            if fk.column.table is not tbl and fk.column.table in tables
+        }
+    return deps
+
+def run_in_dependency_order(metadata, func, workers):
+    """
+    Call ``func`` on each table in ``metadata`` in a pool of ``workers``
+    threads, only calling it on a table once it has returned for all of the
+    table's dependencies.  Yields ``(table, return value)`` pairs as the calls
+    complete.
+    """
+    deps = table_dependencies(metadata)
+    pending = list(metadata.sorted_tables)
+    done = set()
+    running = {}
+    with ThreadPoolExecutor(workers) as pool:
+        while pending or running:
+            for tbl in list(pending):
+                if deps[tbl] <= done:
+                    pending.remove(tbl)
+                    running[pool.submit(func, tbl)] = tbl
+            if not running:
+                # Dependency cycle (e.g., a `use_alter` foreign key); fall
+                # back to `sorted_tables` order
+                tbl = pending.pop(0)
+                running[pool.submit(func, tbl)] = tbl
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                tbl = running.pop(fut)
+                yield (tbl, fut.result())
+                done.add(tbl)
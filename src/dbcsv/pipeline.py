@@ -0,0 +1,168 @@
+"""
+Threaded pipeline stages connected by bounded queues
+
+A pipelined dump fetches rows in the calling thread, marshals them in a second
+thread, and writes the CSV in a third; a pipelined load reads & parses the CSV
+in one thread, unmarshals it in a second, and inserts the rows in the calling
+thread.  The database connection is thus only ever used by the calling
+thread.  Each queue holds a bounded number of batches, so a fast stage blocks
+rather than buffering a whole table in memory when a later stage falls behind.
+"""
+
+from   contextlib import closing
+import queue
+import threading
+
+#: Default maximum number of batches queued between two stages
+DEFAULT_QUEUE_SIZE = 4
+
+#: Seconds to wait on a full or empty queue before checking whether the other
+#: end has gone away
+POLL_INTERVAL = 0.1
+
+END = object()
+
+class StageFailed:
+    def __init__(self, exc):
+        self.exc = exc
+
+class PipelineAborted(Exception):
+    """ Raised in a stage when the stage feeding it has given up """
+    pass
+
+def put_until(q, item, stop):
+    """
+    Put ``item`` on the queue ``q``, giving up & returning `False` if the
+    `threading.Event` ``stop`` is set while waiting for room
+    """
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=POLL_INTERVAL)
+        except queue.Full:
+            continue
+        return True
+    return False
+
+def background_map(func, iterable, maxsize=DEFAULT_QUEUE_SIZE):
+    """
+    Apply ``func`` to each item of ``iterable`` in a separate thread, yielding
+    the results in order.  At most ``maxsize`` results are queued at once.  An
+    exception raised by ``func`` or ``iterable`` is re-raised in the caller.
+    When the generator is closed, the thread stops at its next result and
+    closes ``iterable`` (if it has a ``close()`` method).
+    """
+    q = queue.Queue(maxsize)
+    stop = threading.Event()
+
+    def run():
+        try:
+            for item in iterable:
+                if not put_until(q, func(item), stop):
+                    return
+        except Exception as e:
+            put_until(q, StageFailed(e), stop)
+            return
+        finally:
+            close = getattr(iterable, 'close', None)
+            if close is not None:
+                close()
+        put_until(q, END, stop)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = q.get()
+            if item is END:
+                return
+            elif isinstance(item, StageFailed):
+                raise item.exc
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+def background(iterable, maxsize=DEFAULT_QUEUE_SIZE):
+    """
+    Iterate over ``iterable`` in a separate thread; see `background_map()`
+    """
+    return background_map(lambda x: x, iterable, maxsize)
+
+class Consumer:
+    """
+    Call ``func`` in a separate thread on an iterator over the items passed to
+    `put()`, with at most ``maxsize`` items queued at once.  Call `close()`
+    once all items have been put, or `abort()` on failure.  An exception
+    raised by ``func`` is re-raised by the next `put()` or by `close()`.
+    """
+
+    def __init__(self, func, maxsize=DEFAULT_QUEUE_SIZE):
+        self.func = func
+        self.queue = queue.Queue(maxsize)
+        self.done = threading.Event()
+        self.error = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        try:
+            self.func(self.items())
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done.set()
+
+    def items(self):
+        while True:
+            item = self.queue.get()
+            if item is END:
+                return
+            elif isinstance(item, StageFailed):
+                raise item.exc
+            yield item
+
+    def put(self, item):
+        if not put_until(self.queue, item, self.done):
+            self.close()
+            raise RuntimeError('Pipeline consumer exited early')
+
+    def close(self):
+        put_until(self.queue, END, self.done)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def abort(self):
+        put_until(self.queue, StageFailed(PipelineAborted()), self.done)
+        self.thread.join()
+
+def pipelined_write(writer, marshal, chunks, maxsize=DEFAULT_QUEUE_SIZE):
+    """
+    Marshal each chunk of rows in ``chunks`` with ``marshal`` in one thread and
+    write the results with the `csv.writer` ``writer`` in another, while
+    ``chunks`` is iterated over in the calling thread.  Returns an iterator
+    over ``chunks`` that yields each chunk after it has been queued.
+    """
+
+    def write(chunks):
+        with closing(background_map(marshal, chunks, maxsize)) as batches:
+            for rows in batches:
+                writer.writerows(rows)
+
+    consumer = Consumer(write, maxsize)
+    try:
+        for entries in chunks:
+            consumer.put(entries)
+            yield entries
+    except BaseException:
+        consumer.abort()
+        raise
+    consumer.close()
+
+def pipelined_read(unmarshal, chunks, maxsize=DEFAULT_QUEUE_SIZE):
+    """
+    Iterate over ``chunks`` (e.g., batches of parsed CSV rows) in one thread
+    and apply ``unmarshal`` to each one in another, yielding the results in
+    the calling thread
+    """
+    return background_map(unmarshal, background(chunks, maxsize), maxsize)
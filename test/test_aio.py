@@ -0,0 +1,99 @@
+import asyncio
+from   io                  import StringIO
+import pytest
+import sqlalchemy as S
+from   test_load_dump_core import MOONS, PLANETS, metadata, moons_tbl, \
+                                  planets_tbl
+from   dbcsv               import aio
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = S.create_engine('sqlite:///' + str(tmp_path / 'db.sqlite'))
+    metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+def select_all(engine, tbl):
+    with engine.connect() as conn:
+        return list(map(dict, conn.execute(
+            S.select([tbl]).order_by(tbl.c.id)
+        )))
+
+@pytest.mark.parametrize('compression', [None, 'gzip'])
+def test_dumpdb_loaddb(engine, tmp_path, compression):
+    with engine.begin() as conn:
+        conn.execute(planets_tbl.insert(), PLANETS)
+        conn.execute(moons_tbl.insert(), MOONS)
+    dumpdir = tmp_path / 'dump'
+    timings = run(aio.dumpdb(engine, metadata, dumpdir, chunk_size=3,
+                             queue_size=1, compression=compression))
+    assert sorted(timings) == ['moons', 'planets']
+    with engine.begin() as conn:
+        conn.execute(moons_tbl.delete())
+        conn.execute(planets_tbl.delete())
+    timings = run(aio.loaddb(engine, metadata, dumpdir, batch_size=3,
+                             queue_size=1, concurrency=1))
+    assert sorted(timings) == ['moons', 'planets']
+    assert select_all(engine, planets_tbl) == PLANETS
+    assert select_all(engine, moons_tbl) == MOONS
+
+def test_dump_table_matches_sync(engine):
+    with engine.begin() as conn:
+        conn.execute(planets_tbl.insert(), PLANETS)
+    out = StringIO()
+    run(aio.dump_table(engine, planets_tbl, out, chunk_size=2,
+                       whereclause=planets_tbl.c.id > 3))
+    assert out.getvalue().splitlines()[0] == ','.join(planets_tbl.c.keys())
+    assert len(out.getvalue().splitlines()) == len(PLANETS) - 3 + 1
+
+def test_load_table_failure_rolls_back(engine):
+    with engine.begin() as conn:
+        conn.execute(planets_tbl.insert(), PLANETS[:1])
+    infile = StringIO(
+        'id,name,mass_kg,radius_m,semimajor_axis_m,discovery_date\r\n'
+        '2,Venus,1,1,1,\\N\r\n'
+        '1,Mercury,1,1,1,\\N\r\n'
+    )
+    with pytest.raises(S.exc.IntegrityError):
+        run(aio.load_table(engine, planets_tbl, infile, batch_size=1,
+                           queue_size=1))
+    assert [p["id"] for p in select_all(engine, planets_tbl)] == [1]
+
+def test_load_table_bad_csv_stops_worker(engine):
+    infile = StringIO(
+        'id,name,mass_kg,radius_m,semimajor_axis_m,discovery_date\r\n'
+        '1,Mercury,1,1,1,\\N\r\n'
+        '2,Venus,not a number,1,1,\\N\r\n'
+    )
+    with pytest.raises(ValueError):
+        run(aio.load_table(engine, planets_tbl, infile, batch_size=1))
+    assert select_all(engine, planets_tbl) == []
+
+def test_loaddb_columnar_unsupported(engine, tmp_path):
+    (tmp_path / 'planets.parquet').write_bytes(b'')
+    with pytest.raises(ValueError):
+        run(aio.loaddb(engine, metadata, tmp_path))
+
+class FailingWriter:
+    def __init__(self):
+        self.lines = 0
+
+    def write(self, s):
+        self.lines += 1
+        if self.lines > 2:
+            raise OSError('disk full')
+        return len(s)
+
+def test_dump_table_write_failure_stops_worker(engine):
+    with engine.begin() as conn:
+        conn.execute(planets_tbl.insert(), PLANETS)
+    with pytest.raises(OSError):
+        run(aio.dump_table(engine, planets_tbl, FailingWriter(), chunk_size=1,
+                           queue_size=1))
@@ -0,0 +1,224 @@
+from   contextlib                        import contextmanager
+import csv
+from   datetime                          import date, datetime, time, \
+                                                timedelta, timezone
+from   decimal                           import Decimal
+from   io                                import StringIO
+import pytest
+import sqlalchemy as S
+from   sqlalchemy.dialects.postgresql    import psycopg2
+from   test_load_dump_core               import DATA_DIR, MOONS, PLANETS, \
+                                                metadata, moons_tbl, \
+                                                planets_tbl
+from   dbcsv                             import dump_table, load_table, \
+                                                loaddb
+from   dbcsv.bulk                        import copy_text, copy_unescape, \
+                                                pg_time, pg_timestamp, \
+                                                postgresql_dump, \
+                                                prepared_insert
+from   dbcsv.marshalling                 import get_codec_plan
+
+class FakeCopyCursor:
+    def __init__(self, log, output):
+        self.log = log
+        self.output = output
+
+    def copy_expert(self, sql, fp):
+        if sql.endswith(' TO STDOUT'):
+            # Write in uneven pieces that don't line up with rows
+            for i in range(0, len(self.output), 7):
+                fp.write(self.output[i:i+7])
+            self.log.append((sql, None))
+        else:
+            chunks = []
+            while True:
+                chunk = fp.read(7)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+            self.log.append((sql, ''.join(chunks)))
+
+    def close(self):
+        pass
+
+class FakePGConnection:
+    """ Just enough of a `Connection` to a psycopg2 database to run `COPY` """
+
+    def __init__(self, output=''):
+        self.dialect = psycopg2.dialect()
+        self.log = []
+        self.output = output
+        self.connection = self
+
+    @contextmanager
+    def begin(self):
+        yield
+
+    def cursor(self):
+        return FakeCopyCursor(self.log, self.output)
+
+def test_loaddb_bulk_sqlite():
+    engine = S.create_engine('sqlite:///:memory:')
+    metadata.create_all(engine)
+    with engine.begin() as connection:
+        sync = connection.execute('PRAGMA synchronous').scalar()
+        loaddb(connection, metadata, DATA_DIR / 'planets', batch_size=4,
+               bulk=True)
+        assert connection.execute('PRAGMA synchronous').scalar() == sync
+        planet_query = connection.execute(
+            S.select([planets_tbl]).order_by(S.asc(planets_tbl.c.id))
+        )
+        assert list(map(dict, planet_query)) == PLANETS
+        moon_query = connection.execute(
+            S.select([moons_tbl]).order_by(S.asc(moons_tbl.c.id))
+        )
+        assert list(map(dict, moon_query)) == MOONS
+    metadata.drop_all(engine)
+
+def test_load_table_bulk_sqlite_autocommit(tmp_path):
+    engine = S.create_engine('sqlite:///' + str(tmp_path / 'db.sqlite'))
+    metadata.create_all(engine)
+    with engine.connect() as connection:
+        sync = connection.execute('PRAGMA synchronous').scalar()
+        with (DATA_DIR / 'planets' / 'planets.csv').open() as fp:
+            load_table(connection, planets_tbl, fp, bulk=True)
+        assert connection.execute('PRAGMA synchronous').scalar() == sync
+    with engine.connect() as connection:
+        planet_query = connection.execute(
+            S.select([planets_tbl]).order_by(S.asc(planets_tbl.c.id))
+        )
+        assert list(map(dict, planet_query)) == PLANETS
+
+def test_load_table_bulk_sqlite_python_default():
+    md = S.MetaData()
+    tbl = S.Table('planets', md,
+        S.Column('id', S.Integer, primary_key=True, nullable=False),
+        S.Column('name', S.Unicode(64), nullable=False),
+        S.Column('note', S.Unicode(64), default='none'),
+    )
+    engine = S.create_engine('sqlite:///:memory:')
+    md.create_all(engine)
+    with engine.begin() as connection:
+        assert prepared_insert(connection, tbl, ['id', 'name']) is None
+        load_table(connection, tbl, StringIO('id,name\r\n1,Mercury\r\n'),
+                   bulk=True)
+        assert list(map(tuple, connection.execute(S.select([tbl])))) \
+            == [(1, 'Mercury', 'none')]
+
+def test_load_table_bulk_postgresql():
+    md = S.MetaData()
+    tbl = S.Table('things', md,
+        S.Column('id', S.Integer, primary_key=True, nullable=False),
+        S.Column('Name', S.Unicode(64)),
+        S.Column('data', S.LargeBinary),
+        S.Column('truth', S.Boolean),
+        S.Column('date', S.Date),
+        S.Column('timestamp', S.DateTime(timezone=True)),
+        S.Column('duration', S.Interval),
+        S.Column('doc', S.JSON),
+        S.Column('intlist', S.ARRAY(S.Integer)),
+    )
+    conn = FakePGConnection()
+    csvdata = (
+        'id,Name,data,truth,date,timestamp,duration,doc,intlist\r\n'
+        '1,"tab\there",3q2+7w==,t,2019-04-13,2019-04-13T19:28:36-04:00,'
+        '90.5,"{""a"": [1, null]}","[\'42\', \'\\\\N\']"\r\n'
+        '2,\\N,\\N,\\N,\\N,\\N,\\N,\\N,\\N\r\n'
+    )
+    load_table(conn, tbl, StringIO(csvdata), bulk=True)
+    assert conn.log == [(
+        'COPY things (id, "Name", data, truth, date, timestamp, duration, doc,'
+        ' intlist) FROM STDIN',
+        '1\ttab\\there\t\\\\xdeadbeef\tt\t2019-04-13\t'
+        '2019-04-13 19:28:36-04:00\t0 days 90 seconds 500000 microseconds\t'
+        '{"a": [1, null]}\t{"42",NULL}\n'
+        '2\t\\N\t\\N\t\\N\t\\N\t\\N\t\\N\t\\N\t\\N\n',
+    )]
+
+def test_copy_text():
+    assert copy_text(None) == '\\N'
+    assert copy_text(r'\N') == r'\\N'
+    assert copy_text('a\r\nb') == 'a\\r\\nb'
+    assert copy_text(False) == 'f'
+    assert copy_text(date(2019, 4, 13)) == '2019-04-13'
+    assert copy_text(datetime(2019, 4, 13, 19, 28, tzinfo=timezone.utc)) \
+        == '2019-04-13 19:28:00+00:00'
+    assert copy_text(timedelta(hours=-1)) \
+        == '-1 days 82800 seconds 0 microseconds'
+    assert copy_text([['a"b', None], ['c\\d', 'e']]) \
+        == r'{{"a\\"b",NULL},{"c\\\\d","e"}}'
+
+def test_dump_table_bulk_postgresql():
+    md = S.MetaData()
+    tbl = S.Table('things', md,
+        S.Column('id', S.Integer, primary_key=True, nullable=False),
+        S.Column('name', S.Unicode(64)),
+        S.Column('data', S.LargeBinary),
+        S.Column('truth', S.Boolean),
+        S.Column('date', S.Date),
+        S.Column('timestamp', S.DateTime(timezone=True)),
+        S.Column('timetz', S.Time(timezone=True)),
+        S.Column('price', S.Numeric(10, 2)),
+        S.Column('realval', S.Float),
+        S.Column('doc', S.JSON),
+        S.Column('color', S.Enum('red', 'green', 'blue')),
+    )
+    conn = FakePGConnection(
+        '1\ttab\\there\t\\\\xdeadbeef\tt\t2019-04-13\t'
+        '2019-04-13 19:28:36.314159-04\t19:28:36-04\t3.14\t100000\t'
+        '{"a":[1,null]}\tred\n'
+        '2\t\\\\N\t\\N\t\\N\t\\N\t\\N\t\\N\t\\N\t\\N\tnull\t\\N\n'
+    )
+    tz = timezone(timedelta(hours=-4))
+    rows = [
+        [
+            1, 'tab\there', b'\xDE\xAD\xBE\xEF', True, date(2019, 4, 13),
+            datetime(2019, 4, 13, 19, 28, 36, 314159, tzinfo=tz),
+            time(19, 28, 36, tzinfo=tz), Decimal('3.14'), 100000.0,
+            {"a": [1, None]}, 'red',
+        ],
+        [2, r'\N'] + [None] * 9,
+    ]
+    expected = StringIO()
+    writer = csv.writer(expected)
+    writer.writerow(tbl.columns.keys())
+    writer.writerows(map(get_codec_plan(tbl).marshal_row, rows))
+    outfile = StringIO()
+    dump_table(conn, tbl, outfile, bulk=True, whereclause=tbl.c.id > 0)
+    assert outfile.getvalue() == expected.getvalue()
+    assert len(conn.log) == 1
+    sql, _ = conn.log[0]
+    assert sql.startswith('COPY (SELECT things.id, things.name, ')
+    assert sql.endswith('WHERE things.id > 0) TO STDOUT')
+
+def test_postgresql_dump_unsupported():
+    md = S.MetaData()
+    tbl = S.Table('things', md,
+        S.Column('id', S.Integer, primary_key=True, nullable=False),
+        S.Column('obj', S.PickleType),
+    )
+    conn = FakePGConnection()
+    assert not postgresql_dump(conn, tbl, csv.writer(StringIO()), None)
+    assert conn.log == []
+
+def test_copy_unescape():
+    assert copy_unescape('plain') == 'plain'
+    assert copy_unescape(r'a\tb\\N\nc\x41\101') == 'a\tb\\N\ncAA'
+
+@pytest.mark.parametrize('s,iso', [
+    ('2019-04-13 19:28:36.5-04', '2019-04-13T19:28:36.500000-04:00'),
+    ('2019-04-13 19:28:36.31+05:30', '2019-04-13T19:28:36.310000+05:30'),
+    ('2019-04-13 19:28:36.314159', '2019-04-13T19:28:36.314159'),
+    ('2019-04-13 19:28:36', '2019-04-13T19:28:36'),
+])
+def test_pg_timestamp(s, iso):
+    assert pg_timestamp(s) == iso
+
+@pytest.mark.parametrize('s,iso', [
+    ('19:28:36.5', '19:28:36.500000'),
+    ('19:28:36.31-04', '19:28:36.310000-04:00'),
+    ('19:28:36.3141', '19:28:36.314100'),
+    ('19:28:36', '19:28:36'),
+])
+def test_pg_time(s, iso):
+    assert pg_time(s) == iso
@@ -0,0 +1,95 @@
+import json
+from   shutil              import copyfile, copytree
+import pytest
+import sqlalchemy as S
+from   test_load_dump_core import DATA_DIR, MOONS, PLANETS, metadata, \
+                                  moons_tbl, planets_tbl
+from   dbcsv               import loaddb, multiproc
+from   dbcsv.compression   import csv_suffix, open_csv
+from   dbcsv.load_dump     import CHECKPOINT_FILE
+
+def query_all(engine):
+    with engine.connect() as connection:
+        planets = list(map(dict, connection.execute(
+            S.select([planets_tbl]).order_by(S.asc(planets_tbl.c.id))
+        )))
+        moons = list(map(dict, connection.execute(
+            S.select([moons_tbl]).order_by(S.asc(moons_tbl.c.id))
+        )))
+    return planets, moons
+
+@pytest.mark.parametrize('checkpoint', [1, 4, 100])
+def test_loaddb_checkpoint(tmp_path, checkpoint):
+    dumpdir = tmp_path / 'dump'
+    copytree(str(DATA_DIR / 'planets'), str(dumpdir))
+    engine = S.create_engine('sqlite:///' + str(tmp_path / 'db.sqlite'))
+    metadata.create_all(engine)
+    with engine.connect() as connection:
+        loaddb(connection, metadata, dumpdir, batch_size=3,
+               checkpoint=checkpoint)
+    assert query_all(engine) == (PLANETS, MOONS)
+    assert not (dumpdir / CHECKPOINT_FILE).exists()
+
+def test_loaddb_checkpoint_processes(monkeypatch, tmp_path):
+    pools = []
+    real_pool = multiproc.Pool
+
+    def counting_pool(*args, **kwargs):
+        pools.append(args)
+        return real_pool(*args, **kwargs)
+
+    monkeypatch.setattr(multiproc, 'Pool', counting_pool)
+    dumpdir = tmp_path / 'dump'
+    copytree(str(DATA_DIR / 'planets'), str(dumpdir))
+    engine = S.create_engine('sqlite:///' + str(tmp_path / 'db.sqlite'))
+    metadata.create_all(engine)
+    with engine.connect() as connection:
+        loaddb(connection, metadata, dumpdir, batch_size=3, checkpoint=4,
+               processes=2)
+    assert query_all(engine) == (PLANETS, MOONS)
+    # One pool per file, not per checkpoint
+    assert len(pools) == 2
+
+@pytest.mark.parametrize('compression', [None, 'gzip'])
+def test_loaddb_checkpoint_resume(tmp_path, compression):
+    dumpdir = tmp_path / 'dump'
+    dumpdir.mkdir()
+    copyfile(
+        str(DATA_DIR / 'planets' / 'planets.csv'),
+        str(dumpdir / 'planets.csv'),
+    )
+    moons_path = dumpdir / ('moons' + csv_suffix(compression))
+    good_moons = (DATA_DIR / 'planets' / 'moons.csv').read_text()
+    # Corrupt the 11th moon in a way that doesn't change the file's length:
+    assert '1684-03-21' in good_moons
+    bad_moons = good_moons.replace('1684-03-21', '1684-13-21', 1)
+    with open_csv(moons_path, 'w') as fp:
+        fp.write(bad_moons)
+    engine = S.create_engine('sqlite:///' + str(tmp_path / 'db.sqlite'))
+    metadata.create_all(engine)
+    with engine.connect() as connection:
+        with pytest.raises(ValueError):
+            loaddb(connection, metadata, dumpdir, checkpoint=4)
+    with (dumpdir / CHECKPOINT_FILE).open() as fp:
+        progress = json.load(fp)["files"]
+    assert progress["planets.csv"]["done"]
+    assert progress["planets.csv"]["rows"] == len(PLANETS)
+    assert not progress[moons_path.name]["done"]
+    assert progress[moons_path.name]["rows"] == 8
+    assert query_all(engine) == (PLANETS, MOONS[:8])
+    with open_csv(moons_path, 'w') as fp:
+        fp.write(good_moons)
+    with engine.connect() as connection:
+        loaddb(connection, metadata, dumpdir, checkpoint=4)
+    assert query_all(engine) == (PLANETS, MOONS)
+    assert not (dumpdir / CHECKPOINT_FILE).exists()
+
+def test_loaddb_checkpoint_in_transaction(tmp_path):
+    dumpdir = tmp_path / 'dump'
+    copytree(str(DATA_DIR / 'planets'), str(dumpdir))
+    engine = S.create_engine('sqlite:///' + str(tmp_path / 'db.sqlite'))
+    metadata.create_all(engine)
+    with engine.begin() as connection:
+        with pytest.raises(ValueError):
+            loaddb(connection, metadata, dumpdir, checkpoint=4)
+    assert not (dumpdir / CHECKPOINT_FILE).exists()
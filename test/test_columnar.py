@@ -0,0 +1,175 @@
+from   datetime            import date, datetime, time, timedelta
+import enum
+from   io                  import BytesIO
+import pytest
+import sqlalchemy as S
+from   test_load_dump_core import MOONS, PLANETS, metadata, moons_tbl, \
+                                  planets_tbl
+from   dbcsv               import dump_table, dumpdb, load_table, loaddb
+from   dbcsv.columnar      import arrow_type
+from   dbcsv.load_dump     import CHECKPOINT_FILE
+
+pa = pytest.importorskip('pyarrow')
+
+class Color(enum.Enum):
+    RED = 1
+    GREEN = 2
+
+types_md = S.MetaData()
+
+types_tbl = S.Table('types', types_md,
+    S.Column('id', S.Integer, primary_key=True, nullable=False),
+    S.Column('flag', S.Boolean, nullable=True),
+    S.Column('ratio', S.Float, nullable=True),
+    S.Column('text', S.Unicode(64), nullable=True),
+    S.Column('blob', S.LargeBinary, nullable=True),
+    S.Column('day', S.Date, nullable=True),
+    S.Column('stamp', S.DateTime, nullable=True),
+    S.Column('clock', S.Time, nullable=True),
+    S.Column('span', S.Interval, nullable=True),
+    S.Column('data', S.JSON, nullable=True),
+    S.Column('color', S.Enum(Color), nullable=True),
+    S.Column('pickle', S.PickleType, nullable=True),
+)
+
+TYPES = [
+    {
+        "id": 1,
+        "flag": True,
+        "ratio": 0.5,
+        "text": "\\N",
+        "blob": b'\x00\xFF',
+        "day": date(2020, 2, 29),
+        "stamp": datetime(2020, 2, 29, 12, 34, 56, 789),
+        "clock": time(23, 59, 59, 1),
+        "span": timedelta(days=1, seconds=2, microseconds=3),
+        "data": {"key": [1, "two", None]},
+        "color": Color.GREEN,
+        "pickle": {1, 2, 3},
+    },
+    {
+        "id": 2,
+        "flag": None,
+        "ratio": None,
+        "text": None,
+        "blob": None,
+        "day": None,
+        "stamp": None,
+        "clock": None,
+        "span": None,
+        "data": None,
+        "color": None,
+        "pickle": None,
+    },
+]
+
+@pytest.mark.parametrize('fmt', ['parquet', 'arrow'])
+@pytest.mark.parametrize('compression', [None, 'zstd'])
+def test_dumpdb_loaddb_columnar(tmp_path, fmt, compression):
+    dumpdir = tmp_path / 'dump'
+    src = S.create_engine('sqlite://')
+    metadata.create_all(src)
+    with src.connect() as conn:
+        conn.execute(planets_tbl.insert(), PLANETS)
+        conn.execute(moons_tbl.insert(), MOONS)
+        dumpdb(conn, metadata, dumpdir, chunk_size=4, format=fmt,
+               compression=compression)
+    assert sorted(p.name for p in dumpdir.iterdir()) == [
+        'moons.' + fmt,
+        'planets.' + fmt,
+    ]
+    dest = S.create_engine('sqlite://')
+    metadata.create_all(dest)
+    with dest.connect() as conn:
+        loaddb(conn, metadata, dumpdir, batch_size=3)
+        assert list(map(dict, conn.execute(
+            S.select([planets_tbl]).order_by(planets_tbl.c.id)
+        ))) == PLANETS
+        assert list(map(dict, conn.execute(
+            S.select([moons_tbl]).order_by(moons_tbl.c.id)
+        ))) == MOONS
+
+@pytest.mark.parametrize('fmt', ['parquet', 'arrow'])
+@pytest.mark.parametrize('row_group_size', [4, 10, 1000])
+def test_dump_table_row_groups(fmt, row_group_size):
+    engine = S.create_engine('sqlite://')
+    metadata.create_all(engine)
+    buf = BytesIO()
+    with engine.connect() as conn:
+        conn.execute(planets_tbl.insert(), PLANETS)
+        conn.execute(moons_tbl.insert(), MOONS)
+        dump_table(conn, moons_tbl, buf, chunk_size=3, format=fmt,
+                   row_group_size=row_group_size)
+    buf.seek(0)
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        meta = pq.ParquetFile(buf).metadata
+        got = [meta.row_group(i).num_rows for i in range(meta.num_row_groups)]
+    else:
+        reader = pa.ipc.open_file(buf)
+        got = [reader.get_batch(i).num_rows
+               for i in range(reader.num_record_batches)]
+    # Independent of the fetch chunk size
+    full, rest = divmod(len(MOONS), row_group_size)
+    assert got == [row_group_size] * full + ([rest] if rest else [])
+
+@pytest.mark.parametrize('fmt', ['parquet', 'arrow'])
+def test_dump_load_table_columnar_types(fmt):
+    engine = S.create_engine('sqlite://')
+    types_md.create_all(engine)
+    buf = BytesIO()
+    with engine.connect() as conn:
+        conn.execute(types_tbl.insert(), TYPES)
+        dump_table(conn, types_tbl, buf, format=fmt)
+        conn.execute(types_tbl.delete())
+        buf.seek(0)
+        load_table(conn, types_tbl, buf, format=fmt, batch_size=1)
+        assert list(map(dict, conn.execute(
+            S.select([types_tbl]).order_by(types_tbl.c.id)
+        ))) == TYPES
+
+def test_loaddb_columnar_checkpoint(tmp_path):
+    dumpdir = tmp_path / 'dump'
+    engine = S.create_engine('sqlite:///' + str(tmp_path / 'db.sqlite'))
+    metadata.create_all(engine)
+    with engine.connect() as conn:
+        conn.execute(planets_tbl.insert(), PLANETS)
+        conn.execute(moons_tbl.insert(), MOONS)
+        dumpdb(conn, metadata, dumpdir, format='parquet')
+        conn.execute(moons_tbl.delete())
+        conn.execute(planets_tbl.delete())
+        loaddb(conn, metadata, dumpdir, checkpoint=5)
+        assert conn.execute(S.select([S.func.count()])
+                             .select_from(moons_tbl)).scalar() == len(MOONS)
+    assert not (dumpdir / CHECKPOINT_FILE).exists()
+
+def test_dumpdb_columnar_watermarks(tmp_path):
+    engine = S.create_engine('sqlite://')
+    metadata.create_all(engine)
+    with engine.connect() as conn:
+        with pytest.raises(ValueError):
+            dumpdb(conn, metadata, tmp_path, format='parquet',
+                   watermarks={"moons": "id"})
+
+@pytest.mark.parametrize('coltype,atype', [
+    (S.Integer(), pa.int64()),
+    (S.BigInteger(), pa.int64()),
+    (S.Float(), pa.float64()),
+    (S.Numeric(10, 2), pa.decimal128(10, 2)),
+    (S.Numeric(), None),
+    (S.Float(asdecimal=True), None),
+    (S.Unicode(), pa.string()),
+    (S.LargeBinary(), pa.binary()),
+    (S.Boolean(), pa.bool_()),
+    (S.Date(), pa.date32()),
+    (S.DateTime(), pa.timestamp('us')),
+    (S.DateTime(timezone=True), None),
+    (S.Time(), pa.time64('us')),
+    (S.Interval(), pa.duration('us')),
+    (S.JSON(), None),
+    (S.Enum('foo', 'bar'), None),
+    (S.ARRAY(S.Integer), None),
+    (S.PickleType(), None),
+])
+def test_arrow_type(coltype, atype):
+    assert arrow_type(coltype) == atype
@@ -0,0 +1,125 @@
+import io
+import locale
+from   pathlib             import Path
+import pytest
+import sqlalchemy as S
+from   test_load_dump_core import DATA_DIR, MOONS, PLANETS, metadata, \
+                                  moons_tbl, planets_tbl
+from   dbcsv               import dumpdb, loaddb
+from   dbcsv.compression   import BlockWriter, ThreadedWriter, open_csv
+
+COMPRESSIONS = [
+    ('gzip', '.gz', None),
+    ('zstd', '.zst', 'zstandard'),
+    ('lz4', '.lz4', 'lz4.frame'),
+]
+
+@pytest.fixture(params=COMPRESSIONS, ids=[c[0] for c in COMPRESSIONS])
+def compression(request):
+    name, suffix, module = request.param
+    if module is not None:
+        pytest.importorskip(module)
+    return (name, suffix)
+
+def test_dumpdb_loaddb_compressed(tmp_path, compression):
+    name, suffix = compression
+    engine = S.create_engine('sqlite:///:memory:')
+    metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(planets_tbl.insert(), PLANETS)
+        connection.execute(moons_tbl.insert(), MOONS)
+        dumpdb(connection, metadata, tmp_path, compression=name)
+    assert sorted(p.name for p in tmp_path.iterdir()) \
+        == ['moons.csv' + suffix, 'planets.csv' + suffix]
+    for tbl in ['moons', 'planets']:
+        with open_csv(tmp_path / (tbl + '.csv' + suffix), 'r') as fp:
+            assert fp.read() == (DATA_DIR / 'planets' / (tbl + '.csv'))\
+                                .read_text()
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    with engine.begin() as connection:
+        loaddb(connection, metadata, tmp_path)
+        planet_query = connection.execute(
+            S.select([planets_tbl]).order_by(S.asc(planets_tbl.c.id))
+        )
+        assert list(map(dict, planet_query)) == PLANETS
+        moon_query = connection.execute(
+            S.select([moons_tbl]).order_by(S.asc(moons_tbl.c.id))
+        )
+        assert list(map(dict, moon_query)) == MOONS
+
+def test_dumpdb_replaces_compressed(tmp_path, compression):
+    name, suffix = compression
+    engine = S.create_engine('sqlite:///:memory:')
+    metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(planets_tbl.insert(), PLANETS)
+        connection.execute(moons_tbl.insert(), MOONS)
+        dumpdb(connection, metadata, tmp_path, compression=name)
+        connection.execute(moons_tbl.delete())
+        dumpdb(connection, metadata, tmp_path)
+        # The earlier compressed files would otherwise be loaded instead
+        assert sorted(p.name for p in tmp_path.iterdir()) \
+            == ['moons.csv', 'planets.csv']
+        dumpdb(connection, metadata, tmp_path, compression=name)
+        assert sorted(p.name for p in tmp_path.iterdir()) \
+            == ['moons.csv' + suffix, 'planets.csv' + suffix]
+
+def test_dumpdb_bad_compression(tmp_path):
+    engine = S.create_engine('sqlite:///:memory:')
+    metadata.create_all(engine)
+    with engine.begin() as connection:
+        with pytest.raises(ValueError):
+            dumpdb(connection, metadata, tmp_path, compression='rar')
+    assert list(Path(tmp_path).iterdir()) == []
+
+class FailingWriter(io.RawIOBase):
+    def writable(self):
+        return True
+
+    def write(self, b):
+        raise OSError('Disk full: could not write {} bytes'.format(len(b)))
+
+def test_threaded_writer_error():
+    writer = ThreadedWriter(FailingWriter())
+    writer.write(b'foo')
+    with pytest.raises(OSError, match='Disk full'):
+        writer.close()
+
+@pytest.mark.parametrize('kwargs', [
+    {"buffer_size": 1 << 20},
+    {"direct_write": True},
+    {"direct_write": True, "buffer_size": 100},
+])
+def test_dumpdb_buffered(tmp_path, kwargs):
+    engine = S.create_engine('sqlite:///:memory:')
+    metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(planets_tbl.insert(), PLANETS)
+        connection.execute(moons_tbl.insert(), MOONS)
+        dumpdb(connection, metadata, tmp_path, **kwargs)
+    for tbl in ['moons', 'planets']:
+        assert (tmp_path / (tbl + '.csv')).read_bytes() \
+            == (DATA_DIR / 'planets' / (tbl + '.csv')).read_bytes()
+
+def test_block_writer(tmp_path):
+    path = tmp_path / 'out.txt'
+    with BlockWriter.open(path, block_size=4, encoding='utf-8') as fp:
+        assert fp.write('ab') == 2
+        assert not path.read_bytes()
+        fp.write('cdé')
+        assert path.read_bytes() == 'abcdé'.encode('utf-8')
+        fp.write('f')
+    assert fp.closed
+    assert path.read_text(encoding='utf-8') == 'abcdéf'
+
+def test_block_writer_locale_encoding(monkeypatch, tmp_path):
+    monkeypatch.setattr(locale, 'getpreferredencoding', lambda _: 'latin-1')
+    path = tmp_path / 'out.csv'
+    with open_csv(path, 'w', direct_write=True) as fp:
+        fp.write('caf\xe9\r\n')
+    assert path.read_bytes() == b'caf\xe9\r\n'
+
+def test_direct_write_compressed(tmp_path):
+    with pytest.raises(ValueError):
+        open_csv(tmp_path / 'foo.csv.gz', 'w', direct_write=True)
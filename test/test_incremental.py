@@ -0,0 +1,117 @@
+import json
+import pytest
+import sqlalchemy as S
+from   dbcsv           import dumpdb, loaddb
+from   dbcsv.load_dump import WATERMARK_FILE, delta_files
+
+metadata = S.MetaData()
+
+items_tbl = S.Table('items', metadata,
+    S.Column('id', S.Integer, primary_key=True, nullable=False),
+    S.Column('name', S.Unicode(255), nullable=False),
+    S.Column('version', S.Integer, nullable=False),
+)
+
+tags_tbl = S.Table('tags', metadata,
+    S.Column('item_id', S.Integer, primary_key=True, nullable=False),
+    S.Column('tag', S.Unicode(255), primary_key=True, nullable=False),
+    S.Column('version', S.Integer, nullable=False),
+)
+
+def query_all(engine, table):
+    with engine.connect() as connection:
+        return [
+            tuple(r) for r in
+            connection.execute(S.select([table]).order_by(*table.primary_key))
+        ]
+
+@pytest.mark.parametrize('compression', [None, 'gzip'])
+def test_incremental_dump_and_load(tmp_path, compression):
+    dumpdir = tmp_path / 'dump'
+    watermarks = {"items": "version", "tags": tags_tbl.c.version}
+    src = S.create_engine('sqlite://')
+    metadata.create_all(src)
+    with src.connect() as conn:
+        conn.execute(items_tbl.insert(), [
+            {"id": 1, "name": "foo", "version": 1},
+            {"id": 2, "name": "bar", "version": 2},
+        ])
+        conn.execute(tags_tbl.insert(), [
+            {"item_id": 1, "tag": "a", "version": 1},
+        ])
+        dumpdb(conn, metadata, dumpdir, compression=compression,
+               watermarks=watermarks)
+        assert delta_files(dumpdir, items_tbl) == []
+        conn.execute(
+            items_tbl.update().where(items_tbl.c.id == 1)
+                              .values(name="FOO", version=3)
+        )
+        conn.execute(items_tbl.insert(), {"id": 3, "name": "baz", "version": 4})
+        conn.execute(
+            tags_tbl.update().where(tags_tbl.c.item_id == 1)
+                             .values(version=2)
+        )
+        dumpdb(conn, metadata, dumpdir, compression=compression,
+               watermarks=watermarks)
+        # No changes since the last dump
+        dumpdb(conn, metadata, dumpdir, compression=compression,
+               watermarks=watermarks)
+        conn.execute(
+            items_tbl.update().where(items_tbl.c.id == 2)
+                              .values(name="BAR", version=5)
+        )
+        dumpdb(conn, metadata, dumpdir, compression=compression,
+               watermarks=watermarks)
+    assert [p.name for p in delta_files(dumpdir, items_tbl)] == [
+        'items.delta-0001.csv' + ('.gz' if compression else ''),
+        'items.delta-0002.csv' + ('.gz' if compression else ''),
+    ]
+    assert len(delta_files(dumpdir, tags_tbl)) == 1
+    with (dumpdir / WATERMARK_FILE).open() as fp:
+        state = json.load(fp)["tables"]
+    assert state == {
+        "items": {"column": "version", "watermark": "5", "deltas": 2},
+        "tags": {"column": "version", "watermark": "2", "deltas": 1},
+    }
+    dest = S.create_engine('sqlite:///' + str(tmp_path / 'db.sqlite'))
+    metadata.create_all(dest)
+    with dest.connect() as conn:
+        loaddb(conn, metadata, dumpdir)
+    assert query_all(dest, items_tbl) == [
+        (1, "FOO", 3),
+        (2, "BAR", 5),
+        (3, "baz", 4),
+    ]
+    assert query_all(dest, tags_tbl) == [(1, "a", 2)]
+
+def test_incremental_dump_changed_column(tmp_path):
+    engine = S.create_engine('sqlite://')
+    metadata.create_all(engine)
+    with engine.connect() as conn:
+        dumpdb(conn, metadata, tmp_path, watermarks={"items": "version"})
+        with pytest.raises(ValueError):
+            dumpdb(conn, metadata, tmp_path, watermarks={"items": "id"})
+
+def test_full_dump_discards_deltas(tmp_path):
+    dumpdir = tmp_path / 'dump'
+    src = S.create_engine('sqlite://')
+    metadata.create_all(src)
+    with src.connect() as conn:
+        conn.execute(items_tbl.insert(), {"id": 1, "name": "old", "version": 1})
+        dumpdb(conn, metadata, dumpdir, watermarks={"items": "version"})
+        conn.execute(items_tbl.insert(), {"id": 2, "name": "old", "version": 2})
+        dumpdb(conn, metadata, dumpdir, watermarks={"items": "version"})
+        assert len(delta_files(dumpdir, items_tbl)) == 1
+        conn.execute(
+            items_tbl.update().where(items_tbl.c.id == 2)
+                              .values(name="new", version=3)
+        )
+        dumpdb(conn, metadata, dumpdir)
+    assert delta_files(dumpdir, items_tbl) == []
+    with (dumpdir / WATERMARK_FILE).open() as fp:
+        assert json.load(fp)["tables"] == {}
+    dest = S.create_engine('sqlite://')
+    metadata.create_all(dest)
+    with dest.connect() as conn:
+        loaddb(conn, metadata, dumpdir)
+    assert query_all(dest, items_tbl) == [(1, "old", 1), (2, "new", 3)]
@@ -0,0 +1,181 @@
+import re
+from   types               import SimpleNamespace
+import pytest
+import sqlalchemy as S
+from   sqlalchemy.dialects import postgresql
+from   test_load_dump_core import moons_tbl
+from   dbcsv               import indexes, loaddb, parallel_loaddb
+from   dbcsv.indexes       import create_fks, create_indexes, \
+                                  deferrable_fks, drop_indexes, existing_fks
+
+metadata = S.MetaData(naming_convention={
+    "ix": "ix_%(table_name)s_%(column_0_name)s",
+    "fk": "fk_%(table_name)s_%(column_0_name)s",
+})
+
+authors_tbl = S.Table('authors', metadata,
+    S.Column('id', S.Integer, primary_key=True, nullable=False),
+    S.Column('name', S.Unicode(255), nullable=False, index=True),
+)
+
+books_tbl = S.Table('books', metadata,
+    S.Column('id', S.Integer, primary_key=True, nullable=False),
+    S.Column('author_id', S.Integer, S.ForeignKey('authors.id'),
+             nullable=False, index=True),
+    S.Column('title', S.Unicode(255), nullable=False),
+    S.Index('ix_books_title_author', 'title', 'author_id', unique=True),
+)
+
+ALL_INDEXES = {
+    "authors": {"ix_authors_name"},
+    "books": {"ix_books_author_id", "ix_books_title_author"},
+}
+
+def index_names(engine):
+    inspector = S.inspect(engine)
+    return {
+        name: {ix["name"] for ix in inspector.get_indexes(name)}
+        for name in ["authors", "books"]
+    }
+
+@pytest.fixture
+def dumpdir(tmp_path):
+    dirpath = tmp_path / 'dump'
+    dirpath.mkdir()
+    (dirpath / 'authors.csv').write_text('id,name\r\n1,Alice\r\n2,Bob\r\n')
+    (dirpath / 'books.csv').write_text(
+        'id,author_id,title\r\n1,1,Foo\r\n2,2,Bar\r\n3,1,Baz\r\n'
+    )
+    return dirpath
+
+def test_drop_create_indexes():
+    engine = S.create_engine('sqlite://')
+    metadata.create_all(engine)
+    with engine.connect() as conn:
+        drop_indexes(conn, books_tbl)
+        assert index_names(engine) == {
+            "authors": {"ix_authors_name"},
+            "books": set(),
+        }
+        drop_indexes(conn, books_tbl)
+        create_indexes(conn, books_tbl)
+        assert index_names(engine) == ALL_INDEXES
+        create_indexes(conn, books_tbl)
+        assert index_names(engine) == ALL_INDEXES
+
+def test_loaddb_defer_indexes(dumpdir):
+    engine = S.create_engine('sqlite://')
+    metadata.create_all(engine)
+    dropped = []
+    with engine.connect() as conn:
+        @S.event.listens_for(conn, 'before_execute')
+        def record(conn, clauseelement, multiparams, params):
+            # Check that the indexes are gone by the time rows are inserted
+            m = re.match(r'INSERT INTO (\w+)', str(clauseelement))
+            if m:
+                dropped.append(index_names(conn)[m.group(1)])
+            return clauseelement, multiparams, params
+
+        loaddb(conn, metadata, dumpdir, defer_indexes=True)
+        assert dropped and all(ixes == set() for ixes in dropped)
+        assert index_names(engine) == ALL_INDEXES
+        assert conn.execute(S.select([S.func.count()])
+                             .select_from(books_tbl)).scalar() == 3
+
+def test_loaddb_defer_indexes_restores_missing(dumpdir):
+    # E.g., when resuming a load that failed after dropping the indexes
+    engine = S.create_engine('sqlite://')
+    metadata.create_all(engine)
+    with engine.connect() as conn:
+        drop_indexes(conn, authors_tbl)
+        (dumpdir / 'authors.csv').unlink()
+        loaddb(conn, metadata, dumpdir, defer_indexes=True)
+    assert index_names(engine) == ALL_INDEXES
+
+def test_parallel_loaddb_defer_indexes(dumpdir, tmp_path):
+    engine = S.create_engine('sqlite:///' + str(tmp_path / 'db.sqlite'))
+    metadata.create_all(engine)
+    timings = parallel_loaddb(engine, metadata, dumpdir, defer_indexes=True)
+    assert sorted(timings) == ["authors", "books"]
+    assert index_names(engine) == ALL_INDEXES
+
+def test_deferrable_fks():
+    sqlite_conn = SimpleNamespace(dialect=S.create_engine('sqlite://').dialect)
+    assert deferrable_fks(sqlite_conn, books_tbl) == []
+    pg_conn = SimpleNamespace(dialect=postgresql.dialect())
+    assert [fk.name for fk in deferrable_fks(pg_conn, books_tbl)] \
+        == ["fk_books_author_id"]
+    assert [fk.name for fk in deferrable_fks(pg_conn, moons_tbl)] == [None]
+
+class FakePGConnection:
+    """
+    Just enough of a `Connection` to a PostgreSQL database to record the DDL
+    executed on it; the foreign key constraints that exist in the database
+    are set with ``fks``
+    """
+
+    def __init__(self, fks):
+        self.dialect = postgresql.dialect()
+        self.fks = fks
+        self.log = []
+
+    def execute(self, stmt):
+        self.log.append(str(stmt.compile(dialect=self.dialect)).strip())
+
+@pytest.fixture
+def fake_inspect(monkeypatch):
+    monkeypatch.setattr(indexes, 'existing_fks',
+                        lambda conn, _table: dict(conn.fks))
+    monkeypatch.setattr(indexes, 'existing_index_names',
+                        lambda _conn, _table: set())
+
+def test_existing_fks():
+    engine = S.create_engine('sqlite://')
+    metadata.create_all(engine)
+    moons_tbl.metadata.create_all(engine)
+    with engine.connect() as conn:
+        assert existing_fks(conn, books_tbl) \
+            == {(('author_id',), 'authors'): 'fk_books_author_id'}
+        assert existing_fks(conn, moons_tbl) \
+            == {(('planet_id',), 'planets'): None}
+
+@pytest.mark.usefixtures('fake_inspect')
+def test_defer_unnamed_fks():
+    # `moons.planet_id` is a plain `ForeignKey` with no name in the metadata
+    conn = FakePGConnection({
+        (('planet_id',), 'planets'): 'moons_planet_id_fkey',
+    })
+    names = drop_indexes(conn, moons_tbl)
+    assert names == {(('planet_id',), 'planets'): 'moons_planet_id_fkey'}
+    assert conn.log \
+        == ['ALTER TABLE moons DROP CONSTRAINT moons_planet_id_fkey']
+    # Nothing is created while the constraint exists
+    create_fks(conn, moons_tbl, names)
+    assert len(conn.log) == 1
+    conn.fks = {}
+    create_fks(conn, moons_tbl, names)
+    create_fks(conn, moons_tbl)
+    assert conn.log[1:] == [
+        'ALTER TABLE moons ADD CONSTRAINT moons_planet_id_fkey'
+        ' FOREIGN KEY(planet_id) REFERENCES planets (id)',
+        'ALTER TABLE moons ADD FOREIGN KEY(planet_id) REFERENCES planets (id)',
+    ]
+    # The metadata is left alone
+    assert [fk.name for fk in moons_tbl.foreign_key_constraints] == [None]
+
+@pytest.mark.usefixtures('fake_inspect')
+def test_defer_renamed_fks():
+    # A constraint named in the metadata is dropped & recreated under the name
+    # it has in the database
+    conn = FakePGConnection({(('author_id',), 'authors'): 'books_author_fk'})
+    names = drop_indexes(conn, books_tbl)
+    conn.fks = {}
+    create_fks(conn, books_tbl, names)
+    create_fks(conn, books_tbl)
+    assert conn.log == [
+        'ALTER TABLE books DROP CONSTRAINT books_author_fk',
+        'ALTER TABLE books ADD CONSTRAINT books_author_fk'
+        ' FOREIGN KEY(author_id) REFERENCES authors (id)',
+        'ALTER TABLE books ADD CONSTRAINT fk_books_author_id'
+        ' FOREIGN KEY(author_id) REFERENCES authors (id)',
+    ]
@@ -1,10 +1,12 @@
+import csv
 from   datetime import date
+from   io       import StringIO
 from   operator import attrgetter
 from   pathlib  import Path
 from   shutil   import copyfile
 import pytest
 import sqlalchemy as S
-from   dbcsv    import dumpdb, loaddb
+from   dbcsv    import dumpdb, load_table, loaddb
 
 DATA_DIR = Path(__file__).with_name('data')
 
@@ -390,11 +392,18 @@ def tmp_dirpath(request, tmp_path):
     # called on directly, hence the intermediate conversion to `str`
     return request.param(str(tmp_path))
 
-def test_loaddb(planet_dirpath):
+@pytest.mark.parametrize('batch_size,processes', [
+    (1, None),
+    (4, None),
+    (1000, None),
+    (4, 2),
+])
+def test_loaddb(planet_dirpath, batch_size, processes):
     engine = S.create_engine('sqlite:///:memory:')
     metadata.create_all(engine)
     with engine.begin() as connection:
-        loaddb(connection, metadata, planet_dirpath)
+        loaddb(connection, metadata, planet_dirpath, batch_size=batch_size,
+               processes=processes)
         planet_query = connection.execute(
             S.select([planets_tbl]).order_by(S.asc(planets_tbl.c.id))
         )
@@ -424,12 +433,62 @@ def test_loaddb_partial(tmp_dirpath):
         assert list(moon_query) == []
     metadata.drop_all(engine)
 
-def test_dumpdb(tmp_dirpath):
+def test_load_table_bad_batch_size():
+    engine = S.create_engine('sqlite:///:memory:')
+    metadata.create_all(engine)
+    with engine.begin() as connection:
+        with (DATA_DIR / 'planets' / 'planets.csv').open() as fp:
+            with pytest.raises(ValueError):
+                load_table(connection, planets_tbl, fp, batch_size=0)
+    metadata.drop_all(engine)
+
+@pytest.mark.parametrize('processes', [None, 2])
+def test_load_table_reordered_columns(processes):
+    engine = S.create_engine('sqlite:///:memory:')
+    metadata.create_all(engine)
+    with (DATA_DIR / 'planets' / 'planets.csv').open() as fp:
+        header, *rows = list(csv.reader(fp))
+    reordered = StringIO()
+    csv.writer(reordered).writerows(row[::-1] for row in [header, *rows])
+    reordered.seek(0)
+    with engine.begin() as connection:
+        load_table(connection, planets_tbl, reordered, batch_size=3,
+                   processes=processes)
+        planet_query = connection.execute(
+            S.select([planets_tbl]).order_by(S.asc(planets_tbl.c.id))
+        )
+        assert list(map(dict, planet_query)) == PLANETS
+    metadata.drop_all(engine)
+
+def test_load_table_python_default():
+    # Columns with Python-side defaults can't use the positional fast path
+    md = S.MetaData()
+    tbl = S.Table('things', md,
+        S.Column('id', S.Integer, primary_key=True, nullable=False),
+        S.Column('name', S.Unicode(64), nullable=False),
+        S.Column('weight', S.Integer, nullable=False, default=42),
+    )
+    engine = S.create_engine('sqlite:///:memory:')
+    md.create_all(engine)
+    with engine.begin() as connection:
+        load_table(connection, tbl, StringIO('name,id\r\nfoo,1\r\nbar,2\r\n'))
+        assert list(map(tuple, connection.execute(
+            S.select([tbl]).order_by(tbl.c.id)
+        ))) == [(1, 'foo', 42), (2, 'bar', 42)]
+
+@pytest.mark.parametrize('stream,chunk_size,processes', [
+    (False, 1000, None),
+    (True, 1, None),
+    (True, 4, None),
+    (False, 4, 2),
+])
+def test_dumpdb(tmp_dirpath, stream, chunk_size, processes):
     engine = S.create_engine('sqlite:///:memory:')
     metadata.create_all(engine)
     with engine.begin() as connection:
         connection.execute(planets_tbl.insert(), PLANETS)
         connection.execute(moons_tbl.insert(), MOONS)
-        dumpdb(connection, metadata, tmp_dirpath)
+        dumpdb(connection, metadata, tmp_dirpath, stream=stream,
+               chunk_size=chunk_size, processes=processes)
         assert_dirtrees_eq(Path(tmp_dirpath), DATA_DIR / 'planets')
     metadata.drop_all(engine)
@@ -0,0 +1,277 @@
+import hashlib
+import json
+import logging
+import pytest
+import sqlalchemy as S
+from   sqlalchemy.dialects.postgresql import psycopg2
+from   sqlalchemy.engine.url          import make_url
+from   test_load_dump_core            import MOONS, PLANETS, metadata, \
+                                             moons_tbl, planets_tbl
+from   dbcsv                          import LoggingObserver, StatsObserver, \
+                                             dumpdb, loaddb
+from   dbcsv                          import manifest as manifest_mod
+from   dbcsv.manifest                 import LOADED_FILE, MANIFEST_FILE, \
+                                             load_target, table_schema
+
+def count(conn, table):
+    return conn.execute(S.select([S.func.count()]).select_from(table)).scalar()
+
+@pytest.fixture
+def conn(tmp_path):
+    engine = S.create_engine('sqlite:///' + str(tmp_path / 'db.sqlite'))
+    metadata.create_all(engine)
+    with engine.connect() as conn:
+        conn.execute(planets_tbl.insert(), PLANETS)
+        conn.execute(moons_tbl.insert(), MOONS)
+        yield conn
+
+def empty(conn):
+    conn.execute(moons_tbl.delete())
+    conn.execute(planets_tbl.delete())
+
+def read_manifest(dirpath):
+    with (dirpath / MANIFEST_FILE).open() as fp:
+        return json.load(fp)["tables"]
+
+@pytest.mark.parametrize('format,compression', [
+    ('csv', None),
+    ('csv', 'gzip'),
+    ('parquet', None),
+])
+def test_dumpdb_manifest(tmp_path, conn, format, compression):
+    if format == 'parquet':
+        pytest.importorskip('pyarrow')
+    dumpdir = tmp_path / 'dump'
+    dumpdb(conn, metadata, dumpdir, format=format, compression=compression,
+           manifest=True)
+    manifest = read_manifest(dumpdir)
+    assert sorted(manifest) == ['moons', 'planets']
+    assert manifest["planets"]["columns"][:2] \
+        == [['id', 'Integer()'], ['name', 'Unicode(length=64)']]
+    for tbl, rows in [(planets_tbl, PLANETS), (moons_tbl, MOONS)]:
+        entry = manifest[tbl.name]
+        assert entry["columns"] == table_schema(tbl)
+        (name, info), = entry["files"].items()
+        data = (dumpdir / name).read_bytes()
+        assert info == {
+            "rows": len(rows),
+            "bytes": len(data),
+            "sha256": hashlib.sha256(data).hexdigest(),
+        }
+    empty(conn)
+    loaddb(conn, metadata, dumpdir)
+    assert count(conn, moons_tbl) == len(MOONS)
+
+@pytest.mark.parametrize('kwargs', [
+    {"direct_write": True, "buffer_size": 100},
+    {"buffer_size": 7},
+    {"compression": "gzip"},
+    {"format": "arrow"},
+])
+def test_dumpdb_manifest_streaming_checksum(monkeypatch, tmp_path, conn,
+                                            kwargs):
+    if kwargs.get("format") == 'arrow':
+        pytest.importorskip('pyarrow')
+
+    def no_reread(path):
+        raise AssertionError('{} was read back'.format(path))
+
+    monkeypatch.setattr(manifest_mod, 'file_checksum', no_reread)
+    dumpdb(conn, metadata, tmp_path, manifest=True, **kwargs)
+    for name, info in read_manifest(tmp_path)["moons"]["files"].items():
+        assert info["sha256"] \
+            == hashlib.sha256((tmp_path / name).read_bytes()).hexdigest()
+
+def test_dumpdb_no_manifest(tmp_path, conn):
+    dumpdb(conn, metadata, tmp_path / 'dump')
+    assert not (tmp_path / 'dump' / MANIFEST_FILE).exists()
+
+def test_loaddb_schema_drift(tmp_path, conn):
+    dumpdb(conn, metadata, tmp_path, manifest=True)
+    drifted = S.MetaData()
+    S.Table('planets', drifted,
+        S.Column('id', S.Integer, primary_key=True, nullable=False),
+        S.Column('name', S.UnicodeText, nullable=False))
+    with pytest.raises(ValueError, match='column name was dumped as'
+                                         r' Unicode\(length=64\)'):
+        loaddb(conn, drifted, tmp_path)
+    dropped = S.MetaData()
+    S.Table('planets', dropped,
+        S.Column('id', S.Integer, primary_key=True, nullable=False))
+    with pytest.raises(ValueError, match='dumped column name does not exist'):
+        loaddb(conn, dropped, tmp_path)
+
+def test_loaddb_missing_file(tmp_path, conn):
+    dumpdb(conn, metadata, tmp_path, manifest=True)
+    (tmp_path / 'moons.csv').unlink()
+    empty(conn)
+    with pytest.raises(ValueError, match='file moons.csv is missing'):
+        loaddb(conn, metadata, tmp_path)
+    # Nothing is loaded before the check fails
+    assert count(conn, planets_tbl) == 0
+
+def test_loaddb_manifest_files_only(tmp_path, conn):
+    # An uncompressed dump followed by a compressed one with a manifest, with
+    # the first dump's .csv files restored afterwards: the stray .csv files
+    # must not shadow the .csv.gz files in the manifest
+    dumpdb(conn, metadata, tmp_path / 'plain')
+    conn.execute(moons_tbl.delete().where(moons_tbl.c.id > 3))
+    dumpdb(conn, metadata, tmp_path, compression='gzip', manifest=True)
+    for name in ['moons.csv', 'planets.csv']:
+        (tmp_path / name).write_bytes((tmp_path / 'plain' / name).read_bytes())
+    empty(conn)
+    loaddb(conn, metadata, tmp_path)
+    assert count(conn, planets_tbl) == len(PLANETS)
+    assert count(conn, moons_tbl) == 3
+
+def test_loaddb_manifest_no_files(tmp_path, conn):
+    dumpdb(conn, metadata, tmp_path, manifest=True)
+    entries = read_manifest(tmp_path)
+    entries["moons"]["files"] = {}
+    with (tmp_path / MANIFEST_FILE).open('w') as fp:
+        json.dump({"tables": entries}, fp)
+    empty(conn)
+    with pytest.raises(ValueError, match='manifest lists no files'):
+        loaddb(conn, metadata, tmp_path)
+    assert count(conn, planets_tbl) == 0
+
+def test_loaddb_verify(tmp_path, conn):
+    dumpdb(conn, metadata, tmp_path, manifest=True)
+    path = tmp_path / 'moons.csv'
+    # Same size, different contents
+    path.write_bytes(path.read_bytes().replace(b'Phobos', b'Phebos'))
+    empty(conn)
+    with pytest.raises(ValueError, match='does not match its checksum'):
+        loaddb(conn, metadata, tmp_path, verify=True)
+    path.write_bytes(path.read_bytes() + b'\r\n')
+    with pytest.raises(ValueError, match='is {} bytes'
+                                         .format(path.stat().st_size)):
+        loaddb(conn, metadata, tmp_path)
+
+def test_loaddb_skip_unchanged(tmp_path, conn):
+    dumpdir = tmp_path / 'dump'
+    dumpdb(conn, metadata, dumpdir, manifest=True)
+    empty(conn)
+    loaddb(conn, metadata, dumpdir, skip_unchanged=True)
+    with (dumpdir / LOADED_FILE).open() as fp:
+        loaded, = json.load(fp)["targets"].values()
+    assert sorted(loaded) == ['moons', 'planets']
+    # Loading again would violate the primary keys if not skipped
+    observer = StatsObserver()
+    loaddb(conn, metadata, dumpdir, skip_unchanged=True, observer=observer)
+    assert observer.tables == []
+    conn.execute(moons_tbl.delete())
+    conn.execute(moons_tbl.insert(), MOONS[:2])
+    # Re-dumping the unchanged planets gives the same checksum
+    dumpdb(conn, metadata, dumpdir, manifest=True)
+    conn.execute(moons_tbl.delete())
+    loaddb(conn, metadata, dumpdir, skip_unchanged=True, observer=observer)
+    assert [(s.table, s.rows) for s in observer.tables] == [('moons', 2)]
+    assert count(conn, moons_tbl) == 2
+
+def test_loaddb_skip_unchanged_merges_changed(tmp_path, conn):
+    dumpdir = tmp_path / 'dump'
+    dumpdb(conn, metadata, dumpdir, manifest=True)
+    empty(conn)
+    loaddb(conn, metadata, dumpdir, skip_unchanged=True)
+    conn.execute(planets_tbl.update().where(planets_tbl.c.id == 1)
+                                     .values(name='Hermes'))
+    dumpdb(conn, metadata, dumpdir, manifest=True)
+    conn.execute(planets_tbl.update().where(planets_tbl.c.id == 1)
+                                     .values(name='Mercury'))
+    # Would violate the primary key if the changed table were not merged
+    observer = StatsObserver()
+    loaddb(conn, metadata, dumpdir, skip_unchanged=True, observer=observer)
+    assert [s.table for s in observer.tables] == ['planets']
+    assert conn.execute(
+        S.select([planets_tbl.c.name]).where(planets_tbl.c.id == 1)
+    ).scalar() == 'Hermes'
+    assert count(conn, planets_tbl) == len(PLANETS)
+
+def test_loaddb_skip_unchanged_new_deltas(tmp_path, conn):
+    dumpdir = tmp_path / 'dump'
+    watermarks = {"moons": "id"}
+    dumpdb(conn, metadata, dumpdir, watermarks=watermarks, manifest=True)
+    empty(conn)
+    loaddb(conn, metadata, dumpdir, skip_unchanged=True)
+    conn.execute(moons_tbl.insert(), dict(MOONS[-1], id=1000, name='Extra'))
+    dumpdb(conn, metadata, dumpdir, watermarks=watermarks, manifest=True)
+    observer = StatsObserver()
+    loaddb(conn, metadata, dumpdir, skip_unchanged=True, observer=observer)
+    # Only the new delta is loaded
+    assert [(s.table, s.rows) for s in observer.tables] == [('moons', 1)]
+    assert count(conn, moons_tbl) == len(MOONS) + 1
+
+def test_loaddb_skip_unchanged_other_database(tmp_path, conn):
+    dumpdir = tmp_path / 'dump'
+    dumpdb(conn, metadata, dumpdir, manifest=True)
+    empty(conn)
+    loaddb(conn, metadata, dumpdir, skip_unchanged=True)
+    engine2 = S.create_engine('sqlite:///' + str(tmp_path / 'db2.sqlite'))
+    metadata.create_all(engine2)
+    with engine2.connect() as conn2:
+        loaddb(conn2, metadata, dumpdir, skip_unchanged=True)
+        assert count(conn2, planets_tbl) == len(PLANETS)
+        assert count(conn2, moons_tbl) == len(MOONS)
+        # Each database is now skipped
+        observer = StatsObserver()
+        loaddb(conn2, metadata, dumpdir, skip_unchanged=True,
+               observer=observer)
+        assert observer.tables == []
+    loaddb(conn, metadata, dumpdir, skip_unchanged=True, observer=observer)
+    assert observer.tables == []
+    with (dumpdir / LOADED_FILE).open() as fp:
+        assert sorted(json.load(fp)["targets"]) == [
+            'sqlite:///' + str(tmp_path / 'db.sqlite'),
+            'sqlite:///' + str(tmp_path / 'db2.sqlite'),
+        ]
+
+class FakePGConnection:
+    """ Just enough of a `Connection` to a PostgreSQL database for
+    `load_target()` """
+
+    def __init__(self, url):
+        self.engine = self
+        self.url = make_url(url)
+        self.dialect = psycopg2.dialect()
+        self.dialect.default_schema_name = 'public'
+
+def test_load_target():
+    assert load_target(FakePGConnection('postgresql://user:hunter2@db/app')) \
+        == 'postgresql://user:***@db/app (schema public)'
+    engine = S.create_engine('sqlite:///foo.db')
+    assert load_target(engine) == 'sqlite:///foo.db'
+
+def test_loaddb_total_rows(tmp_path, conn, caplog):
+    caplog.set_level(logging.INFO, logger='dbcsv')
+    dumpdb(conn, metadata, tmp_path, manifest=True)
+    empty(conn)
+    stats_observer = StatsObserver()
+    loaddb(conn, metadata, tmp_path, observer=stats_observer)
+    assert [(s.table, s.total_rows) for s in stats_observer.tables] \
+        == [('planets', len(PLANETS)), ('moons', len(MOONS))]
+    empty(conn)
+    loaddb(conn, metadata, tmp_path, batch_size=len(MOONS) // 2,
+           observer=LoggingObserver(interval=0))
+    assert any(
+        r.getMessage().startswith('moons: load {0} of {0} rows so far (100%'
+                                  .format(len(MOONS)))
+        for r in caplog.records
+    )
+
+def test_incremental_manifest(tmp_path, conn):
+    dumpdir = tmp_path / 'dump'
+    watermarks = {"moons": "id"}
+    # The first dump has no manifest, so the full dump's row count is unknown
+    dumpdb(conn, metadata, dumpdir, watermarks=watermarks)
+    extra = dict(MOONS[-1], id=1000, name='Extra')
+    conn.execute(moons_tbl.insert(), extra)
+    dumpdb(conn, metadata, dumpdir, watermarks=watermarks, manifest=True)
+    files = read_manifest(dumpdir)["moons"]["files"]
+    assert {name: info["rows"] for name, info in files.items()} \
+        == {"moons.csv": None, "moons.delta-0001.csv": 1}
+    # Stray files not listed in the manifest are not loaded
+    (dumpdir / 'moons.delta-0002.csv').write_text('id\r\n1\r\n')
+    empty(conn)
+    loaddb(conn, metadata, dumpdir)
+    assert count(conn, moons_tbl) == len(MOONS) + 1
@@ -1,9 +1,14 @@
+from   ast               import literal_eval
 from   datetime          import date, datetime, time, timedelta, timezone
 from   decimal           import Decimal
 from   enum              import Enum
 import pytest
 import sqlalchemy as S
-from   dbcsv.marshalling import marshal_object, unmarshal_object
+from   dbcsv.marshalling import get_codec_plan, marshal_object, marshal_str, \
+                                pytype_marshallers, pytype_unmarshallers, \
+                                register_python_type, set_array_format, \
+                                unmarshal_object, unmarshal_str
+from   dbcsv.multiproc   import marshal_rows, pool_map
 
 class RGBEnum(Enum):
     RED   = 1
@@ -228,3 +233,129 @@ def test_marshal_object(dbtyped, strtyped):
 ])
 def test_one_way_unmarshal_object(dbtyped, strtyped):
     assert unmarshal_object(table, strtyped) == dbtyped
+
+def test_codec_plan_row():
+    plan = get_codec_plan(table)
+    assert plan is get_codec_plan(table)
+    assert plan.columns == table.columns.keys()
+    dbtyped = [None] * len(plan.columns)
+    dbtyped[:3] = [42, r'\N', 'thing']
+    strtyped = [r'\N'] * len(plan.columns)
+    strtyped[:3] = ['42', r'\\N', 'thing']
+    assert plan.marshal_row(dbtyped) == strtyped
+    assert plan.unmarshal_row(strtyped) == dbtyped
+
+def test_codec_plan_invalidated_on_register():
+    plan = get_codec_plan(table)
+    old_marshaller = pytype_marshallers[int]
+    old_unmarshaller = pytype_unmarshallers[int]
+    register_python_type(int, hex, lambda s: int(s, 16))
+    try:
+        assert get_codec_plan(table) is not plan
+        assert marshal_object(table, {"id": 42}) == {"id": "0x2a"}
+        assert unmarshal_object(table, {"id": "0x2a"}) == {"id": 42}
+    finally:
+        register_python_type(int, old_marshaller, old_unmarshaller)
+    assert marshal_object(table, {"id": 42}) == {"id": "42"}
+
+def test_pool_map_marshal_rows():
+    plan = get_codec_plan(table)
+    rows = []
+    for i in range(10):
+        row = [None] * len(plan.columns)
+        row[plan.columns.index("id")] = i
+        row[plan.columns.index("enumenum")] = RGBEnum.RED
+        row[plan.columns.index("json_sqlnull")] = {"foo": [i]}
+        row[plan.columns.index("pickle")] = [1, "foo", True, None]
+        rows.append(tuple(row))
+    batches = [rows[:3], rows[3:6], rows[6:9], rows[9:]]
+    assert list(pool_map(table, marshal_rows, batches, 2)) \
+        == [[tuple(plan.marshal_row(r)) for r in batch] for batch in batches]
+
+def test_codec_plan_unmarshal_columns():
+    plan = get_codec_plan(table)
+    columns = ["realval", "id", "date", "name", "enumenum"]
+    rows = [
+        ["1.5", str(i), "2020-01-0" + str(i), r"\\N", "RED"]
+        for i in range(1, 4)
+    ]
+    rows.append([r"\N", "4", r"\N", r"\N", r"\N"])
+    assert plan.unmarshal_columns(columns, rows) == [
+        tuple(plan.unmarshal_mapping(dict(zip(columns, r))).values())
+        for r in rows
+    ]
+    assert plan.unmarshal_columns(columns, rows[:1]) == [
+        (1.5, 1, date(2020, 1, 1), r"\N", RGBEnum.RED),
+    ]
+    assert plan.unmarshal_columns(columns, []) == []
+
+def test_codec_plan_unmarshal_columns_ragged():
+    plan = get_codec_plan(table)
+    with pytest.raises(ValueError) as excinfo:
+        plan.unmarshal_columns(["id", "name"], [["1", "foo"], ["2"]])
+    assert str(excinfo.value) \
+        == 'Expected rows of 2 fields; got rows of 1 fields'
+
+@pytest.mark.parametrize('s,marshalled', [
+    ('', ''),
+    ('N', 'N'),
+    ('\\', '\\'),
+    ('\\N', '\\\\N'),
+    ('\\\\N', '\\\\\\\\N'),
+    ('\\\\\\N', '\\\\\\\\\\\\N'),
+    ('x\\N', 'x\\N'),
+    ('\\x\\N', '\\x\\N'),
+    ('\\Nx', '\\Nx'),
+    ('\\NN', '\\NN'),
+    ('\\n', '\\n'),
+])
+def test_marshal_unmarshal_str(s, marshalled):
+    assert marshal_str(s) == marshalled
+    assert unmarshal_str(marshalled) == s
+
+@pytest.fixture
+def json_arrays():
+    set_array_format("json")
+    try:
+        yield
+    finally:
+        set_array_format("repr")
+
+@pytest.mark.parametrize('dbtyped,strtyped', [
+    ({"intlist": []}, {"intlist": "[]"}),
+    ({"intlist": [42]}, {"intlist": '["42"]'}),
+    ({"intlist": [42, None]}, {"intlist": r'["42","\\N"]'}),
+    (
+        {"intlist": [[42, 23], [17, 69105]]},
+        {"intlist": '[["42","23"],["17","69105"]]'},
+    ),
+])
+@pytest.mark.usefixtures('json_arrays')
+def test_marshal_array_json(dbtyped, strtyped):
+    assert marshal_object(table, dbtyped) == strtyped
+    assert unmarshal_object(table, strtyped) == dbtyped
+
+@pytest.mark.usefixtures('json_arrays')
+def test_marshal_array_json_tuple():
+    assert marshal_object(table, {"intlist": (42, (23,))}) \
+        == {"intlist": '["42",["23"]]'}
+
+@pytest.mark.parametrize('value', [
+    ['plain', 'it\'s', 'say "hi"', '\\N', 'tab\there', 'café ☃ \U0001F600'],
+    ['\x00\x1f', '\u2028', '\\'],
+])
+def test_array_formats_agree(value):
+    coltype = S.ARRAY(S.Unicode)
+    tbl = S.Table('strlists', S.MetaData(),
+        S.Column('legacy', coltype),
+        S.Column('new', coltype, info={"dbcsv_array_format": "json"}),
+    )
+    marshalled = marshal_object(tbl, {"legacy": value, "new": value})
+    assert marshalled["legacy"] != marshalled["new"]
+    # The JSON encoding is also readable by older versions' `repr` parser:
+    assert literal_eval(marshalled["new"]) == literal_eval(marshalled["legacy"])
+    assert unmarshal_object(tbl, marshalled) == {"legacy": value, "new": value}
+
+def test_set_array_format_invalid():
+    with pytest.raises(ValueError):
+        set_array_format("yaml")
@@ -0,0 +1,141 @@
+from   io                  import StringIO
+import pytest
+import sqlalchemy as S
+from   sqlalchemy.dialects import mysql, postgresql
+from   dbcsv               import load_table, loaddb
+from   dbcsv.merge         import mysql_upsert, postgresql_upsert, \
+                                  sqlite_merge, staging_merge, \
+                                  staging_statements
+
+metadata = S.MetaData()
+
+items_tbl = S.Table('items', metadata,
+    S.Column('id', S.Integer, primary_key=True, nullable=False),
+    S.Column('name', S.Unicode(255), nullable=False),
+    S.Column('price', S.Integer, nullable=True),
+)
+
+tags_tbl = S.Table('tags', metadata,
+    S.Column('item_id', S.Integer, primary_key=True, nullable=False),
+    S.Column('tag', S.Unicode(255), primary_key=True, nullable=False),
+)
+
+nopk_tbl = S.Table('nopk', metadata,
+    S.Column('name', S.Unicode(255), nullable=False),
+)
+
+ITEMS_CSV = (
+    'id,name,price\r\n'
+    '2,Bar,\\N\r\n'
+    '3,baz,3\r\n'
+    '4,quux,4\r\n'
+)
+
+ITEMS_MERGED = [
+    (1, 'foo', 1),
+    (2, 'Bar', None),
+    (3, 'baz', 3),
+    (4, 'quux', 4),
+]
+
+@pytest.fixture
+def engine():
+    engine = S.create_engine('sqlite://')
+    metadata.create_all(engine)
+    with engine.connect() as conn:
+        conn.execute(items_tbl.insert(), [
+            {"id": 1, "name": "foo", "price": 1},
+            {"id": 2, "name": "bar", "price": 2},
+        ])
+        conn.execute(tags_tbl.insert(), [{"item_id": 1, "tag": "a"}])
+    return engine
+
+def query_all(engine, table):
+    with engine.connect() as conn:
+        return [
+            tuple(r) for r in
+            conn.execute(S.select([table]).order_by(*table.primary_key))
+        ]
+
+@pytest.mark.parametrize('batch_size', [1, 2, 1000])
+def test_load_table_merge(engine, batch_size):
+    with engine.connect() as conn:
+        load_table(conn, items_tbl, StringIO(ITEMS_CSV), merge=True,
+                   batch_size=batch_size)
+    assert query_all(engine, items_tbl) == ITEMS_MERGED
+
+@pytest.mark.parametrize('merger', [sqlite_merge, staging_merge])
+def test_merger(engine, merger):
+    columns = ['name', 'id']
+    batches = [[['Bar', 2], ['baz', 3]], [['FOO', 1]]]
+    with engine.connect() as conn:
+        assert merger(conn, items_tbl, columns, iter(batches))
+    assert query_all(engine, items_tbl) == [
+        (1, 'FOO', 1),
+        (2, 'Bar', 2),
+        (3, 'baz', None),
+    ]
+
+@pytest.mark.parametrize('merger', [sqlite_merge, staging_merge])
+def test_merger_pk_only(engine, merger):
+    columns = ['item_id', 'tag']
+    with engine.connect() as conn:
+        assert merger(conn, tags_tbl, columns, iter([[[1, 'a'], [1, 'b']]]))
+    assert query_all(engine, tags_tbl) == [(1, 'a'), (1, 'b')]
+
+def test_loaddb_merge(engine, tmp_path):
+    (tmp_path / 'items.csv').write_text(ITEMS_CSV)
+    (tmp_path / 'tags.csv').write_text('item_id,tag\r\n1,a\r\n2,b\r\n')
+    with engine.connect() as conn:
+        loaddb(conn, metadata, tmp_path, merge=True)
+    assert query_all(engine, items_tbl) == ITEMS_MERGED
+    assert query_all(engine, tags_tbl) == [(1, 'a'), (2, 'b')]
+
+def test_merge_no_pk(engine):
+    with engine.connect() as conn:
+        with pytest.raises(ValueError):
+            load_table(conn, nopk_tbl, StringIO('name\r\nfoo\r\n'),
+                       merge=True)
+
+def test_merge_missing_pk_column(engine):
+    with engine.connect() as conn:
+        with pytest.raises(ValueError):
+            load_table(conn, items_tbl, StringIO('name\r\nfoo\r\n'),
+                       merge=True)
+
+def test_postgresql_upsert():
+    stmt = postgresql_upsert(items_tbl, ['id', 'name'])
+    sql = str(stmt.compile(dialect=postgresql.dialect()))
+    assert 'ON CONFLICT (id) DO UPDATE SET name = excluded.name' in sql
+    stmt = postgresql_upsert(tags_tbl, ['item_id', 'tag'])
+    sql = str(stmt.compile(dialect=postgresql.dialect()))
+    assert 'ON CONFLICT (item_id, tag) DO NOTHING' in sql
+
+def test_mysql_upsert():
+    stmt = mysql_upsert(items_tbl, ['id', 'name'])
+    sql = str(stmt.compile(dialect=mysql.dialect()))
+    assert sql.endswith('ON DUPLICATE KEY UPDATE name = VALUES(name)')
+    stmt = mysql_upsert(tags_tbl, ['item_id', 'tag'])
+    sql = str(stmt.compile(dialect=mysql.dialect()))
+    assert sql.endswith('ON DUPLICATE KEY UPDATE item_id = tags.item_id')
+
+@pytest.mark.parametrize('dialect,expected', [
+    (
+        mysql.dialect(),
+        'UPDATE items, dbcsv_stage_items SET items.name=dbcsv_stage_items.name,'
+        ' items.price=dbcsv_stage_items.price WHERE dbcsv_stage_items.id ='
+        ' items.id',
+    ),
+    (
+        postgresql.dialect(),
+        'UPDATE items SET name=dbcsv_stage_items.name,'
+        ' price=dbcsv_stage_items.price FROM dbcsv_stage_items WHERE'
+        ' dbcsv_stage_items.id = items.id',
+    ),
+])
+def test_staging_update_from(dialect, expected):
+    _, update, _ = staging_statements(items_tbl, ['id', 'name', 'price'],
+                                      update_from=True)
+    sql = ' '.join(str(update.compile(dialect=dialect)).split())
+    # The staging table is only referenced once, as MySQL requires
+    assert sql == expected
@@ -0,0 +1,78 @@
+from   io                  import StringIO
+import logging
+import pytest
+import sqlalchemy as S
+from   test_load_dump_core import MOONS, PLANETS, metadata, moons_tbl, \
+                                  planets_tbl
+from   dbcsv               import LoggingObserver, StatsObserver, dump_table, \
+                                  dumpdb, load_table, loaddb
+
+@pytest.fixture
+def conn():
+    engine = S.create_engine('sqlite://')
+    metadata.create_all(engine)
+    with engine.connect() as conn:
+        conn.execute(planets_tbl.insert(), PLANETS)
+        conn.execute(moons_tbl.insert(), MOONS)
+        yield conn
+
+@pytest.mark.parametrize('processes', [None, 2])
+def test_dump_load_table_stats(conn, processes):
+    observer = StatsObserver(time_columns=True)
+    out = StringIO()
+    dump_table(conn, moons_tbl, out, chunk_size=5, processes=processes,
+               observer=observer)
+    conn.execute(moons_tbl.delete())
+    out.seek(0)
+    load_table(conn, moons_tbl, out, batch_size=5, processes=processes,
+               observer=observer)
+    dumped, loaded = observer.tables
+    for stats in (dumped, loaded):
+        assert stats.table == 'moons'
+        assert stats.rows == len(MOONS)
+        assert stats.nbytes == len(out.getvalue())
+        assert stats.end is not None
+        assert stats.elapsed >= stats.db_time + stats.io_time
+        if processes is None:
+            assert sorted(stats.column_times) \
+                == sorted(c.name for c in moons_tbl.columns)
+        else:
+            assert stats.column_times == {}
+    assert dumped.operation == 'dump'
+    assert loaded.operation == 'load'
+    assert conn.execute(S.select([S.func.count()])
+                         .select_from(moons_tbl)).scalar() == len(MOONS)
+
+def test_stats_without_column_times(conn):
+    observer = StatsObserver()
+    dump_table(conn, planets_tbl, StringIO(), observer=observer)
+    stats, = observer.tables
+    assert stats.rows == len(PLANETS)
+    assert stats.column_times == {}
+
+@pytest.mark.parametrize('checkpoint', [None, 4])
+def test_dumpdb_loaddb_logging(tmp_path, caplog, checkpoint):
+    caplog.set_level(logging.INFO, logger='dbcsv')
+    engine = S.create_engine('sqlite:///' + str(tmp_path / 'db.sqlite'))
+    metadata.create_all(engine)
+    with engine.connect() as conn:
+        conn.execute(planets_tbl.insert(), PLANETS)
+        conn.execute(moons_tbl.insert(), MOONS)
+        dumpdb(conn, metadata, tmp_path / 'dump',
+               observer=LoggingObserver(interval=0, time_columns=True))
+        conn.execute(moons_tbl.delete())
+        conn.execute(planets_tbl.delete())
+        observer = StatsObserver()
+        loaddb(conn, metadata, tmp_path / 'dump', checkpoint=checkpoint,
+               observer=observer)
+    messages = [r.getMessage() for r in caplog.records]
+    assert messages[0] == 'planets: dump started'
+    assert any(
+        m.startswith('moons: dump finished: {} rows'.format(len(MOONS)))
+        for m in messages
+    )
+    assert any(m.startswith('moons: dump column times: ') for m in messages)
+    assert any(m.startswith('moons: dump {} rows so far'.format(len(MOONS)))
+               for m in messages)
+    assert [(s.table, s.rows) for s in observer.tables] \
+        == [('planets', len(PLANETS)), ('moons', len(MOONS))]
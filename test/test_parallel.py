@@ -0,0 +1,211 @@
+from   pathlib             import Path
+from   shutil              import copyfile
+import pytest
+import sqlalchemy as S
+from   test_load_dump_core import DATA_DIR, MOONS, PLANETS, \
+                                  assert_dirtrees_eq, metadata, moons_tbl, \
+                                  planets_tbl
+from   dbcsv               import loaddb, parallel_dumpdb, parallel_loaddb
+from   dbcsv.parallel      import partition_ranges, partitioned_dump_table, \
+                                  table_dependencies
+
+def test_table_dependencies():
+    assert table_dependencies(metadata) == {
+        planets_tbl: set(),
+        moons_tbl: {planets_tbl},
+    }
+
+def test_parallel_loaddb(tmp_path):
+    engine = S.create_engine('sqlite:///' + str(tmp_path / 'db.sqlite'))
+    metadata.create_all(engine)
+    timings = parallel_loaddb(engine, metadata, DATA_DIR / 'planets',
+                              workers=2, batch_size=5)
+    assert sorted(timings) == ['moons', 'planets']
+    assert all(t >= 0 for t in timings.values())
+    with engine.connect() as connection:
+        planet_query = connection.execute(
+            S.select([planets_tbl]).order_by(S.asc(planets_tbl.c.id))
+        )
+        assert list(map(dict, planet_query)) == PLANETS
+        moon_query = connection.execute(
+            S.select([moons_tbl]).order_by(S.asc(moons_tbl.c.id))
+        )
+        assert list(map(dict, moon_query)) == MOONS
+
+def test_parallel_loaddb_partial(tmp_path):
+    dumpdir = tmp_path / 'dump'
+    dumpdir.mkdir()
+    copyfile(
+        str(DATA_DIR / 'planets' / 'planets.csv'),
+        str(dumpdir / 'planets.csv'),
+    )
+    engine = S.create_engine('sqlite:///' + str(tmp_path / 'db.sqlite'))
+    metadata.create_all(engine)
+    timings = parallel_loaddb(engine, metadata, dumpdir, workers=2)
+    assert sorted(timings) == ['planets']
+    with engine.connect() as connection:
+        assert connection.execute(
+            S.select([S.func.count()]).select_from(planets_tbl)
+        ).scalar() == len(PLANETS)
+
+def test_parallel_dumpdb(tmp_path):
+    engine = S.create_engine('sqlite:///' + str(tmp_path / 'db.sqlite'))
+    metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(planets_tbl.insert(), PLANETS)
+        connection.execute(moons_tbl.insert(), MOONS)
+    dumpdir = tmp_path / 'dump'
+    timings = parallel_dumpdb(engine, metadata, str(dumpdir), workers=2)
+    assert sorted(timings) == ['moons', 'planets']
+    assert_dirtrees_eq(Path(dumpdir), DATA_DIR / 'planets')
+
+@pytest.mark.parametrize('partitions,expected', [
+    (1, [(1, 29)]),
+    (3, [(1, 10), (11, 20), (21, 29)]),
+    (4, [(1, 8), (9, 16), (17, 24), (25, 29)]),
+    (40, [(i, i) for i in range(1, 30)]),
+])
+def test_partition_ranges(partitions, expected):
+    engine = S.create_engine('sqlite:///:memory:')
+    metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(planets_tbl.insert(), PLANETS)
+        connection.execute(moons_tbl.insert(), MOONS)
+        clauses = partition_ranges(connection, moons_tbl, partitions)
+        ranges = []
+        for clause in clauses:
+            ids = [
+                r[0] for r in connection.execute(
+                    S.select([moons_tbl.c.id], clause)
+                     .order_by(moons_tbl.c.id)
+                )
+            ]
+            ranges.append((ids[0], ids[-1]))
+        assert ranges == expected
+
+def test_partition_ranges_non_int_column():
+    engine = S.create_engine('sqlite:///:memory:')
+    metadata.create_all(engine)
+    with engine.begin() as connection:
+        with pytest.raises(ValueError):
+            partition_ranges(connection, moons_tbl, 2, 'name')
+
+def test_partitioned_dump_table_sharded(tmp_path):
+    engine = S.create_engine('sqlite:///' + str(tmp_path / 'db.sqlite'))
+    metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(planets_tbl.insert(), PLANETS)
+        connection.execute(moons_tbl.insert(), MOONS)
+    dumpdir = tmp_path / 'dump'
+    partitioned_dump_table(engine, moons_tbl, dumpdir, 3)
+    assert sorted(p.name for p in dumpdir.iterdir()) == [
+        'moons.part-0001.csv',
+        'moons.part-0002.csv',
+        'moons.part-0003.csv',
+    ]
+    copyfile(
+        str(DATA_DIR / 'planets' / 'planets.csv'),
+        str(dumpdir / 'planets.csv'),
+    )
+    engine2 = S.create_engine('sqlite:///:memory:')
+    metadata.create_all(engine2)
+    with engine2.begin() as connection:
+        loaddb(connection, metadata, dumpdir)
+        moon_query = connection.execute(
+            S.select([moons_tbl]).order_by(S.asc(moons_tbl.c.id))
+        )
+        assert list(map(dict, moon_query)) == MOONS
+
+def test_partitioned_dump_table_concatenated(tmp_path):
+    engine = S.create_engine('sqlite:///' + str(tmp_path / 'db.sqlite'))
+    metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(planets_tbl.insert(), PLANETS)
+        connection.execute(moons_tbl.insert(), MOONS)
+    outpath = tmp_path / 'moons.csv'
+    with outpath.open('w') as fp:
+        partitioned_dump_table(engine, moons_tbl, fp, 4, sharded=False)
+    assert outpath.read_text() \
+        == (DATA_DIR / 'planets' / 'moons.csv').read_text()
+
+def test_partitioned_dump_table_concatenated_order(tmp_path):
+    md = S.MetaData()
+    events_tbl = S.Table('events', md,
+        S.Column('id', S.Integer, primary_key=True, nullable=False),
+        S.Column('seq', S.Integer, nullable=False))
+    engine = S.create_engine('sqlite:///' + str(tmp_path / 'db.sqlite'))
+    md.create_all(engine)
+    with engine.begin() as connection:
+        # Inserted in the reverse of the partition column's order
+        connection.execute(events_tbl.insert(), [
+            {"id": i, "seq": 100 - i} for i in range(1, 21)
+        ])
+    outpath = tmp_path / 'events.csv'
+    with outpath.open('w') as fp:
+        partitioned_dump_table(engine, events_tbl, fp, 3, column='seq',
+                               sharded=False)
+    seqs = [int(line.split(',')[1]) for line in
+            outpath.read_text().splitlines()[1:]]
+    assert seqs == list(range(80, 100))
+
+def test_parallel_dumpdb_partitioned(tmp_path):
+    engine = S.create_engine('sqlite:///' + str(tmp_path / 'db.sqlite'))
+    metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(planets_tbl.insert(), PLANETS)
+        connection.execute(moons_tbl.insert(), MOONS)
+    dumpdir = tmp_path / 'dump'
+    timings = parallel_dumpdb(engine, metadata, dumpdir, workers=3,
+                              partitions={"moons": 2})
+    assert sorted(timings) == ['moons', 'planets']
+    assert sorted(p.name for p in dumpdir.iterdir()) == [
+        'moons.part-0001.csv',
+        'moons.part-0002.csv',
+        'planets.csv',
+    ]
+    engine2 = S.create_engine('sqlite:///' + str(tmp_path / 'db2.sqlite'))
+    metadata.create_all(engine2)
+    parallel_loaddb(engine2, metadata, dumpdir)
+    with engine2.connect() as connection:
+        moon_query = connection.execute(
+            S.select([moons_tbl]).order_by(S.asc(moons_tbl.c.id))
+        )
+        assert list(map(dict, moon_query)) == MOONS
+
+def test_parallel_dumpdb_fewer_partitions(tmp_path):
+    engine = S.create_engine('sqlite:///' + str(tmp_path / 'db.sqlite'))
+    metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(planets_tbl.insert(), PLANETS)
+        connection.execute(moons_tbl.insert(), MOONS)
+    dumpdir = tmp_path / 'dump'
+    parallel_dumpdb(engine, metadata, dumpdir, partitions={"moons": 4})
+    with engine.begin() as connection:
+        connection.execute(moons_tbl.delete().where(moons_tbl.c.id > 10))
+    parallel_dumpdb(engine, metadata, dumpdir, partitions={"moons": 2})
+    assert sorted(p.name for p in dumpdir.iterdir()) == [
+        'moons.part-0001.csv',
+        'moons.part-0002.csv',
+        'planets.csv',
+    ]
+    engine2 = S.create_engine('sqlite:///' + str(tmp_path / 'db2.sqlite'))
+    metadata.create_all(engine2)
+    parallel_loaddb(engine2, metadata, dumpdir)
+    with engine2.begin() as connection:
+        assert connection.execute(
+            S.select([S.func.count()]).select_from(moons_tbl)
+        ).scalar() == 10
+        connection.execute(moons_tbl.delete())
+        connection.execute(moons_tbl.insert(), MOONS)
+    # And back from shards to a single file, then to shards with a different
+    # table-at-a-time dumper
+    parallel_dumpdb(engine2, metadata, dumpdir)
+    assert sorted(p.name for p in dumpdir.iterdir()) \
+        == ['moons.csv', 'planets.csv']
+    partitioned_dump_table(engine, moons_tbl, dumpdir, 3)
+    assert sorted(p.name for p in dumpdir.iterdir()) == [
+        'moons.part-0001.csv',
+        'moons.part-0002.csv',
+        'moons.part-0003.csv',
+        'planets.csv',
+    ]
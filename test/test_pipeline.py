@@ -0,0 +1,117 @@
+from   io                  import StringIO
+import threading
+import pytest
+import sqlalchemy as S
+from   test_load_dump_core import MOONS, PLANETS, metadata, moons_tbl, \
+                                  planets_tbl
+from   dbcsv               import StatsObserver, dump_table, dumpdb, \
+                                  load_table, loaddb
+from   dbcsv.pipeline      import Consumer, background, background_map
+
+@pytest.fixture
+def conn():
+    engine = S.create_engine('sqlite://')
+    metadata.create_all(engine)
+    with engine.connect() as conn:
+        conn.execute(planets_tbl.insert(), PLANETS)
+        conn.execute(moons_tbl.insert(), MOONS)
+        yield conn
+
+def test_background_map():
+    assert list(background_map(lambda x: x * 2, range(10), 1)) \
+        == list(range(0, 20, 2))
+
+def test_background_map_error():
+    def gen():
+        yield 1
+        raise RuntimeError('boom')
+
+    before = threading.active_count()
+    with pytest.raises(RuntimeError):
+        list(background(gen()))
+    assert threading.active_count() == before
+
+def test_background_map_closed_early():
+    before = threading.active_count()
+    it = background_map(str, background(range(1000), 1), 1)
+    assert next(it) == '0'
+    it.close()
+    assert threading.active_count() == before
+
+def test_consumer():
+    got = []
+    consumer = Consumer(lambda items: got.extend(items), 1)
+    for i in range(10):
+        consumer.put(i)
+    consumer.close()
+    assert got == list(range(10))
+
+def test_consumer_error():
+    def fail(items):
+        next(items)
+        raise RuntimeError('boom')
+
+    consumer = Consumer(fail, 1)
+    with pytest.raises(RuntimeError, match='boom'):
+        for i in range(10):
+            consumer.put(i)
+        consumer.close()
+
+def test_dump_load_table_pipelined(conn):
+    expected = StringIO()
+    dump_table(conn, moons_tbl, expected)
+    observer = StatsObserver(time_columns=True)
+    out = StringIO()
+    dump_table(conn, moons_tbl, out, chunk_size=2, pipeline=True,
+               observer=observer)
+    assert out.getvalue() == expected.getvalue()
+    conn.execute(moons_tbl.delete())
+    out.seek(0)
+    load_table(conn, moons_tbl, out, batch_size=2, pipeline=True,
+               observer=observer)
+    assert list(map(dict, conn.execute(
+        S.select([moons_tbl]).order_by(moons_tbl.c.id)
+    ))) == MOONS
+    for stats in observer.tables:
+        assert stats.rows == len(MOONS)
+        assert len(stats.column_times) == len(moons_tbl.columns)
+
+def test_dumpdb_loaddb_pipelined(tmp_path, conn):
+    dumpdb(conn, metadata, tmp_path, chunk_size=3, pipeline=True)
+    conn.execute(moons_tbl.delete())
+    conn.execute(planets_tbl.delete())
+    loaddb(conn, metadata, tmp_path, batch_size=3, pipeline=True)
+    assert list(map(dict, conn.execute(
+        S.select([planets_tbl]).order_by(planets_tbl.c.id)
+    ))) == PLANETS
+
+class FailingWriter:
+    def write(self, s):
+        if s.startswith('2,'):
+            raise OSError('disk full')
+        return len(s)
+
+def test_dump_table_pipelined_write_error(conn):
+    before = threading.active_count()
+    with pytest.raises(OSError):
+        dump_table(conn, planets_tbl, FailingWriter(), chunk_size=1,
+                   pipeline=True)
+    assert threading.active_count() == before
+
+def test_load_table_pipelined_errors(conn):
+    before = threading.active_count()
+    conn.execute(planets_tbl.delete())
+    header = 'id,name,mass_kg,radius_m,semimajor_axis_m,discovery_date\r\n'
+    with pytest.raises(ValueError):
+        with conn.begin():
+            load_table(conn, planets_tbl, StringIO(
+                header + '1,Mercury,1,1,1,\\N\r\n2,Venus,heavy,1,1,\\N\r\n'
+            ), batch_size=1, pipeline=True)
+    with pytest.raises(S.exc.IntegrityError):
+        with conn.begin():
+            load_table(conn, planets_tbl, StringIO(
+                header + '1,Mercury,1,1,1,\\N\r\n1,Mercury,1,1,1,\\N\r\n'
+            ), batch_size=1, pipeline=True)
+    assert conn.execute(S.select([S.func.count()])
+                         .select_from(planets_tbl)).scalar() == 0
+    assert threading.active_count() == before
@@ -0,0 +1,100 @@
+import csv
+import pytest
+import sqlalchemy as S
+from   dbcsv             import StatsObserver, load_dump, load_table, loaddb
+from   dbcsv.load_dump   import load_csv_split
+from   dbcsv.splitting   import split_records
+
+TRICKY = [
+    ['1', 'plain'],
+    ['2', 'embedded\r\nnewline'],
+    ['3', 'quote " and, comma'],
+    ['4', '"\n"'],
+    ['5', '""'],
+    ['6', 'trailing newline\n'],
+    ['7', 'ünïcödé ☃'],
+]
+
+metadata = S.MetaData()
+
+notes_tbl = S.Table('notes', metadata,
+    S.Column('id', S.Integer, primary_key=True, nullable=False),
+    S.Column('text', S.UnicodeText, nullable=False),
+)
+
+def write_csv(path, rows):
+    with open(str(path), 'w', newline='', encoding='utf-8') as fp:
+        writer = csv.writer(fp)
+        writer.writerow(['id', 'text'])
+        writer.writerows(rows)
+
+@pytest.mark.parametrize('split_size', [1, 5, 17, 1 << 20])
+def test_split_records(tmp_path, split_size):
+    path = tmp_path / 'notes.csv'
+    write_csv(path, TRICKY * 3)
+    data = path.read_bytes()
+    header, ranges = split_records(path, split_size)
+    assert header == b'id,text\r\n'
+    assert ranges[0][0] == len(header)
+    assert ranges[-1][1] == len(data)
+    rows = []
+    for (start, end), (nstart, _) in zip(ranges, ranges[1:] + [(None, None)]):
+        if nstart is not None:
+            assert end == nstart
+        assert start < end
+        chunk = data[start:end].decode('utf-8')
+        rows.extend(csv.reader(chunk.splitlines(keepends=True)))
+    assert rows == TRICKY * 3
+
+def test_split_records_empty(tmp_path):
+    path = tmp_path / 'empty.csv'
+    path.write_bytes(b'')
+    assert split_records(path) == (None, [])
+    path.write_bytes(b'id,text\r\n')
+    assert split_records(path) == (b'id,text\r\n', [])
+
+def test_load_csv_split(tmp_path):
+    path = tmp_path / 'notes.csv'
+    rows = [[str(i), text] for i, (_, text) in enumerate(TRICKY * 50)]
+    write_csv(path, rows)
+    engine = S.create_engine('sqlite://')
+    metadata.create_all(engine)
+    observer = StatsObserver()
+    with engine.connect() as conn:
+        load_csv_split(conn, notes_tbl, path, batch_size=7, processes=2,
+                       observer=observer)
+        got = conn.execute(
+            S.select([notes_tbl]).order_by(notes_tbl.c.id)
+        ).fetchall()
+    # As with the serial path, newlines in fields are translated to `\n`
+    assert [[str(i), text] for i, text in got] \
+        == [[i, text.replace('\r\n', '\n')] for i, text in rows]
+    # Characters are counted the same way as when loading serially
+    engine = S.create_engine('sqlite://')
+    metadata.create_all(engine)
+    with engine.connect() as conn:
+        with path.open() as fp:
+            load_table(conn, notes_tbl, fp, observer=observer)
+    stats, serial = observer.tables
+    assert stats.rows == len(rows)
+    assert stats.nbytes == serial.nbytes == len(path.read_text())
+    assert stats.nbytes < path.stat().st_size
+
+@pytest.mark.parametrize('split', [False, True])
+def test_loaddb_processes(monkeypatch, tmp_path, split):
+    # The split reader is only used when asked for
+    calls = []
+
+    def spy(conn, table, path, **kwargs):
+        calls.append(path.name)
+        load_csv_split(conn, table, path, **kwargs)
+
+    monkeypatch.setattr(load_dump, 'load_csv_split', spy)
+    write_csv(tmp_path / 'notes.csv', TRICKY)
+    engine = S.create_engine('sqlite://')
+    metadata.create_all(engine)
+    with engine.connect() as conn:
+        loaddb(conn, metadata, tmp_path, processes=2, split=split)
+        assert conn.execute(S.select([S.func.count()])
+                             .select_from(notes_tbl)).scalar() == len(TRICKY)
+    assert calls == (['notes.csv'] if split else [])